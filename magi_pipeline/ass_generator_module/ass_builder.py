@@ -1,5 +1,22 @@
 import os
 import re
+from contextlib import ExitStack
+
+from magi_pipeline.ass_generator_module.style_registry import DEFAULT_STYLE_MAP, get_style_registry
+from magi_pipeline.utils.segment_table import SegmentTable
+
+# Скомпільовані один раз шаблони нормалізації
+_WHITESPACE = re.compile(r'\s+')
+_SPACE_AFTER_TAG = re.compile(r'(\{.*?\})\s+')
+_SPACE_BEFORE_TAG = re.compile(r'\s+(\{.*?\})')
+_ASS_OVERRIDE = re.compile(r'\{[^}]*\}')
+
+# Розмір буфера запису ASS (рядки пишуться одразу, без накопичення у списку)
+WRITE_BUFFER_BYTES = 1024 * 1024
+
+# Формати, які можна отримати за один прохід по сегментах, і їх кодування
+SUBTITLE_OUTPUT_FORMATS = ("ass", "srt", "vtt")
+_OUTPUT_ENCODINGS = {"ass": "utf-8-sig", "srt": "utf-8", "vtt": "utf-8"}
 
 def normalize_spaces(text):
     """
@@ -10,11 +27,11 @@ def normalize_spaces(text):
     if not text:
         return text
     # Нормалізуємо всі типи пробілів
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE.sub(' ', text)
     # Видаляємо пробіли на початку та в кінці
     text = text.strip()
     # Додатково видаляємо пробіли безпосередньо після тегів
-    text = re.sub(r'(\{.*?\})\s+', r'\1', text)
+    text = _SPACE_AFTER_TAG.sub(r'\1', text)
     return text
 
 def final_cleanup_spaces(text):
@@ -25,66 +42,183 @@ def final_cleanup_spaces(text):
     if not text:
         return text
     # Повторна нормалізація для впевненості
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE.sub(' ', text)
     # Видаляємо пробіли на початку та в кінці
     text = text.strip()
     # Видаляємо пробіли безпосередньо після тегів
-    text = re.sub(r'(\{.*?\})\s+', r'\1', text)
+    text = _SPACE_AFTER_TAG.sub(r'\1', text)
     # Видаляємо пробіли безпосередньо перед тегами
-    text = re.sub(r'\s+(\{.*?\})', r'\1', text)
+    text = _SPACE_BEFORE_TAG.sub(r'\1', text)
+    return text
+
+def normalize_text(text):
+    """
+    Спільна для всіх форматів нормалізація тексту репліки за один прохід;
+    результат той самий, що й final_cleanup_spaces(normalize_spaces(text)).
+
+    Згортання пробілів — str.split() (ті самі пробільні символи, що й \\s),
+    повторні згортання та strip нічого не змінюють і пропускаються. Шаблони
+    тегів застосовуються лише до рядків, де є і "{", і "}".
+    """
+    text = " ".join(text.split())
+    if "{" in text and "}" in text:
+        # Другий прохід по тегах лишається: після першого можуть з'явитися нові збіги
+        text = _SPACE_AFTER_TAG.sub(r'\1', _SPACE_AFTER_TAG.sub(r'\1', text))
+        text = _SPACE_BEFORE_TAG.sub(r'\1', text)
     return text
 
+def normalize_dialogue_text(text):
+    """Текст для рядка Dialogue: normalize_text + повноширинні коми, як і раніше."""
+    return normalize_text(text).replace(",", "，")
+
+def plain_text(text):
+    """Нормалізований текст без тегів ASS для SRT/VTT; \\N стає переносом рядка."""
+    if "{" in text:
+        text = _ASS_OVERRIDE.sub("", text)
+    if "\\" in text:
+        # Порожній рядок усередині репліки розірвав би блок SRT/VTT
+        lines = text.replace("\\h", " ").replace("\\n", "\\N").split("\\N")
+        return "\n".join(line.strip() for line in lines if line.strip())
+    return text.strip()
+
+# Розкладання часу на (години, хвилини, секунди, соті) — спільне для всіх форматів,
+# тож таймінги в ASS, SRT і VTT збігаються до сотої
+def _clock(seconds: float):
+    return (int(seconds // 3600), int((seconds % 3600) // 60), int(seconds % 60),
+            int((seconds - int(seconds)) * 100))
+
 # Функція форматування часу у формат ASS (г:хв:сек.соті частки секунди)
 def format_timestamp(seconds: float) -> str:
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = int(seconds % 60)
-    cs = int((seconds - int(seconds)) * 100)
+    h, m, s, cs = _clock(seconds)
     return f"{h:01}:{m:02}:{s:02}.{cs:02}"
 
+def write_subtitles(files, header, rows, last_end, style_map=None):
+    """
+    Потоково пише кілька форматів за один прохід по репликам: текст
+    нормалізується і час розкладається один раз на репліку, далі кожен формат
+    лише форматує готові значення. Пам'ять не залежить від кількості реплік.
+
+    Args:
+        files: {"ass" | "srt" | "vtt": відкритий текстовий файл}
+        header: Заголовок ASS зі стилями (вміст шаблону); для SRT/VTT не потрібен
+        rows: Ітерабельне (start, end, text), час у секундах
+        last_end: Кінець останньої репліки — від нього рахується зона ED
+        style_map: {"op", "ed", "default"} -> назва стилю
+    """
+    if style_map is None:
+        style_map = DEFAULT_STYLE_MAP
+    op_style, ed_style, default_style = style_map["op"], style_map["ed"], style_map["default"]
+    ed_from = last_end * 0.9
+    ass, srt, vtt = files.get("ass"), files.get("srt"), files.get("vtt")
+
+    if ass:
+        ass.write(header)
+    if vtt:
+        vtt.write("WEBVTT\n")
+
+    index = 0
+    for seg_start, seg_end, seg_text in rows:
+        text = normalize_text(seg_text)
+        sh, sm, ss, scs = _clock(seg_start)
+        eh, em, es, ecs = _clock(seg_end)
+
+        if ass:
+            # Вибір стилю — opening, ending чи default
+            if seg_start < 60:
+                style = op_style
+            elif seg_end > ed_from:
+                style = ed_style
+            else:
+                style = default_style
+            ass.write(f"\nDialogue: 0,{sh:01}:{sm:02}:{ss:02}.{scs:02},{eh:01}:{em:02}:{es:02}.{ecs:02},"
+                      f"{style},,0,0,0,,{text.replace(',', '，')}")
+
+        if srt or vtt:
+            plain = plain_text(text)
+            # Порожня репліка в SRT/VTT розірвала б блок — пропускаємо
+            if not plain:
+                continue
+            index += 1
+            if srt:
+                srt.write(f"{index}\n{sh:02}:{sm:02}:{ss:02},{scs:02}0 --> {eh:02}:{em:02}:{es:02},{ecs:02}0\n"
+                          f"{plain}\n\n")
+            if vtt:
+                escaped = plain.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+                vtt.write(f"\n{sh:02}:{sm:02}:{ss:02}.{scs:02}0 --> {eh:02}:{em:02}:{es:02}.{ecs:02}0\n"
+                          f"{escaped}\n")
+
+def write_ass(f, header, rows, last_end, style_map=None):
+    """Потоково пише лише ASS у відкритий текстовий файл (див. write_subtitles)."""
+    write_subtitles({"ass": f}, header, rows, last_end, style_map)
+
+def _rows(subs, text_column):
+    # Таблиця віддає колонки без проміжних словників
+    if isinstance(subs, SegmentTable):
+        return subs.rows(text_column), subs.end_ms[-1] / 1000 if len(subs) else 0
+    rows = ((segment["start"], segment["end"], segment["text"]) for segment in subs)
+    return rows, subs[-1]["end"] if subs else 0
+
+def generate_subtitle_files(
+    subs,
+    output_paths,
+    style_path="magi_pipeline/ass_generator_module/styles/Dialogue.ass",
+    style_map=None,
+    text_column="text",
+):
+    """
+    Генерує будь-який набір форматів (ASS, SRT, VTT) за один прохід по сегментах.
+
+    Args:
+        subs: SegmentTable або список словників {"start", "end", "text"}
+        output_paths: {"ass" | "srt" | "vtt": шлях до файлу}
+        style_path: Шаблон стилів (шлях або назва) — потрібен лише для ASS
+        text_column: Яку текстову колонку SegmentTable писати (наприклад, "translated")
+
+    Returns:
+        {формат: шлях} записаних файлів
+    """
+    unknown = [fmt for fmt in output_paths if fmt not in SUBTITLE_OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError(f"❌ Непідтримуваний формат субтитрів: {', '.join(unknown)}. "
+                         f"Доступні: {', '.join(SUBTITLE_OUTPUT_FORMATS)}")
+
+    header = ""
+    if style_map is None:
+        style_map = DEFAULT_STYLE_MAP
+    if "ass" in output_paths:
+        # Шаблон стилів — з реєстру (файл перечитується лише після зміни)
+        template = get_style_registry().get(style_path)
+        header = template.header
+        missing = template.missing_styles(style_map.values())
+        if missing:
+            print(f"⚠️  У шаблоні {template.name} немає стилів: {', '.join(missing)} (плеєр покаже їх як Default)")
+
+    rows, last_end = _rows(subs, text_column)
+    with ExitStack() as stack:
+        files = {}
+        for fmt, path in output_paths.items():
+            # Готуємо директорію виводу
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            files[fmt] = stack.enter_context(
+                open(path, "w", encoding=_OUTPUT_ENCODINGS[fmt], buffering=WRITE_BUFFER_BYTES))
+        write_subtitles(files, header, rows, last_end, style_map)
+    return {fmt: str(path) for fmt, path in output_paths.items()}
+
 # Основна функція генерації ASS-файлу з шаблону стилів
 def generate_ass(
     subs,
     output_path="output/episode01.ass",
     style_path="magi_pipeline/ass_generator_module/styles/Dialogue.ass",
     style_map=None,
+    text_column="text",
 ):
-    # Завантажуємо заголовок із шаблону стилів
-    with open(style_path, "r", encoding="utf-8") as f:
-        header = f.read()
-
-    # Призначаємо стилі (можна кастомізувати через style_map)
-    if style_map is None:
-        style_map = {"op": "OP", "ed": "ED", "default": "Default"}
-
-    # Готуємо директорію виводу
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    lines = [header]
-
-    for segment in subs:
-        start = format_timestamp(segment["start"])
-        end = format_timestamp(segment["end"])
-        text = segment["text"].replace("\n", " ").replace(",", "，")
-        # --- Покращена нормалізація пробілів ---
-        text = normalize_spaces(text)
-        # Фінальна очистка для впевненості
-        text = final_cleanup_spaces(text)
-
-        # Вибір стилю — opening, ending чи default
-        style = style_map["default"]
-        if segment["start"] < 60:
-            style = style_map["op"]
-        elif segment["end"] > subs[-1]["end"] * 0.9:
-            style = style_map["ed"]
-
-        # Формуємо рядок субтитру
-        dialogue = f"Dialogue: 0,{start},{end},{style},,0,0,0,,{text}"
-        lines.append(dialogue)
-
-    # Записуємо результат
-    with open(output_path, "w", encoding="utf-8-sig") as f:
-        f.write("\n".join(lines))
+    """
+    Args:
+        subs: SegmentTable або список словників {"start", "end", "text"}
+        style_path: Шлях до шаблону стилів або його назва ("Dialogue")
+        text_column: Яку текстову колонку SegmentTable писати (наприклад, "translated")
+    """
+    generate_subtitle_files(subs, {"ass": output_path}, style_path, style_map, text_column)
 
 if __name__ == "__main__":
     # Тестові саби
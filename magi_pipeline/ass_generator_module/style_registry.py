@@ -0,0 +1,173 @@
+"""
+style_registry.py — реєстр шаблонів стилів ASS.
+
+Кожен шаблон (styles/*.ass) розбирається один раз у структуру: [Script Info],
+записи [V4+ Styles] і формат [Events]. Результат кешується і перечитується
+лише тоді, коли змінився файл (mtime або розмір); список шаблонів — коли
+змінилась директорія. Реєстр обслуговує і відповідь /upload_video, і генератор
+ASS, та повідомляє про назви стилів зі style_map, яких немає в шаблоні.
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+STYLES_DIR = Path(__file__).resolve().parent / "styles"
+
+# Стилі, які генератор призначає репликам: opening, ending, решта
+DEFAULT_STYLE_MAP = {"op": "OP", "ed": "ED", "default": "Default"}
+
+
+class StyleTemplate(NamedTuple):
+    """Розібраний шаблон стилів."""
+    name: str
+    path: str
+    header: str
+    script_info: Dict[str, str]
+    style_format: List[str]
+    styles: Dict[str, Dict[str, str]]
+    events_format: List[str]
+
+    @property
+    def title(self) -> str:
+        return self.script_info.get("Title", self.name)
+
+    def missing_styles(self, names: Iterable[str]) -> List[str]:
+        """Назви стилів, яких немає в [V4+ Styles] шаблону (у порядку появи, без повторів)."""
+        missing = []
+        for name in names:
+            if name not in self.styles and name not in missing:
+                missing.append(name)
+        return missing
+
+    def describe(self, style_map: Optional[Dict[str, str]] = None) -> Dict:
+        """Короткий опис для web-інтерфейсу."""
+        return {
+            "filename": Path(self.path).name,
+            "name": self.name,
+            "path": self.path,
+            "title": self.title,
+            "styles": list(self.styles),
+            "missing_styles": self.missing_styles((style_map or DEFAULT_STYLE_MAP).values()),
+        }
+
+
+def _split_fields(value: str) -> List[str]:
+    return [field.strip() for field in value.split(",")]
+
+
+def parse_template(header: str, name: str, path: str) -> StyleTemplate:
+    """
+    Розбирає текст шаблону (заголовок ASS без реплік).
+
+    Args:
+        header: Вміст файлу шаблону
+        name: Назва шаблону (ім'я файлу без .ass)
+        path: Шлях до файлу
+    """
+    script_info: Dict[str, str] = {}
+    style_format: List[str] = []
+    styles: Dict[str, Dict[str, str]] = {}
+    events_format: List[str] = []
+    section = ""
+
+    for line in header.splitlines():
+        line = line.strip().lstrip("\ufeff")
+        if not line or line.startswith(";"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1].strip().lower()
+            continue
+        key, sep, value = line.partition(":")
+        if not sep:
+            continue
+        key, value = key.strip(), value.strip()
+        if section == "script info":
+            script_info[key] = value
+        elif section in ("v4+ styles", "v4 styles"):
+            if key == "Format":
+                style_format = _split_fields(value)
+            elif key == "Style":
+                fields = style_format or ["Name"]
+                values = _split_fields(value)
+                record = dict(zip(fields, values))
+                styles[record.get("Name", values[0])] = record
+        elif section == "events" and key == "Format":
+            events_format = _split_fields(value)
+
+    return StyleTemplate(name, path, header, script_info, style_format, styles, events_format)
+
+
+class StyleRegistry:
+    """Кеш розібраних шаблонів з інвалідацією за mtime/розміром файлу."""
+
+    def __init__(self, styles_dir: Union[str, Path] = STYLES_DIR):
+        self.styles_dir = Path(styles_dir)
+        self._templates: Dict[str, Tuple[Tuple[int, int], StyleTemplate]] = {}
+        self._listing: Optional[Tuple[int, List[str]]] = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def resolve(self, name_or_path: Union[str, Path]) -> Path:
+        """Назва шаблону ("Dialogue"), ім'я файлу ("Dialogue.ass") або шлях -> шлях до файлу."""
+        candidate = Path(name_or_path)
+        if candidate.is_file():
+            return candidate
+        stem = candidate.name[:-4] if candidate.name.lower().endswith(".ass") else candidate.name
+        in_dir = self.styles_dir / f"{stem}.ass"
+        if in_dir.is_file():
+            return in_dir
+        available = ", ".join(self.names()) or "немає"
+        raise FileNotFoundError(f"❌ Шаблон стилю не знайдено: {name_or_path}. Доступні: {available}")
+
+    def get(self, name_or_path: Union[str, Path]) -> StyleTemplate:
+        """Розібраний шаблон; файл читається лише при першому зверненні або після зміни."""
+        path = self.resolve(name_or_path)
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        key = str(path.resolve())
+        with self._lock:
+            cached = self._templates.get(key)
+            if cached and cached[0] == version:
+                return cached[1]
+        # Текстовий режим, як і раніше: заголовок у вихідному ASS лишається тим самим
+        with open(path, "r", encoding="utf-8") as f:
+            template = parse_template(f.read(), path.stem, str(path))
+        with self._lock:
+            self._templates[key] = (version, template)
+            self.loads += 1
+        return template
+
+    def names(self) -> List[str]:
+        """Назви шаблонів у директорії; glob повторюється лише після зміни директорії."""
+        if not self.styles_dir.is_dir():
+            return []
+        mtime = os.stat(self.styles_dir).st_mtime_ns
+        with self._lock:
+            if self._listing and self._listing[0] == mtime:
+                return list(self._listing[1])
+        names = sorted(path.stem for path in self.styles_dir.glob("*.ass"))
+        with self._lock:
+            self._listing = (mtime, names)
+        return list(names)
+
+    def templates(self) -> List[StyleTemplate]:
+        return [self.get(name) for name in self.names()]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"cached": len(self._templates), "loads": self.loads}
+
+
+_registry: Optional[StyleRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_style_registry() -> StyleRegistry:
+    """Спільний реєстр шаблонів процесу."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = StyleRegistry()
+        return _registry
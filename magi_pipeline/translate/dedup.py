@@ -0,0 +1,57 @@
+"""
+dedup.py — дедуплікація реплік епізоду перед перекладом.
+
+Однакові (після нормалізації) тексти — вигуки, написи, продубльовані між шарами,
+караоке-фрагменти — перекладаються один раз, а результат розноситься назад
+на кожен сегмент.
+"""
+
+from typing import Dict, List, Tuple
+from magi_pipeline.translate.translation_memory import normalize_text
+
+
+def deduplicate(texts: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    Згортає однакові нормалізовані тексти.
+
+    Args:
+        texts: Тексти сегментів
+
+    Returns:
+        (унікальні тексти, індекс унікального тексту для кожного сегмента;
+        -1 для порожніх сегментів)
+    """
+    positions: Dict[str, int] = {}
+    unique: List[str] = []
+    index: List[int] = []
+    for text in texts:
+        normalized = normalize_text(text)
+        if not normalized:
+            index.append(-1)
+            continue
+        position = positions.get(normalized)
+        if position is None:
+            position = positions[normalized] = len(unique)
+            unique.append(normalized)
+        index.append(position)
+    return unique, index
+
+
+def expand(translations: List[str], index: List[int]) -> List[str]:
+    """Розносить переклади унікальних текстів назад на всі сегменти."""
+    return [translations[i] if i >= 0 else "" for i in index]
+
+
+def dedup_stats(index: List[int], unique_count: int) -> Dict[str, float]:
+    """
+    Статистика дедуплікації для метаданих задачі.
+
+    dedup_ratio — частка непорожніх сегментів, які не потребували окремого перекладу.
+    """
+    non_empty = sum(1 for i in index if i >= 0)
+    return {
+        "segments": len(index),
+        "non_empty_segments": non_empty,
+        "unique_texts": unique_count,
+        "dedup_ratio": round(1 - unique_count / non_empty, 4) if non_empty else 0.0,
+    }
@@ -1,12 +1,125 @@
 import deepl
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
 
-DEEPL_API_KEY = "427c0788-2c8d-494c-84b8-403e7c7baa08:fx"  # Зручно зберігати ключ у змінній середовища
+DEEPL_API_KEY = os.environ.get("DEEPL_API_KEY", "427c0788-2c8d-494c-84b8-403e7c7baa08:fx")  # Зручно зберігати ключ у змінній середовища
 
-def deepl_translate(text, target_lang="UK", source_lang=None):
-    if not DEEPL_API_KEY:
+# Альтернативна адреса API, наприклад локальний стаб (scripts/deepl_stub_server.py)
+DEEPL_SERVER_URL = os.environ.get("DEEPL_SERVER_URL") or None
+
+# Обмеження одного запиту: DeepL приймає до 50 текстів, тіло запиту — до 128 KiB
+MAX_BATCH_LINES = 50
+MAX_BATCH_CHARS = 30000
+
+# Кількість одночасних запитів до API
+MAX_IN_FLIGHT = int(os.environ.get("MAGI_DEEPL_CONCURRENCY", "4"))
+
+# Повтори при 429 та мережевих помилках: їх робить сам клієнт deepl (експоненційна
+# затримка з джитером), власного циклу повторів немає. Налаштування глобальне для процесу.
+MAX_RETRIES = int(os.environ.get("MAGI_DEEPL_RETRIES", "5"))
+deepl.http_client.max_network_retries = MAX_RETRIES
+
+# Як часто перечитувати /v2/usage: ключ можуть використовувати інші клієнти,
+# а на початку розрахункового періоду лічильник скидається
+QUOTA_REFRESH_SECONDS = int(os.environ.get("MAGI_DEEPL_QUOTA_TTL_S", "300"))
+
+# Один клієнт (HTTP-сесія) на пару (ключ, сервер)
+_clients: Dict[Tuple[str, Optional[str]], deepl.Translator] = {}
+_quotas: Dict[Tuple[str, Optional[str]], "CharacterQuota"] = {}
+_clients_lock = threading.Lock()
+
+
+class _Stopped(Exception):
+    """Пакет не відправлявся: інший пакет цього перекладу вже завершився помилкою."""
+
+
+class CharacterQuota:
+    """
+    Облік символів за ключем відносно ліміту з /v2/usage. Між перечитуваннями
+    used збільшується на власні відправлення; refresh() бере актуальне значення
+    з сервера (враховує інших клієнтів ключа та скидання на новий період).
+    """
+
+    def __init__(self, used: int = 0, limit: Optional[int] = None):
+        self.used = used
+        self.limit = limit
+        self.sent = 0
+        self.exhausted = False
+        self.refreshed: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self) -> Optional[int]:
+        if self.limit is None:
+            return None
+        return max(self.limit - self.used, 0)
+
+    def add(self, chars: int):
+        with self._lock:
+            self.used += chars
+            self.sent += chars
+
+    def refresh(self, client: deepl.Translator, max_age: float = QUOTA_REFRESH_SECONDS) -> "CharacterQuota":
+        """
+        Перечитує /v2/usage, якщо дані старші за max_age секунд (0 — примусово).
+        Позначка exhausted знімається, якщо сервер повідомляє залишок квоти.
+        """
+        with self._lock:
+            if self.refreshed is not None and time.monotonic() - self.refreshed < max_age:
+                return self
+        try:
+            usage = client.get_usage()
+        except deepl.DeepLException as e:
+            print(f"⚠️ Не вдалося отримати квоту DeepL: {e}")
+            return self
+        with self._lock:
+            self.refreshed = time.monotonic()
+            if usage.character.valid:
+                self.used = usage.character.count
+                self.limit = usage.character.limit
+            else:
+                # Ключ без ліміту символів
+                self.limit = None
+            self.exhausted = self.remaining == 0
+        return self
+
+    def as_dict(self) -> Dict[str, object]:
+        return {"used": self.used, "limit": self.limit, "remaining": self.remaining,
+                "sent": self.sent, "exhausted": self.exhausted}
+
+
+def get_client(api_key: Optional[str] = None, server_url: Optional[str] = None) -> deepl.Translator:
+    """Повертає спільний клієнт DeepL для ключа (з'єднання перевикористовуються)."""
+    api_key = api_key or DEEPL_API_KEY
+    if not api_key:
         raise ValueError("DEEPL_API_KEY is not set in environment variables!")
-    translator = deepl.Translator(DEEPL_API_KEY)
+    server_url = server_url or DEEPL_SERVER_URL
+    key = (api_key, server_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = deepl.Translator(api_key, server_url=server_url)
+            _clients[key] = client
+        return client
+
+
+def get_quota(api_key: Optional[str] = None, server_url: Optional[str] = None,
+              max_age: float = QUOTA_REFRESH_SECONDS) -> CharacterQuota:
+    """
+    Повертає облік квоти символів для ключа; /v2/usage перечитується,
+    якщо дані старші за max_age секунд (0 — примусово).
+    """
+    api_key = api_key or DEEPL_API_KEY
+    server_url = server_url or DEEPL_SERVER_URL
+    with _clients_lock:
+        quota = _quotas.setdefault((api_key, server_url), CharacterQuota())
+    return quota.refresh(get_client(api_key, server_url), max_age)
+
+
+def _language_kwargs(target_lang: str, source_lang: Optional[str]) -> Dict[str, str]:
     kwargs = {"target_lang": target_lang}
     if source_lang:
         # DeepL очікує коди мов: 'RU' для російської, 'EN' для англійської
@@ -14,5 +127,122 @@ def deepl_translate(text, target_lang="UK", source_lang=None):
             kwargs["source_lang"] = "RU"
         elif source_lang == "en":
             kwargs["source_lang"] = "EN"
-    result = translator.translate_text(text, **kwargs)
-    return result.text
\ No newline at end of file
+    return kwargs
+
+
+def _make_batches(texts: List[str]) -> List[List[int]]:
+    batches = []
+    current = []
+    current_chars = 0
+    for i, text in enumerate(texts):
+        if current and (len(current) >= MAX_BATCH_LINES or current_chars + len(text) > MAX_BATCH_CHARS):
+            batches.append(current)
+            current = []
+            current_chars = 0
+        current.append(i)
+        current_chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _translate_batch(client: deepl.Translator, batch: List[str], kwargs: Dict[str, str],
+                     quota: CharacterQuota, stop: threading.Event, errors: List[Exception]) -> List[str]:
+    if stop.is_set():
+        raise _Stopped()
+    try:
+        results = client.translate_text(batch, **kwargs)
+    except deepl.QuotaExceededException:
+        # 456: квоту вичерпано — до перечитування /v2/usage нові переклади не стартують
+        quota.exhausted = True
+        errors.append(Exception("❌ Квоту символів DeepL вичерпано (HTTP 456)"))
+        stop.set()
+        raise _Stopped()
+    except Exception as e:
+        # Будь-яка помилка зупиняє решту пакетів, щоб не витрачати квоту на приречений переклад
+        errors.append(e)
+        stop.set()
+        raise _Stopped()
+    quota.add(sum(len(text) for text in batch))
+    return [result.text for result in results]
+
+
+def deepl_translate_batch(
+    texts: List[str],
+    target_lang: str = "UK",
+    source_lang: Optional[str] = None,
+    api_key: Optional[str] = None,
+    server_url: Optional[str] = None,
+    max_in_flight: int = MAX_IN_FLIGHT,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+) -> List[str]:
+    """
+    Перекладає список рядків через DeepL пакетами з обмеженою кількістю
+    одночасних запитів.
+
+    Args:
+        texts: Рядки для перекладу
+        target_lang: Цільова мова (код DeepL, наприклад "UK")
+        source_lang: Вихідна мова ("ru", "en" або None для автовизначення)
+        api_key: Ключ API (за замовчуванням DEEPL_API_KEY)
+        server_url: Адреса API (за замовчуванням DEEPL_SERVER_URL)
+        max_in_flight: Максимум одночасних запитів
+        progress_callback: Функція (перекладено, всього)
+
+    Returns:
+        Переклади в тому ж порядку, що й вхідні рядки
+    """
+    results = [""] * len(texts)
+    pending = [i for i, text in enumerate(texts) if text.strip()]
+    if not pending:
+        return results
+
+    client = get_client(api_key, server_url)
+    quota = get_quota(api_key, server_url)
+    total_chars = sum(len(texts[i]) for i in pending)
+
+    def insufficient() -> bool:
+        return quota.exhausted or (quota.remaining is not None and total_chars > quota.remaining)
+
+    if insufficient():
+        # Перед відмовою — актуальні дані: новий період, більший ліміт або залишок після 456
+        quota.refresh(client, max_age=0)
+    if insufficient():
+        raise Exception(f"❌ Недостатньо квоти DeepL: потрібно {total_chars} символів, "
+                        f"залишилось {quota.remaining}")
+
+    kwargs = _language_kwargs(target_lang, source_lang)
+    stop = threading.Event()
+    errors: List[Exception] = []
+    batches = [[pending[j] for j in batch] for batch in _make_batches([texts[i] for i in pending])]
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        futures = [
+            (batch, executor.submit(_translate_batch, client,
+                                    [texts[i] for i in batch], kwargs, quota, stop, errors))
+            for batch in batches
+        ]
+        for batch, future in futures:
+            try:
+                translated = future.result()
+            except _Stopped:
+                # Причина — перша помилка будь-якого пакета, а не зупинка цього
+                raise errors[0]
+            for i, text in zip(batch, translated):
+                results[i] = text
+            done += len(batch)
+            if progress_callback:
+                progress_callback(done, len(pending))
+
+    return results
+
+
+def deepl_translate(text, target_lang="UK", source_lang=None, api_key=None):
+    return deepl_translate_batch([text], target_lang=target_lang, source_lang=source_lang, api_key=api_key)[0]
+
+
+def quota_stats() -> Dict[str, Dict[str, object]]:
+    """Облік символів за ключами (ключ маскується)."""
+    with _clients_lock:
+        return {f"{key[:8]}…": quota.as_dict() for (key, _), quota in _quotas.items()}
\ No newline at end of file
@@ -1,38 +1,104 @@
 """
-translate.py — модуль перекладу субтитрів з російської на українську.
+translate.py — модуль перекладу субтитрів моделями Helsinki-NLP (MarianMT).
 Це частина системи MAGI Pipeline для автоматичної локалізації аніме.
+
+Моделі не завантажуються при імпорті: вони потрапляють у спільний реєстр
+при першому перекладі для відповідної мовної пари.
 """
 
-from transformers import MarianMTModel, MarianTokenizer
-import torch
+import os
+from typing import Callable, List, Optional
+from magi_pipeline.utils.model_pool import ModelPool, estimate_model_bytes
+
+# ↓ 1. Реєстр моделей перекладу за мовною парою
+# Helsinki-NLP — одна з найкращих відкритих моделей для перекладу на українську
+MARIAN_MODELS = {
+    ("ru", "uk"): "Helsinki-NLP/opus-mt-ru-uk",
+    ("en", "uk"): "Helsinki-NLP/opus-mt-en-uk",
+    ("uk", "ru"): "Helsinki-NLP/opus-mt-uk-ru",
+    ("uk", "en"): "Helsinki-NLP/opus-mt-uk-en",
+}
+
+# Бюджет пам'яті для завантажених моделей перекладу (MB)
+MARIAN_POOL_BUDGET_MB = int(os.environ.get("MAGI_MARIAN_POOL_MB", "2048"))
+
+# Бюджет токенів на один виклик generate: batch_size × довжина найдовшого рядка в батчі
+MAX_BATCH_TOKENS = int(os.environ.get("MAGI_MAX_BATCH_TOKENS", "4096"))
+MAX_BATCH_SIZE = 64
+
+# Швидкий CPU-режим (движок "helsinki-fast"): int8-ваги лінійних шарів, KV-кеш,
+# кількість променів пошуку (1 — жадібне декодування)
+FAST_NUM_BEAMS = int(os.environ.get("MAGI_FAST_BEAMS", "1"))
+
+# Спільний для всіх потоків пул: значення — (tokenizer, model, device)
+MARIAN_POOL = ModelPool(
+    "marian",
+    MARIAN_POOL_BUDGET_MB * 1024 * 1024,
+    size_fn=lambda bundle: estimate_model_bytes(bundle[1]),
+)
+
+
+def get_model_name(source_lang: str = "ru", target_lang: str = "uk") -> str:
+    """
+    Повертає назву моделі Helsinki-NLP для мовної пари.
+    Для пар поза таблицею використовується стандартна схема opus-mt-{src}-{tgt}.
+    """
+    return MARIAN_MODELS.get((source_lang, target_lang),
+                             f"Helsinki-NLP/opus-mt-{source_lang}-{target_lang}")
+
+
+def _load_marian(model_name: str, quantized: bool = False):
+    # Імпортуємо transformers лише тут, щоб імпорт модуля не коштував нічого
+    from transformers import MarianMTModel, MarianTokenizer
+    import torch
+
+    # Завантажуємо токенізатор (розбиває речення на токени для обробки)
+    tokenizer = MarianTokenizer.from_pretrained(model_name)
+
+    # Завантажуємо саму модель
+    model = MarianMTModel.from_pretrained(model_name)
+    model.eval()
+
+    if quantized:
+        # int8-квантизація лінійних шарів (включно з lm_head) — лише для CPU
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.config.use_cache = True
+        return tokenizer, model, torch.device("cpu")
 
-# ↓ 1. Завантаження моделі перекладу
-# Ми використовуємо Helsinki-NLP — одну з найкращих моделей для російсько-українського перекладу
-model_name = "Helsinki-NLP/opus-mt-ru-uk"
+    # Автоматичний вибір CPU чи GPU
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+    return tokenizer, model, device
 
-# Завантажуємо токенізатор (розбиває речення на токени для обробки)
-tokenizer = MarianTokenizer.from_pretrained(model_name)
 
-# Завантажуємо саму модель
-model = MarianMTModel.from_pretrained(model_name)
+def get_translator(source_lang: str = "ru", target_lang: str = "uk", quantized: bool = False):
+    """
+    Повертає (tokenizer, model, device) для мовної пари, завантажуючи модель
+    при першому зверненні. quantized=True — int8-версія тієї ж моделі на CPU,
+    яка живе в пулі поруч зі звичайною.
+    """
+    model_name = get_model_name(source_lang, target_lang)
+    key = (source_lang, target_lang, "int8") if quantized else (source_lang, target_lang)
+    return MARIAN_POOL.get(key, lambda: _load_marian(model_name, quantized))
 
-# Автоматичний вибір CPU чи GPU
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
 
-def translate_line(text: str) -> str:
+def translate_line(text: str, source_lang: str = "ru", target_lang: str = "uk") -> str:
     """
-    Перекладає окремий рядок тексту з російської на українську.
+    Перекладає окремий рядок тексту.
     
     Parameters:
-        text (str): Вхідний російський рядок
+        text (str): Вхідний рядок
+        source_lang (str): Вихідна мова
+        target_lang (str): Цільова мова
     Returns:
-        str: Перекладений рядок українською
+        str: Перекладений рядок
     """
     # Якщо текст порожній — одразу повертаємо порожній
     if not text.strip():
         return ""
 
+    tokenizer, model, device = get_translator(source_lang, target_lang)
+
     # Токенізуємо текст (розбиваємо на інструкції, готуємо для моделі)
     inputs = tokenizer(text, return_tensors="pt", padding=True, truncation=True).to(device)
 
@@ -43,3 +109,93 @@ def translate_line(text: str) -> str:
     output = tokenizer.decode(translated[0], skip_special_tokens=True)
 
     return output
+
+
+def _make_batches(lengths: List[int], max_batch_tokens: int, max_batch_size: int) -> List[List[int]]:
+    """
+    Групує індекси рядків у батчі: рядки сортуються за довжиною в токенах,
+    тож у батчі опиняються рядки близької довжини і паддінгу мінімум.
+    Розмір батчу обмежується бюджетом токенів (кількість × максимальна довжина).
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+    current_max = 0
+    for i in order:
+        longest = max(current_max, lengths[i])
+        if current and (longest * (len(current) + 1) > max_batch_tokens or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            longest = lengths[i]
+        current.append(i)
+        current_max = longest
+    if current:
+        batches.append(current)
+    return batches
+
+
+def translate_batch(
+    texts: List[str],
+    source_lang: str = "ru",
+    target_lang: str = "uk",
+    max_batch_tokens: int = MAX_BATCH_TOKENS,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
+    quantized: bool = False,
+    num_beams: Optional[int] = None,
+) -> List[str]:
+    """
+    Перекладає список рядків батчами з динамічним паддінгом.
+
+    Parameters:
+        texts (List[str]): Вхідні рядки
+        source_lang (str): Вихідна мова
+        target_lang (str): Цільова мова
+        max_batch_tokens (int): Бюджет токенів на один виклик generate
+        max_batch_size (int): Максимальна кількість рядків у батчі
+        progress_callback: Функція (перекладено, всього), викликається після кожного батчу
+        quantized (bool): Використати int8-модель на CPU (движок "helsinki-fast")
+        num_beams (int): Кількість променів пошуку; None — налаштування моделі, 1 — жадібне декодування
+    Returns:
+        List[str]: Переклади в тому ж порядку, що й вхідні рядки
+    """
+    results = [""] * len(texts)
+    # Порожні рядки не відправляємо в модель
+    pending = [i for i, text in enumerate(texts) if text.strip()]
+    if not pending:
+        return results
+
+    import torch
+    tokenizer, model, device = get_translator(source_lang, target_lang, quantized)
+
+    generate_options = {"use_cache": True}
+    if num_beams is not None:
+        generate_options["num_beams"] = num_beams
+
+    # Токенізуємо без паддінгу, щоб знати реальну довжину кожного рядка
+    encoded = tokenizer([texts[i] for i in pending], truncation=True)["input_ids"]
+    lengths = [len(ids) for ids in encoded]
+
+    done = 0
+    for batch in _make_batches(lengths, max_batch_tokens, max_batch_size):
+        # Паддінг лише до найдовшого рядка в цьому батчі
+        features = [{"input_ids": encoded[j], "attention_mask": [1] * lengths[j]} for j in batch]
+        inputs = tokenizer.pad(features, padding=True, return_tensors="pt").to(device)
+
+        with torch.inference_mode():
+            translated = model.generate(**inputs, **generate_options)
+        outputs = tokenizer.batch_decode(translated, skip_special_tokens=True)
+
+        for j, output in zip(batch, outputs):
+            results[pending[j]] = output
+
+        done += len(batch)
+        if progress_callback:
+            progress_callback(done, len(pending))
+
+    return results
+
+
+def model_stats():
+    """Статистика реєстру моделей перекладу (hit/miss, час завантаження)."""
+    return MARIAN_POOL.stats()
@@ -0,0 +1,244 @@
+"""
+translation_memory.py — постійна пам'ять перекладів (SQLite, режим WAL).
+
+Ключ запису: (engine, revision, src, tgt, нормалізований текст). Пам'ять
+перевіряється перед будь-яким викликом моделі чи DeepL API, тому повтори
+(OP/ED, крилаті фрази, повторний запуск того ж файлу) не перекладаються двічі.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_TM_PATH = Path(os.environ.get("MAGI_TM_PATH", "cache/translation_memory.sqlite3"))
+DEFAULT_TM_MAX_MB = int(os.environ.get("MAGI_TM_MAX_MB", "256"))
+
+# SQLite обмежує кількість параметрів у запиті
+_SQL_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормалізує текст для ключа пам'яті: Unicode NFC, пробіли згорнуті в один,
+    без пробілів на краях. Регістр і розділові знаки зберігаються, бо впливають на переклад.
+    """
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+class TranslationMemory:
+    """
+    Пам'ять перекладів на диску з витісненням за розміром (найдавніше використані першими).
+    Одне з'єднання на потік, запис серіалізується локом.
+    """
+
+    def __init__(self, path: Path = DEFAULT_TM_PATH, max_bytes: int = DEFAULT_TM_MAX_MB * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with self._write_lock:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tm (
+                    engine TEXT NOT NULL,
+                    revision TEXT NOT NULL,
+                    src TEXT NOT NULL,
+                    tgt TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL,
+                    UNIQUE (engine, revision, src, tgt, source)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS tm_last_used ON tm (last_used)")
+            conn.commit()
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tm").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup_many(self, engine: str, revision: str, src: str, tgt: str,
+                    texts: Iterable[str]) -> Dict[str, str]:
+        """
+        Шукає переклади для нормалізованих текстів.
+
+        Returns:
+            Словник {нормалізований текст: переклад} лише для знайдених записів
+        """
+        keys = list(dict.fromkeys(texts))
+        found: Dict[str, str] = {}
+        if not keys:
+            return found
+
+        conn = self._connect()
+        for i in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[i:i + _SQL_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT source, target FROM tm WHERE engine=? AND revision=? AND src=? AND tgt=? "
+                f"AND source IN ({placeholders})",
+                (engine, revision, src, tgt, *chunk)
+            ).fetchall()
+            found.update(rows)
+
+        if found:
+            # Оновлюємо час використання, щоб популярні рядки не витіснялись
+            now = time.time()
+            hit_keys = list(found)
+            with self._write_lock:
+                for i in range(0, len(hit_keys), _SQL_CHUNK):
+                    chunk = hit_keys[i:i + _SQL_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    conn.execute(
+                        f"UPDATE tm SET last_used=? WHERE engine=? AND revision=? AND src=? AND tgt=? "
+                        f"AND source IN ({placeholders})",
+                        (now, engine, revision, src, tgt, *chunk)
+                    )
+                conn.commit()
+
+        with self._write_lock:
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(keys) - len(found)
+        return found
+
+    def store_many(self, engine: str, revision: str, src: str, tgt: str,
+                   pairs: Iterable[Tuple[str, str]]):
+        """Зберігає пари (нормалізований текст, переклад)."""
+        now = time.time()
+        rows = [
+            (engine, revision, src, tgt, source, target,
+             len(source.encode("utf-8")) + len(target.encode("utf-8")), now)
+            for source, target in pairs if source
+        ]
+        if not rows:
+            return
+
+        conn = self._connect()
+        with self._write_lock:
+            for row in rows:
+                previous = conn.execute(
+                    "SELECT size FROM tm WHERE engine=? AND revision=? AND src=? AND tgt=? AND source=?",
+                    row[:5]
+                ).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO tm (engine, revision, src, tgt, source, target, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+                self._total_bytes += row[6] - (previous[0] if previous else 0)
+            conn.commit()
+            self._stats["stored"] += len(rows)
+            if self._total_bytes > self.max_bytes:
+                self._prune_locked(conn)
+
+    def _prune_locked(self, conn: sqlite3.Connection):
+        # Звільняємо з запасом до 90% ліміту, щоб не чистити на кожному записі
+        target_bytes = int(self.max_bytes * 0.9)
+        while self._total_bytes > target_bytes:
+            rows = conn.execute(
+                "SELECT rowid, size FROM tm ORDER BY last_used LIMIT ?", (_SQL_CHUNK,)
+            ).fetchall()
+            if not rows:
+                break
+            removed = []
+            for rowid, size in rows:
+                if self._total_bytes <= target_bytes:
+                    break
+                removed.append(rowid)
+                self._total_bytes -= size
+            placeholders = ",".join("?" * len(removed))
+            conn.execute(f"DELETE FROM tm WHERE rowid IN ({placeholders})", removed)
+            self._stats["evicted"] += len(removed)
+        conn.commit()
+
+    def clear(self):
+        """Повністю очищує пам'ять перекладів."""
+        conn = self._connect()
+        with self._write_lock:
+            conn.execute("DELETE FROM tm")
+            conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, object]:
+        """Повертає hit/miss, hit rate та розмір пам'яті."""
+        conn = self._connect()
+        entries = conn.execute("SELECT COUNT(*) FROM tm").fetchone()[0]
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "path": str(self.path),
+        }
+
+
+_default_memory: Optional[TranslationMemory] = None
+_default_lock = threading.Lock()
+
+
+def get_translation_memory() -> TranslationMemory:
+    """Повертає спільну для процесу пам'ять перекладів (створюється при першому зверненні)."""
+    global _default_memory
+    with _default_lock:
+        if _default_memory is None:
+            _default_memory = TranslationMemory()
+        return _default_memory
+
+
+def translate_with_memory(texts: List[str], engine: str, revision: str, src: str, tgt: str,
+                          translate_fn, progress_callback=None, use_cache: bool = True) -> List[str]:
+    """
+    Перекладає рядки, звертаючись до translate_fn лише для відсутніх у пам'яті.
+
+    Args:
+        texts: Рядки для перекладу
+        engine, revision, src, tgt: Частини ключа пам'яті
+        translate_fn: Функція (list[str], progress_callback) -> list[str] для промахів
+        progress_callback: Функція (перекладено, всього)
+        use_cache: False — обійти пам'ять повністю
+
+    Returns:
+        Переклади в тому ж порядку, що й вхідні рядки
+    """
+    if not use_cache:
+        return translate_fn(texts, progress_callback)
+
+    memory = get_translation_memory()
+    normalized = [normalize_text(text) for text in texts]
+    found = memory.lookup_many(engine, revision, src, tgt, [n for n in normalized if n])
+
+    missing = list(dict.fromkeys(n for n in normalized if n and n not in found))
+    missing_set = set(missing)
+    cached_count = len(texts) - sum(1 for n in normalized if n in missing_set)
+
+    if progress_callback and cached_count:
+        progress_callback(cached_count, len(texts))
+
+    if missing:
+        def report(done, total):
+            if progress_callback:
+                progress_callback(cached_count + done * (len(texts) - cached_count) // max(total, 1),
+                                  len(texts))
+
+        translated = translate_fn(missing, report)
+        new_pairs = list(zip(missing, translated))
+        memory.store_many(engine, revision, src, tgt, new_pairs)
+        found.update(new_pairs)
+
+    return [found.get(n, "") if n else "" for n in normalized]
@@ -1,7 +1,25 @@
+import os
 import subprocess
+import numpy as np
 import whisper
 import torch
 from pathlib import Path
+from magi_pipeline.utils.model_pool import ModelPool
+from magi_pipeline.utils.demux import AUDIO_MMAP_THRESHOLD_MB, demux
+from magi_pipeline.utils.transcription_cache import audio_fingerprint, transcript_key, get_transcription_cache
+from magi_pipeline.utils import transcription_stream
+
+# Whisper працює з моно 16 кГц
+SAMPLE_RATE = 16000
+
+# Точності моделі: fp16 — CUDA, fp32 та int8 (динамічна квантизація) — CPU
+PRECISIONS = ("fp16", "fp32", "int8")
+
+# Бюджет пам'яті для резидентних моделей Whisper (MB), можна змінити через змінну середовища
+WHISPER_POOL_BUDGET_MB = int(os.environ.get("MAGI_WHISPER_POOL_MB", "6144"))
+
+# Спільний для всього процесу пул моделей: ключ (model_name, device, precision)
+WHISPER_POOL = ModelPool("whisper", WHISPER_POOL_BUDGET_MB * 1024 * 1024)
 
 class Balthasar:
     @staticmethod
@@ -13,13 +31,176 @@ class Balthasar:
         return audio_path
 
     @staticmethod
-    def transcribe(audio_path, model_name="base", language=None, device=None):
+    def decode_audio(video_file, stream_index=None, mmap_dir=None,
+                     mmap_threshold_bytes=AUDIO_MMAP_THRESHOLD_MB * 1024 * 1024):
+        """
+        Декодує аудіо в пам'ять одним проходом: ffmpeg віддає s16le у pipe, а ми
+        одразу перетворюємо його на float32 для Whisper, без проміжного WAV.
+        Щоб за те саме читання витягти ще й субтитри, див. demux.demux.
+
+        Args:
+            video_file: Шлях до відео
+            stream_index: Абсолютний індекс аудіо потоку (з analyze_video['audio_streams']),
+                None — потік, який обирає ffmpeg за замовчуванням
+            mmap_dir: Директорія для memory-mapped файлу (за замовчуванням системна temp)
+            mmap_threshold_bytes: Поріг розміру float32, після якого дані йдуть у memmap
+
+        Returns:
+            np.ndarray (float32, моно, 16 кГц) або np.memmap для довгих записів
+        """
+        return demux(video_file, audio_stream_index=stream_index, subtitle_streams=[], mmap_dir=mmap_dir,
+                     mmap_threshold_bytes=mmap_threshold_bytes).audio
+
+    @staticmethod
+    def load_model(model_name="base", device="cpu", precision="fp32"):
+        """
+        Завантажує модель Whisper на пристрій (викликається пулом лише при промаху).
+        precision="int8" — динамічна int8-квантизація лінійних шарів (лише CPU).
+        """
+        model = whisper.load_model(model_name, device=device)
+        if precision == "int8":
+            model = Balthasar.quantize_int8(model)
+        return model
+
+    @staticmethod
+    def quantize_int8(model):
+        """
+        Динамічна int8-квантизація лінійних шарів Whisper для CPU.
+        Ваги зберігаються в int8, активації квантуються на льоту.
+        """
+        # whisper.model.Linear лише приводить dtype ваг у forward, а quantize_dynamic
+        # приймає тільки точний nn.Linear, тож повертаємо шарам базовий клас
+        for module in model.modules():
+            if isinstance(module, torch.nn.Linear) and type(module) is not torch.nn.Linear:
+                module.__class__ = torch.nn.Linear
+        return torch.ao.quantization.quantize_dynamic(model.cpu(), {torch.nn.Linear}, dtype=torch.qint8)
+
+    @staticmethod
+    def resolve_precision(device, precision=None):
+        """
+        Точність для пристрою: fp16 на CUDA, fp32 на CPU; "int8" підтримується лише на CPU.
+        """
+        if precision in (None, "", "auto"):
+            return "fp16" if device == "cuda" else "fp32"
+        if precision not in PRECISIONS:
+            raise ValueError(f"❌ Невідома точність Whisper: {precision}. Доступні: {', '.join(PRECISIONS)}")
+        if precision == "int8" and device != "cpu":
+            print("⚠️ int8-квантизація доступна лише на CPU, використовується fp16")
+            return "fp16"
+        return precision
+
+    @staticmethod
+    def transcribe(audio_path, model_name="base", language=None, device=None, use_cache=True,
+                   progress_callback=None, segment_callback=None, precision=None):
+        """
+        Транскрибує аудіо. audio_path — шлях до файлу або вже декодований
+        масив float32 16 кГц (див. decode_audio).
+
+        При use_cache=True результат береться з кешу транскрипцій, якщо
+        те саме аудіо вже оброблялось цією моделлю з тими ж параметрами.
+
+        Args:
+            progress_callback: Функція (прогрес) після кожного 30-секундного вікна декодування Whisper:
+                audio_done_s, audio_total_s, fraction, throughput (аудіо-с / с), eta_s, segments
+            segment_callback: Функція (нові сегменти) — частковий результат по мірі готовності
+            precision: None — fp16 на CUDA / fp32 на CPU; "int8" — квантизована модель на CPU
+        """
+        return transcription_stream.collect(
+            Balthasar.transcribe_iter(audio_path, model_name, language, device, use_cache, precision),
+            progress_callback,
+            segment_callback
+        )
+
+    @staticmethod
+    def transcribe_iter(audio_path, model_name="base", language=None, device=None, use_cache=True, precision=None):
+        """
+        Генератор транскрибації: один суцільний прохід Whisper по всьому аудіо,
+        (нові сегменти, прогрес) віддаються після кожного вікна декодування.
+        Модель утримується в пулі, доки генератор не вичерпано або не закрито.
+        """
         if device is None:
             device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = whisper.load_model(model_name)
-        model = model.to(device)
-        options = {"fp16": device == "cuda", "verbose": True}
-        if language:
-            options["language"] = language
-        result = model.transcribe(str(audio_path), **options)
-        return result 
\ No newline at end of file
+        precision = Balthasar.resolve_precision(device, precision)
+        audio = audio_path if isinstance(audio_path, np.ndarray) else whisper.load_audio(str(audio_path))
+
+        def run():
+            key = (model_name, device, precision)
+            options = {"fp16": precision == "fp16"}
+            if language:
+                options["language"] = language
+            with WHISPER_POOL.use(key, lambda: Balthasar.load_model(model_name, device, precision)) as model:
+                yield from transcription_stream.iter_transcribe(model, audio, options)
+
+        options = {"precision": precision, "mode": "single"}
+        return Balthasar._cached_stream(audio, model_name, language, options, run, use_cache)
+
+    @staticmethod
+    def transcribe_parallel(audio, model_name="base", language=None, workers=None, threads_per_worker=None,
+                            use_cache=True, progress_callback=None, segment_callback=None, precision=None):
+        """
+        Паралельна транскрибація на CPU: аудіо ріжеться в паузах на шматки,
+        які обробляє пул процесів (див. parallel_transcribe.py).
+        Колбеки та precision — як у transcribe.
+        """
+        return transcription_stream.collect(
+            Balthasar.transcribe_parallel_iter(audio, model_name, language, workers, threads_per_worker, use_cache,
+                                               precision),
+            progress_callback,
+            segment_callback
+        )
+
+    @staticmethod
+    def transcribe_parallel_iter(audio, model_name="base", language=None, workers=None, threads_per_worker=None,
+                                 use_cache=True, precision=None):
+        """Генератор паралельної транскрибації: (нові сегменти в хронологічному порядку, прогрес)."""
+        from magi_pipeline.utils.parallel_transcribe import iter_transcribe_parallel, THREADS_PER_WORKER
+        if not isinstance(audio, np.ndarray):
+            audio = whisper.load_audio(str(audio))
+        precision = Balthasar.resolve_precision("cpu", precision)
+
+        def run():
+            return iter_transcribe_parallel(
+                audio,
+                model_name=model_name,
+                language=language,
+                precision=precision,
+                workers=workers,
+                threads_per_worker=threads_per_worker or THREADS_PER_WORKER
+            )
+
+        return Balthasar._cached_stream(
+            audio, model_name, language, {"precision": precision, "mode": "parallel"}, run, use_cache
+        )
+
+    @staticmethod
+    def _cached_stream(audio, model_name, language, options, run, use_cache):
+        if not use_cache:
+            yield from run()
+            return
+        cache = get_transcription_cache()
+        audio_hash = audio_fingerprint(audio)
+        key = transcript_key(audio_hash, model_name, language, options)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"♻️ Транскрипцію взято з кешу ({len(cached['segments'])} сегментів)")
+            yield from transcription_stream.replay(cached, len(audio) / SAMPLE_RATE)
+            return
+
+        # Кладемо в кеш лише повністю завершену транскрипцію
+        segments = []
+        detected_language = None
+        for new_segments, progress in run():
+            segments.extend(new_segments)
+            detected_language = detected_language or progress.get("language")
+            yield new_segments, progress
+        cache.put(key, {"segments": segments, "language": detected_language}, meta={
+            "audio_hash": audio_hash,
+            "model_name": model_name,
+            "language": language,
+            **options
+        })
+
+    @staticmethod
+    def model_stats():
+        """Статистика пулу моделей Whisper (hit/miss, час завантаження)."""
+        return WHISPER_POOL.stats()
\ No newline at end of file
@@ -1,6 +1,18 @@
-from magi_pipeline.ass_generator_module.ass_builder import generate_ass
+from pathlib import Path
+
+from magi_pipeline.ass_generator_module.ass_builder import generate_ass, generate_subtitle_files
  
 class Caspar:
     @staticmethod
-    def generate_subtitles(subs, output_path, style_path=None):
-        return generate_ass(subs=subs, output_path=output_path, style_path=style_path) 
\ No newline at end of file
+    def generate_subtitles(subs, output_path, style_path=None, text_column="text", formats=None):
+        """
+        Генерує ASS, а з formats — будь-який набір ("ass", "srt", "vtt") за один прохід.
+        Файли інших форматів лягають поруч з output_path з відповідним розширенням.
+
+        Returns:
+            {формат: шлях}, якщо задано formats
+        """
+        if formats is None:
+            return generate_ass(subs=subs, output_path=output_path, style_path=style_path, text_column=text_column)
+        output_paths = {fmt: str(Path(output_path).with_suffix(f".{fmt}")) for fmt in formats}
+        return generate_subtitle_files(subs, output_paths, style_path=style_path, text_column=text_column)
@@ -0,0 +1,207 @@
+"""
+charset.py — визначення кодування текстових файлів (субтитри) за один прохід.
+
+Файл відкривається один раз: обмежений зразок байтів переглядається через
+буфер (peek) без споживання, кодування визначається за BOM або статистично
+(UTF-8 проти cp1251 / cp1252), і той самий потік віддається вже декодованим.
+Результат кешується за (шлях, mtime, розмір), тож повторні відкриття того
+самого файлу (превʼю, мова, парсинг) не аналізують його знову.
+"""
+
+import codecs
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional, TextIO, Union
+
+# Скільки байтів аналізувати (і розмір буфера читання)
+SNIFF_BYTES = 64 * 1024
+
+# Скільки файлів пам'ятати в кеші
+_CACHE_SIZE = 512
+
+# BOM у порядку перевірки: UTF-32 LE починається так само, як UTF-16 LE
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Послідовності байтів, що в cp1251 є літерами кирилиці: А-я, Ёё, Єє, Іі, Її, Ґґ
+# (у cp1252 ті самі байти — літери з діакритикою: À-ÿ, ¨, ª тощо)
+_CP1251_LETTER_RUN = re.compile(rb"[\xc0-\xff\xa8\xb8\xaa\xba\xb2\xb3\xaf\xbf\xa5\xb4]+")
+
+# Розмітка ASS, що не несе інформації про кодування: блоки {\...} та \N, \n, \h
+_ASS_MARKUP = re.compile(rb"\{[^}\r\n]*\}|\\[Nnh]")
+
+
+class Charset(NamedTuple):
+    """Визначене кодування та впевненість (0..1); bom=True, якщо знайдено BOM."""
+    encoding: str
+    confidence: float
+    bom: bool = False
+
+
+def _utf16_without_bom(sample: bytes) -> Optional[str]:
+    # Латиниця/розмітка в UTF-16 дає нульовий байт у кожній другій позиції
+    if len(sample) < 4:
+        return None
+    even_zeros = sample[0::2].count(0) / (len(sample) // 2)
+    odd_zeros = sample[1::2].count(0) / (len(sample) // 2)
+    if odd_zeros > 0.3 and even_zeros < 0.05:
+        return "utf-16-le"
+    if even_zeros > 0.3 and odd_zeros < 0.05:
+        return "utf-16-be"
+    return None
+
+
+def _utf8_score(sample: bytes, truncated: bool) -> float:
+    """Частка не-ASCII символів, що декодуються як коректний UTF-8."""
+    if truncated:
+        # Зразок міг обрізати багатобайтовий символ
+        sample = sample[:len(sample) - 3] if len(sample) > 3 else sample
+    text = sample.decode("utf-8", errors="replace")
+    non_ascii = len(text) - len(text.encode("ascii", errors="ignore"))
+    if not non_ascii:
+        return 1.0
+    return (non_ascii - text.count("\ufffd")) / non_ascii
+
+
+def _is_ascii_letter(byte: int) -> bool:
+    return 0x41 <= byte <= 0x5A or 0x61 <= byte <= 0x7A
+
+
+def _cp1251_score(sample: bytes) -> float:
+    """
+    Наскільки старші байти зразка схожі на кирилицю в cp1251, а не на
+    західноєвропейські літери cp1252. ASCII (розмітка ASS, заголовки, теги)
+    у співвідношення не входить — рахуються лише серії старших байтів-літер:
+    - серія, що межує з латинською літерою ("Café", "Größe"), — ознака cp1252;
+    - окрема серія з двох і більше літер (ціле слово) — ознака cp1251;
+    - поодинока окрема літера ("à", "я") нічого не доводить.
+
+    Returns:
+        0..1; 0 — якщо ознак немає зовсім
+    """
+    text = _ASS_MARKUP.sub(b" ", sample)
+    cyrillic = latin = 0
+    for run in _CP1251_LETTER_RUN.finditer(text):
+        start, end = run.span()
+        if (start > 0 and _is_ascii_letter(text[start - 1])) or (end < len(text) and _is_ascii_letter(text[end])):
+            latin += end - start
+        elif end - start >= 2:
+            cyrillic += end - start
+    if not cyrillic + latin:
+        return 0.0
+    return cyrillic / (cyrillic + latin)
+
+
+def sniff(sample: bytes, truncated: bool = True) -> Charset:
+    """
+    Визначає кодування за зразком байтів.
+
+    Args:
+        sample: Початок файлу (до SNIFF_BYTES)
+        truncated: Зразок — лише частина файлу (останній символ може бути обрізаний)
+
+    Returns:
+        Charset; для тексту без BOM — utf-8, cp1251 або cp1252
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return Charset(encoding, 1.0, bom=True)
+
+    utf16 = _utf16_without_bom(sample)
+    if utf16:
+        return Charset(utf16, 0.9)
+
+    try:
+        # final=False: обрізаний на межі зразка символ не вважається помилкою
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=not truncated)
+        return Charset("utf-8", 1.0)
+    except UnicodeDecodeError:
+        pass
+
+    # Поодинокі биті послідовності трапляються і в UTF-8 файлах (склеєні субтитри)
+    utf8 = _utf8_score(sample, truncated)
+    cp1251 = _cp1251_score(sample)
+    if utf8 >= 0.95 and utf8 >= cp1251:
+        return Charset("utf-8", utf8)
+    if cp1251 >= 0.5:
+        return Charset("cp1251", cp1251)
+    return Charset("cp1252", 1.0 - cp1251)
+
+
+_cache: "OrderedDict[tuple, Charset]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(path: Union[str, Path], stat: os.stat_result) -> tuple:
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def _cached(key: tuple) -> Optional[Charset]:
+    with _cache_lock:
+        charset = _cache.get(key)
+        if charset is not None:
+            _cache.move_to_end(key)
+        return charset
+
+
+def _remember(key: tuple, charset: Charset):
+    with _cache_lock:
+        _cache[key] = charset
+        _cache.move_to_end(key)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _sniff_stream(path: Union[str, Path], raw: io.BufferedReader) -> Charset:
+    stat = os.fstat(raw.fileno())
+    key = _cache_key(path, stat)
+    charset = _cached(key)
+    if charset is None:
+        # peek не зсуває позицію: ті самі байти потім прочитає декодер
+        sample = raw.peek(SNIFF_BYTES)[:SNIFF_BYTES]
+        charset = sniff(sample, truncated=len(sample) < stat.st_size)
+        _remember(key, charset)
+    return charset
+
+
+def detect_charset(path: Union[str, Path]) -> Charset:
+    """Кодування файлу (з кешу, якщо файл не змінювався)."""
+    with open(path, "rb", buffering=SNIFF_BYTES) as raw:
+        return _sniff_stream(path, raw)
+
+
+def detect_encoding(path: Union[str, Path]) -> str:
+    """Назва кодування файлу для open()/decode()."""
+    return detect_charset(path).encoding
+
+
+def open_text(path: Union[str, Path], encoding: Optional[str] = None, newline: Optional[str] = "") -> TextIO:
+    """
+    Відкриває текстовий файл з автоматично визначеним кодуванням.
+
+    Файл читається один раз: зразок для аналізу береться з буфера того самого
+    потоку. BOM декодер пропускає сам (utf-8-sig / utf-16 / utf-32), биті
+    байти замінюються на U+FFFD.
+
+    Args:
+        path: Шлях до файлу
+        encoding: Явне кодування; None — визначити
+        newline: Як у open(); за замовчуванням переноси рядків не перетворюються
+    """
+    raw = open(path, "rb", buffering=SNIFF_BYTES)
+    try:
+        if encoding is None:
+            encoding = _sniff_stream(path, raw).encoding
+        return io.TextIOWrapper(raw, encoding=encoding, errors="replace", newline=newline)
+    except BaseException:
+        raw.close()
+        raise
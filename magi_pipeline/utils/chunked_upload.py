@@ -0,0 +1,310 @@
+"""
+chunked_upload.py — відновлюване завантаження відео шматками.
+
+Клієнт відкриває завантаження (start), а потім надсилає шматки з явним
+зсувом (write). Кожен шматок одразу пишеться у <кінцевий файл>.part і
+хешується (SHA-256) по мірі надходження, тож після останнього шматка файл
+лише перейменовується на місце, а повний хеш уже відомий — відео не
+перечитується ні для копіювання, ні для хешування.
+
+Перший шматок перевіряється за сигнатурою контейнера (Matroska/WebM, MP4,
+QuickTime, AVI): не-відео відхиляється після кількох кілобайтів, а не після
+повної передачі. Обірване з'єднання продовжується з останнього
+підтвердженого зсуву (status), у тому числі після перезапуску сервера.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+from magi_pipeline.utils.fingerprint import get_fingerprint_service
+
+# Рекомендований розмір шматка для клієнта
+UPLOAD_CHUNK_BYTES = int(os.environ.get("MAGI_UPLOAD_CHUNK_MB", "8")) * 1024 * 1024
+
+# Максимальний розмір відео
+MAX_UPLOAD_BYTES = 2 * 1024 * 1024 * 1024
+
+# Незавершені завантаження старші за цей час видаляються
+UPLOAD_TTL_SECONDS = int(os.environ.get("MAGI_UPLOAD_TTL_HOURS", "24")) * 3600
+
+# Блок читання тіла запиту: запис і хеш ідуть по мірі надходження
+_BLOCK_BYTES = 1024 * 1024
+
+# Скільки байтів потрібно для визначення контейнера
+SNIFF_BYTES = 16
+
+# Директорія метаданих незавершених завантажень (всередині папки uploads)
+_STATE_DIR = ".partial"
+
+
+class UploadError(Exception):
+    """Помилка завантаження з HTTP-статусом для відповіді."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def sniff_container(head: bytes) -> Optional[str]:
+    """
+    Контейнер за першими байтами файлу.
+
+    Returns:
+        "matroska" (MKV/WebM), "mp4", "quicktime", "avi" або None
+    """
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "matroska"
+    if head.startswith(b"RIFF") and head[8:12] == b"AVI ":
+        return "avi"
+    box = head[4:8]
+    if box == b"ftyp":
+        return "quicktime" if head[8:12] == b"qt  " else "mp4"
+    # Старі QuickTime файли починаються одразу з атомів без ftyp
+    if box in (b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"):
+        return "quicktime"
+    return None
+
+
+class Upload:
+    """Стан одного завантаження."""
+
+    def __init__(self, upload_id: str, filename: str, size: int, path: Path, created: float):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.size = size
+        self.path = path
+        self.partial_path = path.with_name(path.name + ".part")
+        self.created = created
+        self.updated = created
+        self.offset = 0
+        self.container: Optional[str] = None
+        self.sha256: Optional[str] = None
+        # Відповідь аналізу після останнього шматка (для клієнта, що втратив з'єднання)
+        self.result: Optional[Dict] = None
+        self.result_status = 200
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+
+    @property
+    def complete(self) -> bool:
+        return self.sha256 is not None
+
+    def status(self) -> Dict:
+        return {
+            "upload_id": self.upload_id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "container": self.container,
+            "complete": self.complete,
+            "sha256": self.sha256,
+        }
+
+    def meta(self) -> Dict:
+        # Зсув і хеш не зберігаються: після перезапуску їх відновлює сам .part файл
+        return {"upload_id": self.upload_id, "filename": self.filename, "size": self.size,
+                "path": str(self.path), "created": self.created, "container": self.container}
+
+
+class ChunkedUploads:
+    """
+    Реєстр завантажень. Метадані незавершених завантажень лежать у
+    <folder>/.partial/<id>.json, дані — у кінцевому файлі з суфіксом .part.
+    """
+
+    def __init__(self, folder: Union[str, Path], max_bytes: int = MAX_UPLOAD_BYTES,
+                 ttl_seconds: int = UPLOAD_TTL_SECONDS):
+        self.folder = Path(folder)
+        self.state_dir = self.folder / _STATE_DIR
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._uploads: Dict[str, Upload] = {}
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "completed": 0, "rejected": 0, "resumed": 0, "bytes_received": 0}
+
+    def _meta_path(self, upload_id: str) -> Path:
+        return self.state_dir / f"{upload_id}.json"
+
+    def start(self, filename: str, size: int) -> Upload:
+        """
+        Відкриває нове завантаження.
+
+        Args:
+            filename: Безпечне ім'я файлу (secure_filename)
+            size: Повний розмір файлу в байтах
+        """
+        if size <= 0:
+            raise UploadError("Порожній файл")
+        if size > self.max_bytes:
+            raise UploadError(f"Файл занадто великий (максимум {self.max_bytes // (1024 ** 3)}GB)", 413)
+        self.purge_stale()
+
+        upload_id = str(uuid.uuid4())
+        path = self.folder / f"{upload_id}_{filename}"
+        upload = Upload(upload_id, filename, size, path, time.time())
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        upload.partial_path.touch()
+        with open(self._meta_path(upload_id), "w", encoding="utf-8") as f:
+            json.dump(upload.meta(), f, ensure_ascii=False)
+        with self._lock:
+            self._uploads[upload_id] = upload
+            self._stats["started"] += 1
+        return upload
+
+    def get(self, upload_id: str) -> Upload:
+        """Стан завантаження; після перезапуску сервера відновлюється з диска."""
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+        if upload is not None:
+            return upload
+        upload = self._recover(upload_id)
+        with self._lock:
+            # Паралельний запит міг відновити той самий стан раніше
+            return self._uploads.setdefault(upload_id, upload)
+
+    def _recover(self, upload_id: str) -> Upload:
+        try:
+            uuid.UUID(upload_id)
+            with open(self._meta_path(upload_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (ValueError, OSError):
+            raise UploadError("Завантаження не знайдено", 404)
+
+        upload = Upload(upload_id, meta["filename"], meta["size"], Path(meta["path"]), meta["created"])
+        upload.container = meta.get("container")
+        if not upload.partial_path.exists():
+            raise UploadError("Завантаження не знайдено", 404)
+        # Хеш відновлюється з уже отриманих байтів: одне читання частини файлу
+        buffer = bytearray(_BLOCK_BYTES * 8)
+        view = memoryview(buffer)
+        with open(upload.partial_path, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                upload.hasher.update(view[:n])
+                upload.offset += n
+        with self._lock:
+            self._stats["resumed"] += 1
+        return upload
+
+    def write(self, upload_id: str, offset: int, stream: BinaryIO, length: Optional[int] = None) -> Upload:
+        """
+        Дописує шматок, починаючи з offset.
+
+        Дані пишуться і хешуються блоками по мірі читання stream; якщо з'єднання
+        обірвалось посередині, підтвердженим лишається все, що вже записано.
+
+        Args:
+            offset: Зсув шматка; має дорівнювати поточному (інакше 409)
+            stream: Тіло запиту
+            length: Довжина шматка (Content-Length), якщо відома
+
+        Raises:
+            UploadError: 404 — немає завантаження, 409 — неправильний зсув,
+                415 — не відео, 400 — шматок виходить за межі файлу
+        """
+        upload = self.get(upload_id)
+        with upload.lock:
+            if upload.complete:
+                raise UploadError("Завантаження вже завершено", 409)
+            if offset != upload.offset:
+                raise UploadError(f"Очікувався зсув {upload.offset}, отримано {offset}", 409)
+            if length is not None and offset + length > upload.size:
+                raise UploadError("Шматок виходить за межі оголошеного розміру файлу")
+
+            with open(upload.partial_path, "r+b") as f:
+                f.seek(offset)
+                f.truncate()
+                if offset == 0:
+                    # Перший шматок: контейнер визначається до запису решти даних
+                    head = stream.read(min(SNIFF_BYTES, upload.size))
+                    container = sniff_container(head)
+                    if container is None:
+                        self.abort(upload_id)
+                        with self._lock:
+                            self._stats["rejected"] += 1
+                        raise UploadError("Файл не є відео (MKV, MP4, MOV або AVI) — перевірено за сигнатурою", 415)
+                    upload.container = container
+                    self._write_block(upload, f, head)
+                    with open(self._meta_path(upload_id), "w", encoding="utf-8") as meta:
+                        json.dump(upload.meta(), meta, ensure_ascii=False)
+                while True:
+                    block = stream.read(_BLOCK_BYTES)
+                    if not block:
+                        break
+                    if upload.offset + len(block) > upload.size:
+                        raise UploadError("Отримано більше даних, ніж оголошений розмір файлу")
+                    self._write_block(upload, f, block)
+            upload.updated = time.time()
+
+            if upload.offset == upload.size:
+                self._finish(upload)
+        return upload
+
+    def _write_block(self, upload: Upload, f, block: bytes):
+        f.write(block)
+        upload.hasher.update(block)
+        upload.offset += len(block)
+        with self._lock:
+            self._stats["bytes_received"] += len(block)
+
+    def _finish(self, upload: Upload):
+        # Перейменування, а не копіювання: дані вже лежать у кінцевій директорії
+        os.replace(upload.partial_path, upload.path)
+        upload.sha256 = upload.hasher.hexdigest()
+        self._meta_path(upload.upload_id).unlink(missing_ok=True)
+        # Повний хеш уже порахований — фоновий сервіс не перечитуватиме файл
+        get_fingerprint_service().record_full_hash(upload.path, upload.sha256)
+        with self._lock:
+            self._stats["completed"] += 1
+
+    def abort(self, upload_id: str):
+        """Скасовує незавершене завантаження і видаляє отримані дані."""
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+        if upload is not None and not upload.complete:
+            upload.partial_path.unlink(missing_ok=True)
+        meta_path = self._meta_path(upload_id)
+        if upload is None and meta_path.exists():
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    path = Path(json.load(f)["path"])
+                path.with_name(path.name + ".part").unlink(missing_ok=True)
+            except (ValueError, KeyError, OSError):
+                pass
+        meta_path.unlink(missing_ok=True)
+
+    def purge_stale(self):
+        """Видаляє незавершені завантаження, яких не продовжували довше за TTL."""
+        if not self.state_dir.is_dir():
+            return
+        deadline = time.time() - self.ttl_seconds
+        for meta_path in self.state_dir.glob("*.json"):
+            upload_id = meta_path.stem
+            with self._lock:
+                upload = self._uploads.get(upload_id)
+            updated = upload.updated if upload else meta_path.stat().st_mtime
+            if upload is None:
+                partial = None
+                try:
+                    with open(meta_path, "r", encoding="utf-8") as f:
+                        path = Path(json.load(f)["path"])
+                    partial = path.with_name(path.name + ".part")
+                except (ValueError, KeyError, OSError):
+                    pass
+                if partial is not None and partial.exists():
+                    updated = max(updated, partial.stat().st_mtime)
+            if updated < deadline:
+                self.abort(upload_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            active = sum(1 for upload in self._uploads.values() if not upload.complete)
+            return {**self._stats, "active": active, "chunk_bytes": UPLOAD_CHUNK_BYTES}
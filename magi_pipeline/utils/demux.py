@@ -0,0 +1,229 @@
+"""
+demux.py — витягування аудіо та субтитрів з відео за одне читання контейнера.
+
+Раніше кожен потік субтитрів витягувався окремим `ffmpeg -i video -map 0:N`,
+а аудіо — ще одним запуском, і кожен з них читав і демультиплексував увесь
+файл. Тут один запуск ffmpeg має кілька виходів:
+- обрана аудіодоріжка декодується в моно s16le 16 кГц у pipe і одразу
+  перетворюється на float32 для Whisper (довгі записи — у memory-mapped файл);
+- кожен текстовий потік субтитрів копіюється у файл у власному форматі
+  (ASS лишається ASS, SRT — SRT, mov_text з MP4 перетворюється на SRT).
+
+Результат — маніфест (DemuxManifest) з шляхами та метаданими артефактів.
+"""
+
+import os
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from magi_pipeline.utils.media_probe import SUBTITLE_EXTENSIONS, StreamInfo, probe_media
+from magi_pipeline.utils.vad import SAMPLE_RATE
+
+# Понад цей розмір (float32) декодоване аудіо тримається в memory-mapped файлі, а не в RAM
+AUDIO_MMAP_THRESHOLD_MB = int(os.environ.get("MAGI_AUDIO_MMAP_MB", "512"))
+
+# Розмір шматка, який читаємо з pipe ffmpeg
+_PIPE_CHUNK_BYTES = 1024 * 1024
+
+# Текстові субтитри без власного файлового формату: перетворюються на SRT
+# (це лише перепаковка тексту, відео й аудіо не зачіпаються)
+_CONVERT_TO_SRT = {"mov_text", "text"}
+
+
+class ExtractedSubtitle(NamedTuple):
+    """Витягнутий потік субтитрів."""
+    index: int
+    codec: str
+    language: str
+    title: str
+    format: str
+    path: str
+
+
+class DemuxManifest(NamedTuple):
+    """Що витягнуто з відео за один прохід."""
+    video_path: str
+    audio: Optional[np.ndarray]
+    audio_stream_index: Optional[int]
+    subtitles: List[ExtractedSubtitle]
+    skipped: List[StreamInfo]
+
+    @property
+    def audio_duration(self) -> Optional[float]:
+        return len(self.audio) / SAMPLE_RATE if self.audio is not None else None
+
+    def subtitle(self, index: int) -> Optional[ExtractedSubtitle]:
+        """Витягнутий потік за абсолютним індексом (як у analyze_video / ffprobe)."""
+        for subtitle in self.subtitles:
+            if subtitle.index == index:
+                return subtitle
+        return None
+
+    def to_dict(self) -> Dict:
+        """Маніфест для JSON (без самого аудіо)."""
+        return {
+            "video_path": self.video_path,
+            "audio": {
+                "stream_index": self.audio_stream_index,
+                "samples": len(self.audio),
+                "sample_rate": SAMPLE_RATE,
+                "duration": self.audio_duration,
+            } if self.audio is not None else None,
+            "subtitles": [subtitle._asdict() for subtitle in self.subtitles],
+            "skipped": [{"index": stream.index, "codec": stream.codec_name} for stream in self.skipped],
+        }
+
+
+def subtitle_target(stream: StreamInfo) -> Optional[str]:
+    """Формат (розширення) файлу для потоку субтитрів; None — потік не текстовий (PGS, DVD)."""
+    if stream.codec_name in _CONVERT_TO_SRT:
+        return "srt"
+    return SUBTITLE_EXTENSIONS.get(stream.codec_name)
+
+
+def build_demux_command(video_path: Union[str, Path], subtitle_outputs: Iterable[tuple] = (),
+                        audio: bool = True, audio_stream_index: Optional[int] = None) -> list:
+    """
+    Команда ffmpeg з кількома виходами для одного читання вхідного файлу.
+
+    Args:
+        video_path: Відео
+        subtitle_outputs: (індекс потоку, кодек, шлях) для кожного потоку субтитрів
+        audio: Додати вихід аудіо (s16le моно 16 кГц у stdout)
+        audio_stream_index: Абсолютний індекс аудіо потоку; None — потік, який обирає ffmpeg
+    """
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-i", str(video_path)]
+    for index, codec, path in subtitle_outputs:
+        cmd += ["-map", f"0:{index}", "-c", "srt" if codec in _CONVERT_TO_SRT else "copy", str(path)]
+    if audio:
+        if audio_stream_index is not None:
+            cmd += ["-map", f"0:{audio_stream_index}"]
+        cmd += ["-vn", "-sn", "-dn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+                "-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"]
+    return cmd
+
+
+def _pcm_to_float(pcm) -> np.ndarray:
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+
+def _read_pcm(stream, mmap_dir=None, mmap_threshold_bytes=AUDIO_MMAP_THRESHOLD_MB * 1024 * 1024) -> np.ndarray:
+    """
+    Читає s16le з pipe і перетворює на float32; після порогу дані йдуть у
+    memory-mapped файл замість RAM.
+    """
+    pcm = bytearray()
+    spill = None
+    try:
+        while True:
+            chunk = stream.read(_PIPE_CHUNK_BYTES)
+            if not chunk:
+                break
+            if spill is None:
+                pcm += chunk
+                # int16 -> float32 подвоює розмір
+                if len(pcm) * 2 > mmap_threshold_bytes:
+                    spill = tempfile.NamedTemporaryFile(dir=mmap_dir, suffix=".f32", delete=False)
+                    spill.write(_pcm_to_float(pcm).tobytes())
+                    pcm = bytearray()
+            else:
+                spill.write(_pcm_to_float(chunk).tobytes())
+
+        if spill is None:
+            return _pcm_to_float(pcm)
+
+        spill.close()
+        audio = np.memmap(spill.name, dtype=np.float32, mode="r")
+        try:
+            # Відображення тримає дані, сам файл можна прибрати одразу (POSIX)
+            os.unlink(spill.name)
+        except OSError:
+            pass
+        return audio
+    finally:
+        if spill is not None and not spill.closed:
+            spill.close()
+            os.unlink(spill.name)
+
+
+def demux(video_path: Union[str, Path], output_dir: Union[str, Path, None] = None, prefix: str = "",
+          audio: bool = True, audio_stream_index: Optional[int] = None,
+          subtitle_streams: Optional[Iterable[int]] = None, mmap_dir=None,
+          mmap_threshold_bytes: int = AUDIO_MMAP_THRESHOLD_MB * 1024 * 1024) -> DemuxManifest:
+    """
+    Витягує аудіо та субтитри одним запуском ffmpeg.
+
+    Args:
+        video_path: Відео
+        output_dir: Куди писати субтитри (потрібна, якщо є що витягувати)
+        prefix: Префікс імен файлів: "{prefix}subs_{індекс}.{формат}"
+        audio: Декодувати аудіо
+        audio_stream_index: Абсолютний індекс аудіо потоку; None — за замовчуванням ffmpeg
+        subtitle_streams: Індекси потоків субтитрів; None — усі текстові, [] — жодного
+        mmap_dir: Директорія для memory-mapped аудіо (за замовчуванням системна temp)
+        mmap_threshold_bytes: Поріг розміру float32, після якого аудіо йде у memmap
+
+    Returns:
+        DemuxManifest; нетекстові потоки (PGS, DVD) — у skipped
+
+    Raises:
+        RuntimeError: ffmpeg завершився з помилкою
+        ValueError: Потік субтитрів з таким індексом не існує
+    """
+    requested = None if subtitle_streams is None else [int(index) for index in subtitle_streams]
+    streams: List[StreamInfo] = []
+    if requested is None or requested:
+        available = {stream.index: stream for stream in probe_media(video_path).subtitle_streams}
+        if requested is None:
+            streams = list(available.values())
+        else:
+            missing = [index for index in requested if index not in available]
+            if missing:
+                raise ValueError(f"❌ У відео немає потоку субтитрів з індексом {missing[0]}")
+            streams = [available[index] for index in requested]
+
+    subtitles: List[ExtractedSubtitle] = []
+    skipped: List[StreamInfo] = []
+    outputs = []
+    for stream in streams:
+        target = subtitle_target(stream)
+        if target is None:
+            skipped.append(stream)
+            continue
+        if output_dir is None:
+            raise ValueError("❌ Для витягування субтитрів потрібна output_dir")
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        path = Path(output_dir) / f"{prefix}subs_{stream.index}.{target}"
+        outputs.append((stream.index, stream.codec_name, path))
+        subtitles.append(ExtractedSubtitle(stream.index, stream.codec_name, stream.language,
+                                           stream.title, target, str(path)))
+
+    if not outputs and not audio:
+        return DemuxManifest(str(video_path), None, None, subtitles, skipped)
+
+    cmd = build_demux_command(video_path, outputs, audio, audio_stream_index)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE if audio else subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # stderr читаємо паралельно, щоб ffmpeg не заблокувався на повному буфері
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    stderr_thread.start()
+
+    try:
+        samples = _read_pcm(proc.stdout, mmap_dir, mmap_threshold_bytes) if audio else None
+        proc.wait()
+        stderr_thread.join()
+        if proc.returncode != 0:
+            error = b"".join(stderr_chunks).decode("utf-8", errors="replace").strip()
+            what = "витягти потоки" if outputs else "декодувати аудіо"
+            raise RuntimeError(f"ffmpeg не зміг {what}: {error}")
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    return DemuxManifest(str(video_path), samples, audio_stream_index, subtitles, skipped)
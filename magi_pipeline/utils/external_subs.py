@@ -7,13 +7,18 @@ import re
 from pathlib import Path
 from typing import List, Dict, Optional
 
-def find_external_subtitles(video_path: Path, search_dirs: List[Path]) -> List[Dict]:
+from magi_pipeline.utils.charset import open_text
+from magi_pipeline.utils.subtitle_parser import preview_lines
+
+def find_external_subtitles(video_path: Path, search_dirs: List[Path],
+                            exclude_dirs: Optional[List[Path]] = None) -> List[Dict]:
     """
     Знаходить зовнішні файли субтитрів для відеофайлу
     
     Args:
-        video_path: Шлях до відеофайлу
+        video_path: Шлях до відеофайлу (для порівняння використовується лише ім'я)
         search_dirs: Директорії для пошуку
+        exclude_dirs: Піддиректорії, які не переглядаються (наприклад, сховище відео)
     
     Returns:
         Список знайдених субтитрів з метаданими
@@ -21,6 +26,7 @@ def find_external_subtitles(video_path: Path, search_dirs: List[Path]) -> List[D
     video_name = video_path.stem
     subtitle_extensions = ['.srt', '.ass', '.ssa', '.vtt', '.sub']
     found_subtitles = []
+    excluded = [Path(directory).resolve() for directory in exclude_dirs or []]
     
     for search_dir in search_dirs:
         if not search_dir.exists():
@@ -29,6 +35,8 @@ def find_external_subtitles(video_path: Path, search_dirs: List[Path]) -> List[D
         # Шукаємо файли субтитрів
         for sub_file in search_dir.rglob("*"):
             if sub_file.suffix.lower() in subtitle_extensions:
+                if any(sub_file.resolve().is_relative_to(directory) for directory in excluded):
+                    continue
                 match_score = calculate_name_similarity(video_name, sub_file.stem)
                 
                 if match_score > 0.3:  # Мінімальний поріг схожості
@@ -145,21 +153,9 @@ def detect_language_from_content(subtitle_path: Path) -> Optional[str]:
     """
     Визначає мову на основі вмісту субтитрів
     """
-    try:
-        # Читаємо перші 1000 символів
-        with open(subtitle_path, 'r', encoding='utf-8') as f:
-            content = f.read(1000)
-    except UnicodeDecodeError:
-        # Пробуємо інші кодування
-        for encoding in ['cp1251', 'latin1', 'cp1252']:
-            try:
-                with open(subtitle_path, 'r', encoding=encoding) as f:
-                    content = f.read(1000)
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            return None
+    # Читаємо перші 1000 символів (кодування визначається один раз і кешується)
+    with open_text(subtitle_path) as f:
+        content = f.read(1000)
     
     # Простий аналіз на основі характерних символів
     cyrillic_count = len(re.findall(r'[а-яё]', content, re.IGNORECASE))
@@ -196,45 +192,9 @@ def get_subtitle_preview(subtitle_path: Path, max_lines: int = 3) -> List[str]:
         Список текстових рядків
     """
     try:
-        with open(subtitle_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        # Пробуємо інші кодування
-        for encoding in ['cp1251', 'latin1', 'cp1252']:
-            try:
-                with open(subtitle_path, 'r', encoding=encoding) as f:
-                    content = f.read()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            return ["Не вдалося прочитати файл"]
-    
-    lines = []
-    
-    if subtitle_path.suffix.lower() == '.srt':
-        # Парсинг SRT
-        pattern = re.compile(r'(\d+)\s+([\d:,]+)\s+-->\s+([\d:,]+)\s+([\s\S]*?)(?=\n\d+\n|\Z)', re.MULTILINE)
-        matches = list(pattern.finditer(content))
-        
-        for match in matches[:max_lines]:
-            text = match.group(4).replace('\n', ' ').strip()
-            text = re.sub(r'\s+', ' ', text)  # Множинні пробіли
-            if text and len(text) > 5:
-                lines.append(text[:100] + ('...' if len(text) > 100 else ''))
-                
-    elif subtitle_path.suffix.lower() in ['.ass', '.ssa']:
-        # Парсинг ASS
-        for line in content.split('\n'):
-            if line.startswith('Dialogue:'):
-                parts = line.split(',', 9)
-                if len(parts) >= 10:
-                    text = parts[9].replace('\\N', ' ').strip()
-                    text = re.sub(r'\{.*?\}', '', text)  # Видаляємо теги
-                    text = re.sub(r'\s+', ' ', text)
-                    if text and len(text) > 5:
-                        lines.append(text[:100] + ('...' if len(text) > 100 else ''))
-                        if len(lines) >= max_lines:
-                            break
-    
-    return lines[:max_lines] if lines else ["Не вдалося отримати превʼю"]
\ No newline at end of file
+        # Читаємо файл лише до потрібної кількості реплік
+        lines = preview_lines(subtitle_path, max_lines, min_length=6, max_length=100)
+    except (OSError, ValueError):
+        return ["Не вдалося прочитати файл"]
+
+    return lines if lines else ["Не вдалося отримати превʼю"]
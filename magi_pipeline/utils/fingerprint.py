@@ -0,0 +1,257 @@
+"""
+fingerprint.py — відбитки відеофайлів без повторного читання гігабайтів.
+
+Два рівні:
+- швидкий відбиток (blake2b від розміру, початку, кінця та рівномірно
+  розкиданих блоків) — кілька МБ читання незалежно від розміру файлу,
+  для перевірок "це той самий файл";
+- повний SHA-256 — рахується один раз у фоновому потоці великими блоками.
+
+Обидва зберігаються в постійному індексі (SQLite, режим WAL) за ключем
+(пристрій, inode, розмір, mtime), тож незмінений файл не хешується вдруге
+ні в цьому процесі, ні після перезапуску.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+DEFAULT_INDEX_PATH = Path(os.environ.get("MAGI_FINGERPRINT_INDEX", "cache/fingerprints.sqlite3"))
+
+# Розмір блоку читання для повного хешу
+HASH_BUFFER_BYTES = int(os.environ.get("MAGI_HASH_BUFFER_MB", "8")) * 1024 * 1024
+
+# Швидкий відбиток: початок і кінець файлу + рівномірно розкидані блоки
+QUICK_EDGE_BYTES = 1024 * 1024
+QUICK_BLOCK_BYTES = 64 * 1024
+QUICK_BLOCKS = 16
+
+# Версія схеми швидкого відбитка — зміна параметрів вище дає інші значення
+_QUICK_VERSION = "q1"
+
+FileKey = Tuple[int, int, int, int]
+
+
+def file_key(stat: os.stat_result) -> FileKey:
+    """Ключ індексу: (пристрій, inode, розмір, mtime_ns)."""
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def quick_fingerprint(path: Union[str, Path]) -> str:
+    """
+    Швидкий відбиток файлу: розмір, перший і останній МБ та 16 блоків по 64 КБ
+    на рівних відстанях. Малі файли хешуються повністю.
+    """
+    size = os.path.getsize(path)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(size.to_bytes(8, "little"))
+    with open(path, "rb", buffering=0) as f:
+        if size <= 2 * QUICK_EDGE_BYTES + QUICK_BLOCKS * QUICK_BLOCK_BYTES:
+            h.update(f.read())
+        else:
+            spans = [(0, QUICK_EDGE_BYTES)]
+            spans += [(size * i // (QUICK_BLOCKS + 1), QUICK_BLOCK_BYTES) for i in range(1, QUICK_BLOCKS + 1)]
+            spans.append((size - QUICK_EDGE_BYTES, QUICK_EDGE_BYTES))
+            for offset, length in spans:
+                f.seek(offset)
+                h.update(f.read(length))
+    return f"{_QUICK_VERSION}-{h.hexdigest()}"
+
+
+def full_sha256(path: Union[str, Path], buffer_bytes: int = HASH_BUFFER_BYTES) -> str:
+    """Повний SHA-256 великими блоками в один буфер (hashlib відпускає GIL на великих блоках)."""
+    h = hashlib.sha256()
+    buffer = bytearray(buffer_bytes)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            # Підказка ядру про послідовне читання: більший readahead
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            h.update(view[:n])
+    return h.hexdigest()
+
+
+class FingerprintIndex:
+    """
+    Постійний індекс відбитків. Одне з'єднання на потік, запис серіалізується локом.
+    Для кожного шляху зберігається лише остання версія файлу.
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        conn = self._connect()
+        with self._write_lock:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    dev INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    quick TEXT,
+                    sha256 TEXT,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (dev, inode, size, mtime_ns)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_path ON fingerprints (path)")
+            conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, key: FileKey) -> Dict[str, Optional[str]]:
+        """{"quick", "sha256"} для файлу; порожній словник, якщо запису немає."""
+        row = self._connect().execute(
+            "SELECT quick, sha256 FROM fingerprints WHERE dev=? AND inode=? AND size=? AND mtime_ns=?", key
+        ).fetchone()
+        return {"quick": row[0], "sha256": row[1]} if row else {}
+
+    def store(self, key: FileKey, path: str, quick: Optional[str] = None, sha256: Optional[str] = None):
+        """Зберігає відбитки (None не затирає вже відоме значення)."""
+        conn = self._connect()
+        with self._write_lock:
+            # Старі версії того самого шляху вже не знадобляться
+            conn.execute(
+                "DELETE FROM fingerprints WHERE path=? AND NOT (dev=? AND inode=? AND size=? AND mtime_ns=?)",
+                (path, *key)
+            )
+            conn.execute(
+                "INSERT INTO fingerprints (dev, inode, size, mtime_ns, path, quick, sha256, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (dev, inode, size, mtime_ns) DO UPDATE SET "
+                "path=excluded.path, quick=COALESCE(excluded.quick, quick), "
+                "sha256=COALESCE(excluded.sha256, sha256), updated=excluded.updated",
+                (*key, path, quick, sha256, time.time())
+            )
+            conn.commit()
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+
+
+class FingerprintService:
+    """
+    Швидкі відбитки на вимогу та повний SHA-256 у фоні, обидва через індекс.
+    Один фоновий потік: паралельне читання кількох гігабайтних файлів з одного
+    диска лише сповільнює кожне з них.
+    """
+
+    def __init__(self, index: Optional[FingerprintIndex] = None):
+        self.index = index or FingerprintIndex()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sha256")
+        self._pending: Dict[FileKey, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"quick_computed": 0, "quick_hits": 0, "full_computed": 0, "full_hits": 0,
+                       "bytes_hashed": 0}
+
+    def fingerprint(self, path: Union[str, Path]) -> str:
+        """Швидкий відбиток (з індексу, якщо файл не змінювався)."""
+        path = os.path.abspath(path)
+        key = file_key(os.stat(path))
+        known = self.index.lookup(key).get("quick")
+        if known:
+            with self._lock:
+                self._stats["quick_hits"] += 1
+            return known
+        quick = quick_fingerprint(path)
+        self.index.store(key, path, quick=quick)
+        with self._lock:
+            self._stats["quick_computed"] += 1
+        return quick
+
+    def schedule_full_hash(self, path: Union[str, Path]) -> Future:
+        """
+        Ставить повний SHA-256 у фонову чергу. Якщо хеш уже відомий або вже
+        рахується для цієї версії файлу, повертає готовий/той самий Future.
+        """
+        path = os.path.abspath(path)
+        key = file_key(os.stat(path))
+        known = self.index.lookup(key).get("sha256")
+        if known:
+            with self._lock:
+                self._stats["full_hits"] += 1
+            done: Future = Future()
+            done.set_result(known)
+            return done
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._compute_full, path, key)
+                self._pending[key] = future
+            return future
+
+    def _compute_full(self, path: str, key: FileKey) -> str:
+        try:
+            sha256 = full_sha256(path)
+            # Файл змінився під час читання — такий хеш не належить жодній версії
+            if file_key(os.stat(path)) != key:
+                raise RuntimeError(f"❌ Файл змінився під час хешування: {path}")
+            self.index.store(key, path, sha256=sha256)
+            with self._lock:
+                self._stats["full_computed"] += 1
+                self._stats["bytes_hashed"] += key[2]
+            return sha256
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def record_full_hash(self, path: Union[str, Path], sha256: str):
+        """Запам'ятовує SHA-256, порахований деінде (наприклад, під час завантаження)."""
+        path = os.path.abspath(path)
+        self.index.store(file_key(os.stat(path)), path, sha256=sha256)
+
+    def full_hash(self, path: Union[str, Path], wait: bool = True) -> Optional[str]:
+        """
+        Повний SHA-256. wait=False не блокує: повертає None, якщо хеш ще рахується
+        (і ставить його в чергу, якщо ще не поставлено).
+        """
+        future = self.schedule_full_hash(path)
+        if wait or future.done():
+            return future.result()
+        return None
+
+    def identify(self, path: Union[str, Path]) -> Dict[str, object]:
+        """Швидкий відбиток, розмір і повний хеш, якщо він уже відомий (без очікування)."""
+        return {
+            "fingerprint": self.fingerprint(path),
+            "size": os.path.getsize(path),
+            "sha256": self.full_hash(path, wait=False),
+        }
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {**self._stats, "pending": len(self._pending), "entries": self.index.count(),
+                    "path": str(self.index.path)}
+
+
+_default_service: Optional[FingerprintService] = None
+_default_lock = threading.Lock()
+
+
+def get_fingerprint_service() -> FingerprintService:
+    """Повертає спільний для процесу сервіс відбитків (створюється при першому зверненні)."""
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = FingerprintService()
+        return _default_service
@@ -0,0 +1,303 @@
+"""
+media_probe.py — єдиний аналіз медіафайлу через ffprobe.
+
+Один виклик ffprobe (-show_streams -show_format -show_chapters) дає все, що
+раніше збиралося кількома окремими запусками: перевірку "це відео",
+аудіодоріжки й субтитри для web-інтерфейсу, потоки субтитрів для скриптів
+(замість розбору stderr `ffmpeg -i` регулярним виразом), тривалість, глави
+та вкладення зі шрифтами. Результат — типізовані структури, кешовані за
+швидким відбитком файлу, тож повторний аналіз того самого відео не запускає
+ffprobe знову.
+"""
+
+import json
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from magi_pipeline.utils.fingerprint import get_fingerprint_service
+
+# Скільки результатів пам'ятати
+_CACHE_SIZE = 256
+
+# Розширення файлу для потоку субтитрів, скопійованого без перекодування (-c copy)
+SUBTITLE_EXTENSIONS = {
+    "ass": "ass",
+    "ssa": "ssa",
+    "subrip": "srt",
+    "srt": "srt",
+    "webvtt": "vtt",
+}
+
+
+class MediaProbeError(RuntimeError):
+    """ffprobe не зміг розібрати файл."""
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _tag_duration(value: Optional[str]) -> Optional[float]:
+    # Matroska зберігає тривалість потоку лише в тегу DURATION: "00:23:40.021000000"
+    if not value:
+        return None
+    try:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+class StreamInfo(NamedTuple):
+    """Потік контейнера (відео, аудіо, субтитри, вкладення)."""
+    index: int
+    codec_type: str
+    codec_name: str
+    language: str
+    title: str
+    duration: Optional[float]
+    default: bool
+    forced: bool
+    attached_pic: bool
+    channels: int
+    sample_rate: int
+    width: int
+    height: int
+    tags: Dict[str, str]
+
+    @property
+    def is_text_subtitle(self) -> bool:
+        """Текстові субтитри, які можна скопіювати у файл без перекодування."""
+        return self.codec_type == "subtitle" and self.codec_name in SUBTITLE_EXTENSIONS
+
+    @property
+    def extension(self) -> str:
+        """Розширення файлу для витягнутих субтитрів (для нетекстових — назва кодека)."""
+        return SUBTITLE_EXTENSIONS.get(self.codec_name, self.codec_name)
+
+    def describe(self) -> str:
+        """Рядок для консолі: "#3 subtitle ass (rus) «Полные субтитры» [default]"."""
+        parts = [f"#{self.index} {self.codec_type} {self.codec_name} ({self.language})"]
+        if self.title:
+            parts.append(f"«{self.title}»")
+        if self.default:
+            parts.append("[default]")
+        if self.forced:
+            parts.append("[forced]")
+        return " ".join(parts)
+
+
+class Chapter(NamedTuple):
+    """Глава (у аніме зазвичай Opening / Episode / Ending)."""
+    id: int
+    start: float
+    end: float
+    title: str
+
+
+class Attachment(NamedTuple):
+    """Вкладений файл контейнера (шрифти для ASS)."""
+    index: int
+    filename: str
+    mimetype: str
+
+
+class MediaInfo(NamedTuple):
+    """Результат аналізу медіафайлу."""
+    path: str
+    fingerprint: str
+    format_name: str
+    duration: Optional[float]
+    size: int
+    bit_rate: Optional[int]
+    streams: List[StreamInfo]
+    chapters: List[Chapter]
+
+    def streams_of(self, codec_type: str) -> List[StreamInfo]:
+        return [stream for stream in self.streams if stream.codec_type == codec_type]
+
+    @property
+    def video_streams(self) -> List[StreamInfo]:
+        # Обкладинки (attached_pic) формально теж відеопотоки, але не відео
+        return [stream for stream in self.streams_of("video") if not stream.attached_pic]
+
+    @property
+    def audio_streams(self) -> List[StreamInfo]:
+        return self.streams_of("audio")
+
+    @property
+    def subtitle_streams(self) -> List[StreamInfo]:
+        return self.streams_of("subtitle")
+
+    @property
+    def attachments(self) -> List[Attachment]:
+        return [Attachment(stream.index, stream.tags.get("filename", ""),
+                           stream.tags.get("mimetype", ""))
+                for stream in self.streams_of("attachment")]
+
+    @property
+    def has_video(self) -> bool:
+        return bool(self.video_streams)
+
+    def to_dict(self) -> Dict:
+        """Словник для JSON (відповідь web-інтерфейсу)."""
+        return {
+            "format": self.format_name,
+            "duration": self.duration,
+            "size": self.size,
+            "bit_rate": self.bit_rate,
+            "chapters": [chapter._asdict() for chapter in self.chapters],
+            "attachments": [attachment._asdict() for attachment in self.attachments],
+        }
+
+
+def _parse_stream(raw: Dict) -> StreamInfo:
+    tags = {str(key): str(value) for key, value in (raw.get("tags") or {}).items()}
+    disposition = raw.get("disposition") or {}
+    duration = _float(raw.get("duration"))
+    if duration is None:
+        duration = _tag_duration(tags.get("DURATION") or tags.get("duration"))
+    return StreamInfo(
+        index=int(raw.get("index", 0)),
+        codec_type=raw.get("codec_type", "unknown"),
+        codec_name=raw.get("codec_name", "unknown"),
+        language=tags.get("language", "unknown"),
+        title=tags.get("title", ""),
+        duration=duration,
+        default=bool(disposition.get("default")),
+        forced=bool(disposition.get("forced")),
+        attached_pic=bool(disposition.get("attached_pic")),
+        channels=int(raw.get("channels") or 0),
+        sample_rate=int(raw.get("sample_rate") or 0),
+        width=int(raw.get("width") or 0),
+        height=int(raw.get("height") or 0),
+        tags=tags,
+    )
+
+
+def parse_probe(data: Dict, path: str, fingerprint: str = "") -> MediaInfo:
+    """
+    Перетворює JSON ffprobe на MediaInfo.
+
+    Args:
+        data: Вивід ffprobe -print_format json -show_streams -show_format -show_chapters
+        path: Шлях до файлу
+        fingerprint: Відбиток файлу (ключ кешу)
+    """
+    fmt = data.get("format") or {}
+    streams = [_parse_stream(raw) for raw in data.get("streams", [])]
+    chapters = [
+        Chapter(int(raw.get("id", i)), _float(raw.get("start_time")) or 0.0,
+                _float(raw.get("end_time")) or 0.0, (raw.get("tags") or {}).get("title", ""))
+        for i, raw in enumerate(data.get("chapters", []))
+    ]
+    duration = _float(fmt.get("duration"))
+    if duration is None:
+        known = [stream.duration for stream in streams if stream.duration]
+        duration = max(known) if known else None
+    bit_rate = _float(fmt.get("bit_rate"))
+    return MediaInfo(
+        path=path,
+        fingerprint=fingerprint,
+        format_name=fmt.get("format_name", "unknown"),
+        duration=duration,
+        size=int(fmt.get("size") or 0),
+        bit_rate=int(bit_rate) if bit_rate is not None else None,
+        streams=streams,
+        chapters=chapters,
+    )
+
+
+def run_ffprobe(path: Union[str, Path], timeout: Optional[float] = 60) -> Dict:
+    """Один запуск ffprobe з потоками, форматом і главами; повертає розібраний JSON."""
+    try:
+        probe = subprocess.run([
+            "ffprobe", "-v", "error", "-print_format", "json",
+            "-show_streams", "-show_format", "-show_chapters", str(path)
+        ], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise MediaProbeError(f"❌ ffprobe не відповів за {timeout} с: {path}")
+    except FileNotFoundError:
+        raise MediaProbeError("❌ ffprobe не знайдено. Встановіть ffmpeg")
+
+    if probe.returncode != 0:
+        raise MediaProbeError(probe.stderr.strip() or "Невалідний відео файл")
+    if not probe.stdout.strip():
+        raise MediaProbeError("ffprobe не повернув даних - можливо файл пошкоджений")
+    try:
+        return json.loads(probe.stdout)
+    except json.JSONDecodeError as e:
+        raise MediaProbeError(f"Некоректний вивід ffprobe: {e}")
+
+
+class MediaProbe:
+    """Аналіз медіафайлів з кешем за швидким відбитком файлу."""
+
+    def __init__(self, cache_size: int = _CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, MediaInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"probes": 0, "hits": 0, "errors": 0}
+
+    def probe(self, path: Union[str, Path], timeout: Optional[float] = 60) -> MediaInfo:
+        """
+        Аналізує файл; повторний виклик для незміненого файлу береться з кешу.
+
+        Відбиток (а не шлях) як ключ: той самий файл під іншим ім'ям чи після
+        повторного завантаження не аналізується знову, а змінений — аналізується.
+
+        Raises:
+            MediaProbeError: ffprobe не зміг прочитати файл
+        """
+        path = str(path)
+        fingerprint = get_fingerprint_service().fingerprint(path)
+        with self._lock:
+            cached = self._cache.get(fingerprint)
+            if cached is not None:
+                self._cache.move_to_end(fingerprint)
+                self._stats["hits"] += 1
+                return cached._replace(path=path)
+
+        try:
+            data = run_ffprobe(path, timeout)
+        except MediaProbeError:
+            with self._lock:
+                self._stats["errors"] += 1
+            raise
+        info = parse_probe(data, path, fingerprint)
+
+        with self._lock:
+            self._stats["probes"] += 1
+            self._cache[fingerprint] = info
+            self._cache.move_to_end(fingerprint)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return info
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "cached": len(self._cache)}
+
+
+_default_probe: Optional[MediaProbe] = None
+_default_lock = threading.Lock()
+
+
+def get_media_probe() -> MediaProbe:
+    """Спільний для процесу аналізатор медіафайлів."""
+    global _default_probe
+    with _default_lock:
+        if _default_probe is None:
+            _default_probe = MediaProbe()
+        return _default_probe
+
+
+def probe_media(path: Union[str, Path], timeout: Optional[float] = 60) -> MediaInfo:
+    """Скорочення для get_media_probe().probe(path)."""
+    return get_media_probe().probe(path, timeout)
@@ -1,46 +1,119 @@
-from magi_pipeline.translate.deepl_translate import deepl_translate
+from magi_pipeline.translate.deepl_translate import deepl_translate_batch
+from magi_pipeline.translate.translation_memory import translate_with_memory
+from magi_pipeline.translate.dedup import deduplicate, expand, dedup_stats
+
+# Версія відповідей DeepL для ключа пам'яті перекладів
+DEEPL_REVISION = "deepl-v2"
 
 class Melchior:
     @staticmethod
-    def translate(text, engine="helsinki", api_key=None, source_lang="ru", target_lang="uk"):
+    def translate(text, engine="helsinki", api_key=None, source_lang="ru", target_lang="uk", use_cache=True):
         """
         Переклад тексту з вибором движка
         
         Args:
             text (str): Текст для перекладу
-            engine (str): "helsinki" (безкоштовно) або "deepl" (API ключ)
+            engine (str): "helsinki" (безкоштовно), "helsinki-fast" (int8 на CPU) або "deepl" (API ключ)
             api_key (str): API ключ для DeepL (якщо потрібен)
             source_lang (str): Вихідна мова
             target_lang (str): Цільова мова
+            use_cache (bool): Використовувати пам'ять перекладів
         
         Returns:
             str: Перекладений текст
         """
         if not text.strip():
             return ""
-            
+
+        return Melchior.translate_batch(
+            [text], engine=engine, api_key=api_key,
+            source_lang=source_lang, target_lang=target_lang, use_cache=use_cache
+        )[0]
+
+    @staticmethod
+    def translate_batch(texts, engine="helsinki", api_key=None, source_lang="ru", target_lang="uk",
+                        progress_callback=None, use_cache=True, stats=None):
+        """
+        Пакетний переклад списку рядків
+
+        Однакові тексти перекладаються один раз, результат розноситься на всі сегменти.
+
+        Args:
+            texts (list[str]): Рядки для перекладу
+            engine (str): "helsinki" (безкоштовно), "helsinki-fast" (int8 на CPU) або "deepl" (API ключ)
+            api_key (str): API ключ для DeepL (якщо потрібен)
+            source_lang (str): Вихідна мова
+            target_lang (str): Цільова мова
+            progress_callback: Функція (перекладено, всього) для звітування прогресу
+            use_cache (bool): Використовувати пам'ять перекладів (False — обійти її)
+            stats (dict): Якщо передано, сюди записується статистика дедуплікації
+
+        Returns:
+            list[str]: Переклади в тому ж порядку, що й вхідні рядки
+        """
+        revision = Melchior.engine_revision(engine, source_lang, target_lang)
+        unique, index = deduplicate(texts)
+        if stats is not None:
+            stats.update(dedup_stats(index, len(unique)))
+
+        def report(done, total):
+            # Прогрес рахуємо в сегментах, а не в унікальних текстах
+            if progress_callback:
+                progress_callback(done * len(texts) // max(total, 1), len(texts))
+
+        translations = translate_with_memory(
+            unique, engine, revision, source_lang, target_lang,
+            lambda batch, callback: Melchior._translate_uncached(
+                batch, engine, api_key, source_lang, target_lang, callback
+            ),
+            progress_callback=report,
+            use_cache=use_cache
+        )
+        return expand(translations, index)
+
+    @staticmethod
+    def engine_revision(engine, source_lang="ru", target_lang="uk"):
+        """Версія моделі/API, що входить у ключ пам'яті перекладів"""
         if engine == "helsinki":
+            from magi_pipeline.translate.translate import get_model_name
+            return get_model_name(source_lang, target_lang)
+        elif engine == "helsinki-fast":
+            # Квантизована модель і інший пошук дають інший текст — окремі записи пам'яті
+            from magi_pipeline.translate.translate import get_model_name, FAST_NUM_BEAMS
+            return f"{get_model_name(source_lang, target_lang)}+int8-beams{FAST_NUM_BEAMS}"
+        elif engine == "deepl":
+            return DEEPL_REVISION
+        raise ValueError(f"Непідтримуваний движок перекладу: {engine}. "
+                         f"Використовуйте 'helsinki', 'helsinki-fast' або 'deepl'.")
+
+    @staticmethod
+    def _translate_uncached(texts, engine, api_key, source_lang, target_lang, progress_callback=None):
+        if engine in ("helsinki", "helsinki-fast"):
             try:
-                from magi_pipeline.translate.translate import translate_line
-                return translate_line(text)
+                from magi_pipeline.translate.translate import translate_batch, FAST_NUM_BEAMS
             except ImportError:
                 raise Exception("Helsinki-NLP модель не встановлена! Встановіть transformers та завантажте модель.")
-        
+            fast = engine == "helsinki-fast"
+            return translate_batch(
+                texts,
+                source_lang=source_lang,
+                target_lang=target_lang,
+                progress_callback=progress_callback,
+                quantized=fast,
+                num_beams=FAST_NUM_BEAMS if fast else None
+            )
+
         elif engine == "deepl":
-            if api_key:
-                # Тимчасово встановлюємо API ключ
-                import magi_pipeline.translate.deepl_translate as deepl_module
-                original_key = deepl_module.DEEPL_API_KEY
-                deepl_module.DEEPL_API_KEY = api_key
-                try:
-                    translated = deepl_translate(text, source_lang=source_lang, target_lang=target_lang.upper())
-                    return translated
-                finally:
-                    # Повертаємо оригінальний ключ
-                    deepl_module.DEEPL_API_KEY = original_key
-            else:
-                translated = deepl_translate(text, source_lang=source_lang, target_lang=target_lang.upper())
-                return translated
-        
+            # Пакетні запити через спільний клієнт; ключ передається явно,
+            # без зміни глобального DEEPL_API_KEY
+            return deepl_translate_batch(
+                texts,
+                target_lang=target_lang.upper(),
+                source_lang=source_lang,
+                api_key=api_key,
+                progress_callback=progress_callback
+            )
+
         else:
-            raise ValueError(f"Непідтримуваний движок перекладу: {engine}. Використовуйте 'helsinki' або 'deepl'.") 
\ No newline at end of file
+            raise ValueError(f"Непідтримуваний движок перекладу: {engine}. "
+                             f"Використовуйте 'helsinki', 'helsinki-fast' або 'deepl'.")
@@ -0,0 +1,184 @@
+"""
+model_pool.py — спільний для процесу реєстр завантажених моделей з LRU-витісненням.
+
+Моделі тримаються в пам'яті між задачами і витісняються (найдавніше використані
+першими), коли сумарний розмір перевищує бюджет. Пул безпечний для потоків,
+які запускає Flask.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def estimate_model_bytes(model: Any) -> int:
+    """
+    Оцінює розмір моделі в байтах за її state_dict (torch.nn.Module), тож
+    враховуються й упаковані ваги квантизованих шарів, яких немає серед parameters().
+    Для об'єктів без state_dict повертає 0.
+    """
+    state_dict = getattr(model, "state_dict", None)
+    if state_dict is None:
+        return 0
+    total = 0
+    pending = list(state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            pending.extend(value)
+        elif hasattr(value, "element_size"):
+            total += value.numel() * value.element_size()
+    return total
+
+
+class _PoolEntry:
+    def __init__(self, value: Any, size_bytes: int, load_time: float):
+        self.value = value
+        self.size_bytes = size_bytes
+        self.load_time = load_time
+        self.users = 0
+        # Деякі моделі (Whisper) ставлять хуки на модулі під час декодування,
+        # тому одночасне використання одного екземпляра треба серіалізувати
+        self.lock = threading.Lock()
+
+
+class ModelPool:
+    """
+    LRU-пул моделей з обмеженням пам'яті.
+
+    Ключ — будь-який hashable (наприклад, (model_name, device, precision)),
+    завантажувач — функція без аргументів, що повертає модель.
+    """
+
+    def __init__(self, name: str, budget_bytes: int,
+                 size_fn: Callable[[Any], int] = estimate_model_bytes):
+        self.name = name
+        self.budget_bytes = budget_bytes
+        self.size_fn = size_fn
+        self._entries: "OrderedDict[Hashable, _PoolEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0,
+                       "load_time_total": 0.0, "load_time_saved": 0.0}
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Повертає модель з пулу, завантажуючи її при першому зверненні."""
+        return self._acquire(key, loader, count_user=False).value
+
+    @contextmanager
+    def use(self, key: Hashable, loader: Callable[[], Any], exclusive: bool = True):
+        """
+        Контекстний менеджер для використання моделі.
+
+        Поки модель використовується, вона не витісняється з пулу.
+        При exclusive=True одночасно з одним екземпляром працює лише один потік.
+        """
+        entry = self._acquire(key, loader, count_user=True)
+        try:
+            if exclusive:
+                with entry.lock:
+                    yield entry.value
+            else:
+                yield entry.value
+        finally:
+            with self._lock:
+                entry.users -= 1
+                self._evict_locked()
+
+    def _acquire(self, key: Hashable, loader: Callable[[], Any], count_user: bool) -> _PoolEntry:
+        with self._lock:
+            entry = self._hit_locked(key, count_user)
+            if entry is not None:
+                return entry
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        # Завантажуємо поза загальним локом, щоб інші моделі були доступні,
+        # але не дозволяємо двом потокам вантажити ту саму модель одночасно
+        with key_lock:
+            with self._lock:
+                entry = self._hit_locked(key, count_user)
+                if entry is not None:
+                    return entry
+
+            started = time.perf_counter()
+            try:
+                value = loader()
+            except Exception:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+            load_time = time.perf_counter() - started
+            size_bytes = self.size_fn(value)
+
+            with self._lock:
+                self._loading.pop(key, None)
+                entry = _PoolEntry(value, size_bytes, load_time)
+                if count_user:
+                    entry.users += 1
+                self._entries[key] = entry
+                self._stats["misses"] += 1
+                self._stats["load_time_total"] += load_time
+                print(f"📦 [{self.name}] Завантажено {key} за {load_time:.2f} с "
+                      f"({size_bytes / 1024**2:.0f} MB)")
+                self._evict_locked()
+                return entry
+
+    def _hit_locked(self, key: Hashable, count_user: bool) -> Optional[_PoolEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        if count_user:
+            entry.users += 1
+        self._stats["hits"] += 1
+        self._stats["load_time_saved"] += entry.load_time
+        return entry
+
+    def _evict_locked(self):
+        used = sum(e.size_bytes for e in self._entries.values())
+        if used <= self.budget_bytes:
+            return
+        # Від найдавніше використаних; моделі в роботі та останню модель не чіпаємо
+        for key in list(self._entries.keys()):
+            if used <= self.budget_bytes or len(self._entries) <= 1:
+                break
+            entry = self._entries[key]
+            if entry.users > 0:
+                continue
+            del self._entries[key]
+            used -= entry.size_bytes
+            self._stats["evictions"] += 1
+            print(f"🗑️ [{self.name}] Витіснено {key} ({entry.size_bytes / 1024**2:.0f} MB)")
+
+    def set_budget(self, budget_bytes: int):
+        """Змінює бюджет пам'яті та одразу витісняє зайві моделі."""
+        with self._lock:
+            self.budget_bytes = budget_bytes
+            self._evict_locked()
+
+    def clear(self):
+        """Вивантажує всі моделі, які зараз не використовуються."""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.users == 0]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Повертає лічильники hit/miss, час завантаження та вміст пулу."""
+        with self._lock:
+            requests_total = self._stats["hits"] + self._stats["misses"]
+            return {
+                "name": self.name,
+                **self._stats,
+                "hit_rate": self._stats["hits"] / requests_total if requests_total else 0.0,
+                "budget_bytes": self.budget_bytes,
+                "used_bytes": sum(e.size_bytes for e in self._entries.values()),
+                "models": [
+                    {"key": list(key) if isinstance(key, tuple) else key,
+                     "size_bytes": e.size_bytes,
+                     "load_time": e.load_time,
+                     "in_use": e.users}
+                    for key, e in self._entries.items()
+                ],
+            }
@@ -0,0 +1,117 @@
+"""
+muxer.py — вбудовування готових субтитрів у відео як окремої доріжки (soft subs).
+
+ffmpeg копіює всі наявні потоки без перекодування (-c copy): відео, аудіо,
+субтитри та вкладення зі шрифтами. Українська доріжка ASS додається першою
+серед субтитрів, з language=ukr і прапорцем default. Тривалість визначається
+лише швидкістю диска, а не процесора. Прогрес читається з -progress pipe:1.
+"""
+
+import os
+import subprocess
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+# Контейнери, чиї потоки субтитрів можна скопіювати в MKV як є
+# (mov_text з MP4/MOV без перекодування в Matroska не пишеться)
+_MKV_COMPATIBLE_SUFFIXES = {".mkv", ".mka", ".mks", ".webm"}
+
+SUBTITLE_LANGUAGE = "ukr"
+SUBTITLE_TITLE = "Українська"
+
+
+def build_mux_command(video_path: Union[str, Path], subtitle_path: Union[str, Path],
+                      output_path: Union[str, Path], language: str = SUBTITLE_LANGUAGE,
+                      title: str = SUBTITLE_TITLE, keep_subtitles: Optional[bool] = None) -> list:
+    """
+    Команда ffmpeg для вбудовування субтитрів.
+
+    Порядок потоків: відео, аудіо, нова доріжка, субтитри джерела, вкладення.
+    Нова доріжка завжди s:0, тож її метадані задаються без попереднього ffprobe.
+
+    Args:
+        keep_subtitles: Копіювати субтитри джерела; None — лише для MKV/WebM
+    """
+    if keep_subtitles is None:
+        keep_subtitles = Path(video_path).suffix.lower() in _MKV_COMPATIBLE_SUFFIXES
+
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error",
+           "-i", str(video_path), "-i", str(subtitle_path),
+           "-map", "0:v?", "-map", "0:a?", "-map", "1:0"]
+    if keep_subtitles:
+        cmd += ["-map", "0:s?"]
+    # Вкладення (шрифти для ASS) переносяться як є
+    cmd += ["-map", "0:t?", "-c", "copy",
+            "-metadata:s:s:0", f"language={language}",
+            "-metadata:s:s:0", f"title={title}",
+            # Спершу знімаємо default з усіх субтитрів, потім ставимо на українську
+            "-disposition:s", "0", "-disposition:s:0", "default",
+            "-f", "matroska",
+            "-progress", "pipe:1", "-nostats",
+            str(output_path)]
+    return cmd
+
+
+def mux_soft_subtitles(video_path: Union[str, Path], subtitle_path: Union[str, Path],
+                       output_path: Union[str, Path], language: str = SUBTITLE_LANGUAGE,
+                       title: str = SUBTITLE_TITLE, keep_subtitles: Optional[bool] = None,
+                       progress_callback: Optional[Callable[[float, Dict], None]] = None) -> str:
+    """
+    Вбудовує субтитри у відео без перекодування, результат — MKV.
+
+    Файл пишеться у тимчасовий output_path.part і перейменовується лише після
+    успішного завершення ffmpeg, тож недописаний MKV ніколи не видно.
+
+    Args:
+        video_path: Вихідне відео
+        subtitle_path: Готовий .ass
+        output_path: Куди зберегти .mkv
+        language: Код мови доріжки (ISO 639-2)
+        title: Назва доріжки в плеєрі
+        keep_subtitles: Копіювати субтитри джерела; None — лише для MKV/WebM
+        progress_callback: fn(fraction, info) — частка записаних байтів від розміру
+            джерела (при -c copy вони майже збігаються) та сирі поля -progress
+
+    Returns:
+        Шлях до створеного MKV
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = output_path.with_name(output_path.name + ".part")
+    total_bytes = max(os.path.getsize(video_path) + os.path.getsize(subtitle_path), 1)
+
+    cmd = build_mux_command(video_path, subtitle_path, partial_path, language, title, keep_subtitles)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # stderr читаємо паралельно, щоб ffmpeg не заблокувався на повному буфері
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    stderr_thread.start()
+
+    try:
+        # -progress віддає блоки key=value, кожен закінчується рядком progress=continue|end
+        info: Dict[str, str] = {}
+        for raw_line in proc.stdout:
+            key, sep, value = raw_line.decode("utf-8", errors="replace").strip().partition("=")
+            if not sep:
+                continue
+            info[key] = value
+            if key == "progress":
+                if progress_callback:
+                    written = int(info.get("total_size", "0") or 0) if info.get("total_size", "").isdigit() else 0
+                    fraction = 1.0 if value == "end" else min(written / total_bytes, 0.99)
+                    progress_callback(fraction, dict(info))
+                info = {}
+        proc.wait()
+        stderr_thread.join()
+        if proc.returncode != 0:
+            error = b"".join(stderr_chunks).decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"ffmpeg не зміг вбудувати субтитри: {error}")
+        os.replace(partial_path, output_path)
+        return str(output_path)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        if partial_path.exists():
+            partial_path.unlink()
@@ -0,0 +1,177 @@
+"""
+parallel_transcribe.py — паралельна транскрибація на CPU пулом процесів.
+
+Аудіо ріжеться в паузах (vad.split_on_silence) на шматки обмеженої довжини,
+шматки транскрибуються одночасно в кількох процесах з власною кількістю потоків
+torch, а таймкоди зшиваються назад в один список segments. Сегменти віддаються
+в порядку шматків, щойно готовий наступний по черзі шматок.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+from magi_pipeline.utils.vad import SAMPLE_RATE, split_on_silence
+from magi_pipeline.utils.transcription_stream import Event, ProgressTracker, collect, shift_segments
+
+# Потоки torch на один процес; процесів за замовчуванням — ядра / потоки
+THREADS_PER_WORKER = int(os.environ.get("MAGI_TRANSCRIBE_THREADS", "2"))
+MAX_CHUNK_SECONDS = float(os.environ.get("MAGI_TRANSCRIBE_CHUNK_S", "90"))
+
+# Пули процесів живуть між задачами, щоб моделі не вантажились щоразу
+_executors: Dict[Tuple, ProcessPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+# Стан процесу-воркера
+_worker_model = None
+
+
+def _init_worker(loader: Callable, model_name: str, precision: str, threads: int):
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    _worker_model = loader(model_name, "cpu", precision)
+
+
+def _transcribe_chunk(audio: np.ndarray, offset: float, options: Dict[str, Any]) -> Dict[str, Any]:
+    result = _worker_model.transcribe(audio, **options)
+    shift_segments(result["segments"], offset)
+    return result
+
+
+def default_workers(threads_per_worker: int = THREADS_PER_WORKER) -> int:
+    """Кількість процесів, щоб зайняти всі ядра."""
+    return max(1, (os.cpu_count() or 1) // max(1, threads_per_worker))
+
+
+def get_executor(model_name: str, precision: str = "fp32", workers: Optional[int] = None,
+                 threads_per_worker: int = THREADS_PER_WORKER, loader: Callable = None) -> ProcessPoolExecutor:
+    """
+    Повертає резидентний пул процесів для моделі (створюється при першому зверненні).
+    Кожен процес завантажує власну копію моделі один раз.
+    """
+    if loader is None:
+        from magi_pipeline.utils.balthasar import Balthasar
+        loader = Balthasar.load_model
+    workers = workers or default_workers(threads_per_worker)
+    key = (model_name, precision, workers, threads_per_worker, loader)
+    with _executors_lock:
+        executor = _executors.get(key)
+        if executor is None:
+            # spawn: fork після ініціалізації torch може зависнути на OpenMP
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(loader, model_name, precision, threads_per_worker),
+            )
+            _executors[key] = executor
+        return executor
+
+
+def shutdown_executors():
+    """Зупиняє всі пули процесів і звільняє завантажені в них моделі."""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        _executors.clear()
+
+
+def iter_transcribe_parallel(
+    audio: np.ndarray,
+    model_name: str = "base",
+    language: Optional[str] = None,
+    precision: str = "fp32",
+    workers: Optional[int] = None,
+    threads_per_worker: int = THREADS_PER_WORKER,
+    max_chunk_s: float = MAX_CHUNK_SECONDS,
+    loader: Callable = None,
+) -> Iterator[Event]:
+    """
+    Транскрибує аудіо шматками паралельно на CPU, віддаючи сегменти по мірі готовності.
+
+    Args:
+        audio: Моно float32 16 кГц (див. Balthasar.decode_audio)
+        model_name: Модель Whisper
+        language: Мова аудіо (None — автовизначення в кожному шматку)
+        precision: Точність моделі в пулі процесів
+        workers: Кількість процесів (за замовчуванням — ядра / threads_per_worker)
+        threads_per_worker: Потоки torch у кожному процесі
+        max_chunk_s: Максимальна довжина шматка в секундах
+        loader: Функція (model_name, device, precision) -> модель, за замовчуванням Balthasar.load_model
+
+    Yields:
+        (нові сегменти в хронологічному порядку, прогрес) — див. transcription_stream
+    """
+    options = {"fp16": False, "verbose": None}
+    if language:
+        options["language"] = language
+
+    chunks = split_on_silence(audio, SAMPLE_RATE, max_chunk_s=max_chunk_s)
+    executor = get_executor(model_name, precision, workers, threads_per_worker, loader)
+    futures = [
+        executor.submit(_transcribe_chunk, np.ascontiguousarray(audio[start:end]),
+                        start / SAMPLE_RATE, options)
+        for start, end in chunks
+    ]
+    index_of = {future: i for i, future in enumerate(futures)}
+    tracker = ProgressTracker(len(audio) / SAMPLE_RATE)
+    results: Dict[int, Dict[str, Any]] = {}
+    next_index = 0
+    pending = set(futures)
+
+    try:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            audio_done = 0.0
+            for future in done:
+                i = index_of[future]
+                results[i] = future.result()
+                audio_done += (chunks[i][1] - chunks[i][0]) / SAMPLE_RATE
+
+            # Сегменти віддаємо лише суцільним префіксом, щоб порядок був хронологічний
+            ready = []
+            while next_index in results:
+                result = results.pop(next_index)
+                tracker.language = tracker.language or result.get("language")
+                for segment in result["segments"]:
+                    segment["id"] = tracker.segments + len(ready)
+                    ready.append(segment)
+                next_index += 1
+            yield ready, tracker.advance(audio_done, len(ready))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def transcribe_parallel(
+    audio: np.ndarray,
+    model_name: str = "base",
+    language: Optional[str] = None,
+    precision: str = "fp32",
+    workers: Optional[int] = None,
+    threads_per_worker: int = THREADS_PER_WORKER,
+    max_chunk_s: float = MAX_CHUNK_SECONDS,
+    loader: Callable = None,
+    progress_callback: Callable = None,
+    segment_callback: Callable = None,
+) -> Dict[str, Any]:
+    """
+    Транскрибує аудіо шматками паралельно на CPU.
+
+    Параметри як у iter_transcribe_parallel; progress_callback і segment_callback —
+    див. transcription_stream.collect.
+
+    Returns:
+        Результат у форматі model.transcribe: {"text", "segments", "language"}
+    """
+    return collect(
+        iter_transcribe_parallel(audio, model_name, language, precision, workers,
+                                 threads_per_worker, max_chunk_s, loader),
+        progress_callback,
+        segment_callback
+    )
@@ -0,0 +1,214 @@
+"""
+segment_table.py — компактне колонкове представлення субтитрів у пам'яті.
+
+Замість списку словників {"start", "end", "text", ...} таблиця тримає час
+у двох масивах цілих мілісекунд (array('q')), а текстові колонки — окремими
+списками з інтернованими рядками. Колонки віддаються без копіювання, пошук
+за часом — двійковий (bisect), серіалізація — колонками.
+"""
+
+import json
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+
+def to_ms(seconds: float) -> int:
+    """Секунди -> цілі мілісекунди."""
+    return int(round(seconds * 1000))
+
+
+class SegmentTable:
+    """
+    Таблиця сегментів: start_ms / end_ms (array('q')) + текстові колонки.
+
+    Порядок рядків — порядок додавання (переклади вирівнюються за індексом);
+    для пошуку за часом таблиця сама будує відсортований індекс, якщо рядки
+    додавались не за зростанням start.
+    """
+
+    __slots__ = ("start_ms", "end_ms", "_columns", "_max_duration_ms", "_sorted", "_order", "_sorted_starts")
+
+    def __init__(self, columns: Sequence[str] = ("text",)):
+        self.start_ms = array("q")
+        self.end_ms = array("q")
+        self._columns: Dict[str, List[str]] = {name: [] for name in columns}
+        self._max_duration_ms = 0
+        self._sorted = True
+        self._order: Optional[array] = None
+        self._sorted_starts: Optional[array] = None
+
+    # ---- Побудова ----
+
+    def append(self, start: float, end: float, **texts: str):
+        """Додає сегмент; час у секундах, тексти — за назвами колонок (відсутні = "")."""
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        if self.start_ms and start_ms < self.start_ms[-1]:
+            self._sorted = False
+        self._order = self._sorted_starts = None
+        self.start_ms.append(start_ms)
+        self.end_ms.append(end_ms)
+        self._max_duration_ms = max(self._max_duration_ms, end_ms - start_ms)
+        for name, values in self._columns.items():
+            values.append(sys.intern(texts.get(name, "")))
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Dict[str, Any]], columns: Optional[Dict[str, str]] = None
+                      ) -> "SegmentTable":
+        """
+        Будує таблицю зі списку словників (результат Whisper, load_segments, JSON перекладу).
+
+        Args:
+            segments: Словники з "start", "end" (секунди) і текстовими полями
+            columns: {назва колонки: ключ у словнику}; за замовчуванням {"text": "text"}
+        """
+        columns = columns or {"text": "text"}
+        segments = segments if isinstance(segments, list) else list(segments)
+        table = cls(tuple(columns))
+        # Колонки будуються цілком, без append на кожен рядок
+        table.start_ms = array("q", [int(round(s["start"] * 1000)) for s in segments])
+        table.end_ms = array("q", [int(round(s["end"] * 1000)) for s in segments])
+        intern = sys.intern
+        for name, key in columns.items():
+            table._columns[name] = [intern(s.get(key) or "") for s in segments]
+        table._reindex()
+        return table
+
+    @classmethod
+    def from_cues(cls, cues: Iterable[Any]) -> "SegmentTable":
+        """Будує таблицю з реплік subtitle_parser.iter_cues без проміжного списку."""
+        table = cls(("text",))
+        for cue in cues:
+            table.append(cue.start, cue.end, text=cue.text)
+        return table
+
+    # ---- Колонки ----
+
+    def __len__(self) -> int:
+        return len(self.start_ms)
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return tuple(self._columns)
+
+    def column(self, name: str) -> List[str]:
+        """Текстова колонка без копіювання (змінювати слід через set_column)."""
+        return self._columns[name]
+
+    def set_column(self, name: str, values: Sequence[str]):
+        """Додає або замінює текстову колонку; довжина має збігатися з кількістю сегментів."""
+        if len(values) != len(self):
+            raise ValueError(f"❌ Колонка {name}: {len(values)} значень на {len(self)} сегментів")
+        self._columns[name] = [sys.intern(value or "") for value in values]
+
+    def times_ms(self) -> Tuple[memoryview, memoryview]:
+        """Масиви start/end у мілісекундах як memoryview (без копіювання)."""
+        return memoryview(self.start_ms), memoryview(self.end_ms)
+
+    def rows(self, text_column: str = "text") -> Iterator[Tuple[float, float, str]]:
+        """(start, end, текст) у секундах — для записувачів субтитрів (ASS/SRT)."""
+        texts = self._columns[text_column]
+        for start_ms, end_ms, text in zip(self.start_ms, self.end_ms, texts):
+            yield start_ms / 1000, end_ms / 1000, text
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Один сегмент у вигляді словника (час у секундах)."""
+        record: Dict[str, Any] = {"start": self.start_ms[index] / 1000, "end": self.end_ms[index] / 1000}
+        for name, values in self._columns.items():
+            record[name] = values[index]
+        return record
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for index in range(len(self)):
+            yield self.row(index)
+
+    # ---- Пошук за часом ----
+
+    def _sorted_view(self) -> Tuple[Optional[array], array]:
+        if self._sorted:
+            return None, self.start_ms
+        if self._order is None:
+            order = sorted(range(len(self)), key=self.start_ms.__getitem__)
+            self._order = array("q", order)
+            self._sorted_starts = array("q", (self.start_ms[i] for i in order))
+        return self._order, self._sorted_starts
+
+    def find(self, seconds: float) -> List[int]:
+        """Індекси сегментів, що звучать у момент seconds (O(log n + k))."""
+        return self.overlapping(seconds, seconds)
+
+    def overlapping(self, start: float, end: float) -> List[int]:
+        """
+        Індекси сегментів, що перетинаються з [start, end] (O(log n + k)).
+        Нижня межа пошуку зсувається на найдовший сегмент, тож довгі репліки не губляться.
+        """
+        start_ms, end_ms = to_ms(start), to_ms(end)
+        order, starts = self._sorted_view()
+        lo = bisect_left(starts, start_ms - self._max_duration_ms)
+        hi = bisect_right(starts, end_ms)
+        found = []
+        for position in range(lo, hi):
+            index = order[position] if order is not None else position
+            if self.end_ms[index] >= start_ms:
+                found.append(index)
+        return found
+
+    # ---- Серіалізація ----
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Список словників у старій схемі (для JSON перекладу, який читає редактор)."""
+        return list(self)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]], columns: Sequence[str]) -> "SegmentTable":
+        return cls.from_segments(records, {name: name for name in columns})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Колонкова форма: два списки чисел і по списку на текстову колонку."""
+        return {
+            "version": 1,
+            "start_ms": self.start_ms.tolist(),
+            "end_ms": self.end_ms.tolist(),
+            "columns": self._columns,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SegmentTable":
+        table = cls(tuple(data["columns"]))
+        table.start_ms = array("q", data["start_ms"])
+        table.end_ms = array("q", data["end_ms"])
+        if len(table.start_ms) != len(table.end_ms):
+            raise ValueError("❌ Пошкоджена таблиця сегментів: різна довжина start_ms і end_ms")
+        for name, values in data["columns"].items():
+            table.set_column(name, values)
+        table._reindex()
+        return table
+
+    def _reindex(self):
+        # Після масової заміни масивів: найдовший сегмент і чи відсортовано за start
+        starts = self.start_ms
+        self._max_duration_ms = max(map(int.__sub__, self.end_ms, starts), default=0)
+        self._sorted = all(map(int.__le__, starts, starts[1:]))
+        self._order = self._sorted_starts = None
+
+    def save(self, path: Union[str, Path]):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "SegmentTable":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        restored = SegmentTable.from_dict(state)
+        for name in self.__slots__:
+            setattr(self, name, getattr(restored, name))
+
+    def __repr__(self) -> str:
+        return f"SegmentTable({len(self)} сегментів, колонки={list(self._columns)})"
@@ -2,6 +2,8 @@ import re
 from pathlib import Path
 from typing import Dict, List, Any
 
+from magi_pipeline.utils.subtitle_parser import iter_cues, seconds_to_ass_time
+
 
 def parse_srt(srt_file: Path) -> Dict[str, Any]:
     """
@@ -13,68 +15,15 @@ def parse_srt(srt_file: Path) -> Dict[str, Any]:
     Returns:
         Словник з структурою аналогічною до parse_ass
     """
-    
-    try:
-        with open(srt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        # Спробуємо інші кодування
-        for encoding in ['cp1251', 'latin1', 'cp1252']:
-            try:
-                with open(srt_file, 'r', encoding=encoding) as f:
-                    content = f.read()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise Exception("Не вдалося прочитати SRT файл")
-    
-    dialogue_entries = []
-    
-    # Розділяємо на блоки (кожен блок розділений подвійним переносом рядка)
-    blocks = re.split(r'\n\s*\n', content.strip())
-    
-    for block in blocks:
-        if not block.strip():
-            continue
-            
-        lines = block.strip().split('\n')
-        if len(lines) < 3:
-            continue
-        
-        # Перший рядок - номер субтитру
-        try:
-            subtitle_number = int(lines[0].strip())
-        except ValueError:
-            continue
-            
-        # Другий рядок - тайм-коди
-        timeline = lines[1].strip()
-        time_match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', timeline)
-        
-        if not time_match:
-            continue
-            
-        start_time = time_match.group(1)
-        end_time = time_match.group(2)
-        
-        # Решта рядків - текст субтитру
-        text_lines = lines[2:]
-        text = ' '.join(line.strip() for line in text_lines if line.strip())
-        
-        # Видаляємо HTML теги
-        text = re.sub(r'<[^>]+>', '', text)
-        
-        # Конвертуємо SRT час у ASS формат (h:mm:ss.cc)
-        start_ass = srt_time_to_ass_time(start_time)
-        end_ass = srt_time_to_ass_time(end_time)
-        
-        if text.strip():
-            dialogue_entries.append({
-                "start": start_ass,
-                "end": end_ass,
-                "text": text.strip()
-            })
+    # Читання та розбір — спільним потоковим парсером
+    dialogue_entries = [
+        {
+            "start": seconds_to_ass_time(cue.start),
+            "end": seconds_to_ass_time(cue.end),
+            "text": cue.text
+        }
+        for cue in iter_cues(srt_file, fmt="srt")
+    ]
     
     return {
         "dialogue": dialogue_entries,
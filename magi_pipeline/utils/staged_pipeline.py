@@ -0,0 +1,147 @@
+"""
+staged_pipeline.py — транскрибація і переклад, що працюють одночасно.
+
+Whisper віддає сегменти потоком (transcription_stream), вони збираються в пакети
+й через обмежену чергу потрапляють до потоків перекладу, поки Whisper декодує
+наступні шматки аудіо. Повна черга зупиняє транскрибацію (backpressure), а
+переклади складаються за номером пакета, тож порядок результату детермінований.
+Час на епізод наближається до max(транскрибація, переклад), а не до їх суми.
+"""
+
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from magi_pipeline.utils.transcription_stream import Event, collect
+
+# Мінімум рядків у пакеті на переклад (менше — лише в кінці потоку)
+PIPELINE_BATCH_LINES = int(os.environ.get("MAGI_PIPELINE_BATCH", "32"))
+# Скільки пакетів може чекати на переклад, перш ніж транскрибація стане на паузу
+PIPELINE_QUEUE_SIZE = int(os.environ.get("MAGI_PIPELINE_QUEUE", "8"))
+
+_DONE = object()
+# Як часто перевіряти помилку іншої стадії, коли черга заблокована
+_POLL_SECONDS = 0.2
+
+
+class _StageFailed(Exception):
+    """Переклад впав — транскрибацію зупинено, справжня помилка в errors."""
+
+
+def run_staged(
+    events: Iterable[Event],
+    translate_fn: Callable[[List[str]], List[str]],
+    batch_lines: int = PIPELINE_BATCH_LINES,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    translators: int = 1,
+    progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+    segment_callback: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Транскрибує й перекладає одночасно.
+
+    Args:
+        events: Генератор транскрибації (нові сегменти, прогрес), напр. Balthasar.transcribe_iter
+        translate_fn: Функція (list[str]) -> list[str] для одного пакета, напр. Melchior.translate_batch
+        batch_lines: Мінімальний розмір пакета в рядках
+        queue_size: Максимум пакетів у черзі на переклад
+        translators: Кількість потоків перекладу
+        progress_callback: Функція (стан) з полями transcription (прогрес Whisper),
+            transcribed та translated (кількість сегментів)
+        segment_callback: Функція (нові сегменти) — як у transcription_stream.collect
+
+    Returns:
+        (результат транскрибації у форматі Whisper, переклади в порядку сегментів)
+    """
+    batches: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    translated: Dict[int, List[str]] = {}
+    state = {"transcription": None, "transcribed": 0, "translated": 0}
+    state_lock = threading.Lock()
+    failed = threading.Event()
+    errors: List[BaseException] = []
+
+    def report(transcription=None, transcribed=0, translated_count=0):
+        with state_lock:
+            if transcription is not None:
+                state["transcription"] = transcription
+            state["transcribed"] += transcribed
+            state["translated"] += translated_count
+            snapshot = dict(state)
+        if progress_callback:
+            progress_callback(snapshot)
+
+    def put(item) -> bool:
+        # Блокуюча вставка, що не зависає, якщо стадія перекладу впала
+        while not failed.is_set():
+            try:
+                batches.put(item, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def translator():
+        while True:
+            item = batches.get()
+            if item is _DONE:
+                return
+            if failed.is_set():
+                continue
+            number, texts = item
+            try:
+                result = translate_fn(texts)
+            except BaseException as e:
+                errors.append(e)
+                failed.set()
+                continue
+            with state_lock:
+                translated[number] = result
+            report(translated_count=len(texts))
+
+    workers = [threading.Thread(target=translator, daemon=True) for _ in range(max(1, translators))]
+    for worker in workers:
+        worker.start()
+
+    batch_count = 0
+    pending: List[str] = []
+
+    def on_segments(new_segments):
+        nonlocal batch_count, pending
+        if segment_callback:
+            segment_callback(new_segments)
+        texts = [segment["text"] for segment in new_segments]
+        pending.extend(texts)
+        report(transcribed=len(texts))
+        if len(pending) >= batch_lines:
+            if not put((batch_count, pending)):
+                raise _StageFailed()
+            batch_count += 1
+            pending = []
+
+    result = None
+    try:
+        result = collect(events, lambda progress: report(transcription=progress), on_segments)
+        if pending and put((batch_count, pending)):
+            batch_count += 1
+    except _StageFailed:
+        pass
+    except BaseException as e:
+        errors.append(e)
+        failed.set()
+    finally:
+        # Закриваємо генератор, щоб модель Whisper повернулась у пул навіть при помилці
+        close = getattr(events, "close", None)
+        if close:
+            close()
+        # Гарантовано будимо всі потоки перекладу
+        for _ in workers:
+            batches.put(_DONE)
+        for worker in workers:
+            worker.join()
+
+    if errors:
+        raise errors[0]
+
+    translations = [text for number in range(batch_count) for text in translated[number]]
+    return result, translations
@@ -0,0 +1,238 @@
+"""
+subtitle_parser.py — єдиний потоковий парсер субтитрів SRT / VTT / ASS / SSA.
+
+Файл читається рядок за рядком за один лінійний прохід, репліки віддаються
+генератором одразу, тож пам'ять не залежить від розміру файлу. Усі формати
+повертають однакову схему: час у секундах (float), текст одним рядком.
+"""
+
+import re
+from itertools import chain, islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from magi_pipeline.utils.charset import open_text
+
+SUBTITLE_FORMATS = ("srt", "vtt", "ass", "ssa")
+
+# Таймкод SRT/VTT: [год:]хв:сек[,.]дроби — без квантифікаторів, що відкочуються;
+# частини одразу в групах, щоб не розбирати рядок вдруге
+_TIME = r"(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?"
+_CUE_TIMING = re.compile(r"^\s*" + _TIME + r"\s*-->\s*" + _TIME)
+_HTML_TAG = re.compile(r"<[^>\n]*>")
+_ASS_OVERRIDE = re.compile(r"\{[^}\n]*\}")
+
+
+class Cue(NamedTuple):
+    """Одна репліка: час у секундах, текст без тегів, стиль та актор (лише ASS/SSA)."""
+    start: float
+    end: float
+    text: str
+    style: Optional[str] = None
+    name: Optional[str] = None
+
+
+def parse_timestamp(value: str) -> float:
+    """
+    Перетворює таймкод будь-якого з форматів у секунди:
+    "00:01:23,456" (SRT), "01:23.456" / "00:01:23.456" (VTT), "0:01:23.46" (ASS).
+    """
+    value = value.strip().replace(",", ".")
+    whole, _, fraction = value.partition(".")
+    seconds = 0
+    for part in whole.split(":"):
+        seconds = seconds * 60 + int(part)
+    if fraction:
+        return seconds + int(fraction) / 10 ** len(fraction)
+    return float(seconds)
+
+
+def seconds_to_ass_time(seconds: float) -> str:
+    """Секунди -> таймкод ASS "h:mm:ss.cc" (соті відкидаються, як у SRT->ASS конвертації)."""
+    centiseconds = int(round(seconds * 1000)) // 10
+    minutes, cs = divmod(centiseconds, 6000)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{cs // 100:02d}.{cs % 100:02d}"
+
+
+def detect_format(path: Union[str, Path], first_line: str = "") -> str:
+    """Формат за розширенням, а якщо воно невідоме — за першим рядком."""
+    suffix = Path(path).suffix.lower().lstrip(".")
+    if suffix in SUBTITLE_FORMATS:
+        return suffix
+    head = first_line.lstrip("\ufeff").strip()
+    if head.startswith("WEBVTT"):
+        return "vtt"
+    if head.startswith("[Script Info]") or head.startswith("[V4"):
+        return "ass"
+    return "srt"
+
+
+def clean_text(text: str, strip_tags: bool = True) -> str:
+    """Прибирає теги (HTML та ASS override) і згортає пробіли та переноси рядків."""
+    if "\\" in text:
+        text = text.replace("\\N", " ").replace("\\n", " ").replace("\\h", " ")
+    if strip_tags:
+        # Регулярні вирази лише для рядків, де теги справді є
+        if "<" in text:
+            text = _HTML_TAG.sub("", text)
+        if "{" in text:
+            text = _ASS_OVERRIDE.sub("", text)
+    return " ".join(text.split())
+
+
+def _match_seconds(match, first: int) -> float:
+    hours, minutes, seconds, fraction = match.group(first, first + 1, first + 2, first + 3)
+    value = int(minutes) * 60 + int(seconds)
+    if hours:
+        value += int(hours) * 3600
+    if fraction:
+        return value + int(fraction) / 10 ** len(fraction)
+    return float(value)
+
+
+def _iter_blocks(lines: Iterable[str], strip_tags: bool) -> Iterator[Cue]:
+    # SRT і VTT: блоки, розділені порожнім рядком; номер/ідентифікатор перед таймкодом ігнорується
+    start = end = None
+    text_lines: List[str] = []
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if start is None:
+            match = _CUE_TIMING.match(line)
+            if match:
+                start, end = _match_seconds(match, 1), _match_seconds(match, 5)
+            continue
+        if line.strip():
+            match = _CUE_TIMING.match(line) if "-->" in line else None
+            if match is None:
+                text_lines.append(line)
+                continue
+            # Пропущений порожній рядок між репліками: номер наступної вже потрапив у текст
+            if text_lines and text_lines[-1].strip().isdigit():
+                text_lines.pop()
+            text = clean_text(" ".join(text_lines), strip_tags)
+            if text:
+                yield Cue(start, end, text)
+            start, end = _match_seconds(match, 1), _match_seconds(match, 5)
+            text_lines = []
+            continue
+        text = clean_text(" ".join(text_lines), strip_tags)
+        if text:
+            yield Cue(start, end, text)
+        start = end = None
+        text_lines = []
+
+    if start is not None:
+        text = clean_text(" ".join(text_lines), strip_tags)
+        if text:
+            yield Cue(start, end, text)
+
+
+def _iter_ass(lines: Iterable[str], strip_tags: bool) -> Iterator[Cue]:
+    # Порядок полів береться з рядка Format секції [Events]; за замовчуванням — стандартний ASS
+    fields = ["Layer", "Start", "End", "Style", "Name", "MarginL", "MarginR", "MarginV", "Effect", "Text"]
+    in_events = False
+
+    def positions(fields):
+        index = {field: i for i, field in enumerate(fields)}
+        return (index.get("Start"), index.get("End"), index.get("Style"), index.get("Name"),
+                index.get("Text", len(fields) - 1))
+
+    start_i, end_i, style_i, name_i, text_i = positions(fields)
+    for line in lines:
+        if line.startswith("Dialogue:"):
+            if not in_events or start_i is None or end_i is None:
+                continue
+            parts = line[9:].rstrip("\r\n").split(",", len(fields) - 1)
+            if len(parts) < len(fields):
+                continue
+            text = clean_text(parts[text_i], strip_tags)
+            if not text:
+                continue
+            try:
+                start, end = parse_timestamp(parts[start_i]), parse_timestamp(parts[end_i])
+            except ValueError:
+                continue
+            style = parts[style_i].strip() or None if style_i is not None else None
+            name = parts[name_i].strip() or None if name_i is not None else None
+            yield Cue(start, end, text, style, name)
+        elif line.startswith("["):
+            in_events = line.strip().lower() == "[events]"
+        elif in_events and line.startswith("Format:"):
+            fields = [field.strip() for field in line[len("Format:"):].split(",")]
+            start_i, end_i, style_i, name_i, text_i = positions(fields)
+
+
+def iter_cues(source: Union[str, Path, Iterable[str]], fmt: Optional[str] = None,
+              encoding: Optional[str] = None, strip_tags: bool = True) -> Iterator[Cue]:
+    """
+    Потоково читає субтитри.
+
+    Args:
+        source: Шлях до файлу або ітерабельне рядків (наприклад, stdout ffmpeg)
+        fmt: "srt", "vtt", "ass" або "ssa"; None — за розширенням або першим рядком
+        encoding: Кодування файлу; None — визначається автоматично
+        strip_tags: Прибирати HTML/ASS-теги з тексту
+
+    Yields:
+        Cue у порядку появи у файлі (порожні репліки пропускаються)
+    """
+    if isinstance(source, (str, Path)):
+        # Кодування визначається з буфера того самого потоку, без повторного читання
+        with open_text(source, encoding) as f:
+            first_line = f.readline()
+            fmt = fmt or detect_format(source, first_line)
+            yield from _iter_lines(_chain_first(first_line, f), fmt, strip_tags)
+        return
+
+    lines = iter(source)
+    if fmt is None:
+        first_line = next(lines, "")
+        fmt = detect_format("", first_line)
+        lines = _chain_first(first_line, lines)
+    yield from _iter_lines(lines, fmt, strip_tags)
+
+
+def _chain_first(first_line: str, rest: Iterable[str]) -> Iterator[str]:
+    return chain((first_line.lstrip("\ufeff"),), rest)
+
+
+def _iter_lines(lines: Iterable[str], fmt: str, strip_tags: bool) -> Iterator[Cue]:
+    fmt = fmt.lower()
+    if fmt in ("ass", "ssa"):
+        return _iter_ass(lines, strip_tags)
+    if fmt in ("srt", "vtt"):
+        return _iter_blocks(lines, strip_tags)
+    raise ValueError(f"❌ Непідтримуваний формат субтитрів: {fmt}. Доступні: {', '.join(SUBTITLE_FORMATS)}")
+
+
+def load_segments(source: Union[str, Path], fmt: Optional[str] = None) -> Dict[str, List[Dict]]:
+    """
+    Читає субтитри у формат результату Whisper: {"segments": [{"start", "end", "text"}]},
+    з яким працюють переклад і генерація ASS.
+    """
+    return {
+        "segments": [
+            {"start": cue.start, "end": cue.end, "text": cue.text}
+            for cue in iter_cues(source, fmt)
+        ]
+    }
+
+
+def preview_lines(source: Union[str, Path], max_lines: int = 5, min_length: int = 0,
+                  max_length: Optional[int] = None) -> List[str]:
+    """
+    Перші репліки файлу для превʼю; файл читається лише до потрібної кількості.
+
+    Args:
+        min_length: Пропускати репліки коротші за цю довжину
+        max_length: Обрізати довгі репліки з "..." в кінці
+    """
+    lines = []
+    texts = (cue.text for cue in iter_cues(source) if len(cue.text) >= min_length)
+    for text in islice(texts, max_lines):
+        if max_length and len(text) > max_length:
+            text = text[:max_length] + "..."
+        lines.append(text)
+    return lines
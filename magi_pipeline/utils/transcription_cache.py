@@ -0,0 +1,223 @@
+"""
+transcription_cache.py — контентно-адресований кеш результатів транскрибації.
+
+Ключ — хеш декодованого аудіо + модель Whisper + мова + параметри декодування,
+тож будь-яка задача з тим самим аудіо миттєво отримує готові сегменти,
+незалежно від імені файлу чи сесії. Записи зберігаються стиснутим JSON
+і витісняються за розміром (найдавніше використані першими).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("MAGI_TRANSCRIPT_CACHE_DIR", "cache/transcripts"))
+DEFAULT_MAX_MB = int(os.environ.get("MAGI_TRANSCRIPT_CACHE_MB", "512"))
+
+# Ключ запису — SHA-256 у hex (transcript_key)
+_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# Блок, яким хешуємо аудіо (для memmap не читаємо все одразу)
+_HASH_BLOCK_SAMPLES = 4 * 1024 * 1024
+
+
+def audio_fingerprint(audio) -> str:
+    """
+    Хеш аудіо: для масиву — хеш семплів, для шляху — хеш вмісту файлу.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    if isinstance(audio, np.ndarray):
+        h.update(str(audio.dtype).encode())
+        for start in range(0, len(audio), _HASH_BLOCK_SAMPLES):
+            h.update(np.ascontiguousarray(audio[start:start + _HASH_BLOCK_SAMPLES]).tobytes())
+    else:
+        with open(audio, "rb") as f:
+            while True:
+                chunk = f.read(4 * 1024 * 1024)
+                if not chunk:
+                    break
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def transcript_key(audio_hash: str, model_name: str, language: Optional[str],
+                   options: Optional[Dict[str, Any]] = None) -> str:
+    """Ключ запису: аудіо + модель + мова + параметри декодування."""
+    payload = json.dumps({
+        "audio": audio_hash,
+        "model": model_name,
+        "language": language,
+        "options": options or {},
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_valid_key(key: str) -> bool:
+    """Чи має рядок формат ключа запису (захист від шляхів на кшталт ../)."""
+    return bool(_KEY_PATTERN.fullmatch(key))
+
+
+class TranscriptionCache:
+    """Кеш транскрипцій на диску: один файл <key>.json.gz на запис."""
+
+    def __init__(self, directory: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        if not is_valid_key(key):
+            raise ValueError(f"❌ Невалідний ключ кешу транскрипцій: {key!r}")
+        return self.directory / f"{key}.json.gz"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Повертає результат у форматі Whisper або None."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        # Час доступу = mtime, за ним працює LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._stats["hits"] += 1
+
+        segments = [
+            {"id": i, "start": start, "end": end, "text": text}
+            for i, (start, end, text) in enumerate(data["segments"])
+        ]
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": data.get("language"),
+        }
+
+    def put(self, key: str, result: Dict[str, Any], meta: Optional[Dict[str, Any]] = None):
+        """Зберігає сегменти компактно: [start, end, text] без службових полів Whisper."""
+        data = {
+            "meta": {**(meta or {}), "created_at": time.time()},
+            "language": result.get("language"),
+            "segments": [
+                [round(segment["start"], 3), round(segment["end"], 3), segment["text"]]
+                for segment in result["segments"]
+            ],
+        }
+        path = self._path(key)
+        tmp_path = path.with_name(path.name + f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._stats["stored"] += 1
+        self.prune()
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """Список записів: ключ, розмір, час останнього використання, метадані."""
+        entries = []
+        for path in self.directory.glob("*.json.gz"):
+            key = path.name[:-len(".json.gz")]
+            if not is_valid_key(key):
+                continue
+            try:
+                stat = path.stat()
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    meta = json.load(f).get("meta", {})
+            except (OSError, ValueError):
+                continue
+            entries.append({
+                "key": key,
+                "size_bytes": stat.st_size,
+                "last_used": stat.st_mtime,
+                "meta": meta,
+            })
+        entries.sort(key=lambda entry: entry["last_used"], reverse=True)
+        return entries
+
+    def invalidate(self, key: Optional[str] = None, **meta_filter) -> int:
+        """
+        Видаляє записи: за ключем або за збігом полів метаданих
+        (наприклад, invalidate(model_name="base")). Без аргументів — очищує все.
+
+        Returns:
+            Кількість видалених записів
+
+        Raises:
+            ValueError: Ключ не має формату transcript_key
+        """
+        if key is not None:
+            try:
+                self._path(key).unlink()
+                return 1
+            except FileNotFoundError:
+                return 0
+
+        removed = 0
+        for entry in self.list_entries():
+            if all(entry["meta"].get(name) == value for name, value in meta_filter.items()):
+                try:
+                    self._path(entry["key"]).unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def prune(self):
+        """Видаляє найдавніше використані записи, поки кеш більший за ліміт."""
+        with self._lock:
+            files = []
+            for path in self.directory.glob("*.json.gz"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in files)
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self._stats["evicted"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "max_bytes": self.max_bytes,
+                "directory": str(self.directory),
+            }
+
+
+_default_cache: Optional[TranscriptionCache] = None
+_default_lock = threading.Lock()
+
+
+def get_transcription_cache() -> TranscriptionCache:
+    """Повертає спільний для процесу кеш транскрипцій."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = TranscriptionCache()
+        return _default_cache
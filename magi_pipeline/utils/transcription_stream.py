@@ -0,0 +1,286 @@
+"""
+transcription_stream.py — потокова транскрибація з прогресом за часом аудіо.
+
+Аудіо транскрибується одним суцільним викликом model.transcribe (той самий
+прохід Whisper, що й без прогресу), а прогрес і готові сегменти беруться з
+власного циклу декодування Whisper: після кожного 30-секундного вікна він
+оновлює прогрес-бар позицією seek, а сегменти вікна вже додані до результату.
+Події віддаються одразу — генератором або через колбеки. Прогрес рахується
+за обробленими секундами аудіо: пропускна здатність (аудіо-с / с) та ETA.
+"""
+
+import importlib
+import queue
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from magi_pipeline.utils.vad import SAMPLE_RATE
+
+# Кадрів мел-спектрограми на секунду аудіо (whisper.audio.FRAMES_PER_SECOND)
+_FRAMES_PER_SECOND = 100
+
+# Як часто потік декодування перевіряє, чи генератор не закрито, поки черга заповнена
+_POLL_SECONDS = 0.2
+
+Event = Tuple[List[Dict[str, Any]], Dict[str, Any]]
+
+# Колбек вікна декодування для потоку, в якому зараз працює model.transcribe
+_hook = threading.local()
+_install_lock = threading.Lock()
+_hook_installed = False
+
+# Хук спирається на приватні деталі whisper.transcribe: прогрес-бар створюється
+# через tqdm.tqdm, а сегменти накопичуються в локальному списку all_segments.
+# Перевірено з openai-whisper цієї версії; з іншою хук працює, якщо ці деталі
+# збереглися, інакше сегменти приходять лише в кінці (з попередженням у лог).
+WHISPER_HOOK_TESTED_VERSION = "20250625"
+_warned = set()
+
+
+def _warn_once(reason: str, message: str):
+    with _install_lock:
+        if reason in _warned:
+            return
+        _warned.add(reason)
+    print(f"⚠️ {message}")
+
+
+class ProgressTracker:
+    """Рахує прогрес, пропускну здатність та ETA за обробленим часом аудіо."""
+
+    def __init__(self, audio_total_s: float):
+        self.audio_total_s = audio_total_s
+        self.audio_done_s = 0.0
+        self.segments = 0
+        self.language = None
+        self.started = time.perf_counter()
+
+    def advance(self, audio_s: float, segments: int = 0) -> Dict[str, Any]:
+        self.audio_done_s = min(self.audio_total_s, self.audio_done_s + audio_s)
+        self.segments += segments
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        throughput = self.audio_done_s / elapsed if elapsed > 0 else 0.0
+        remaining = self.audio_total_s - self.audio_done_s
+        return {
+            "audio_done_s": round(self.audio_done_s, 2),
+            "audio_total_s": round(self.audio_total_s, 2),
+            "fraction": self.audio_done_s / self.audio_total_s if self.audio_total_s else 1.0,
+            "elapsed_s": round(elapsed, 2),
+            "throughput": round(throughput, 2),
+            "eta_s": round(remaining / throughput, 1) if throughput > 0 else None,
+            "segments": self.segments,
+            "language": self.language,
+        }
+
+
+def shift_segments(segments: List[Dict[str, Any]], offset: float) -> List[Dict[str, Any]]:
+    """Зсуває таймкоди сегментів шматка на його позицію в повному аудіо."""
+    for segment in segments:
+        segment["start"] += offset
+        segment["end"] += offset
+        segment["seek"] = segment.get("seek", 0) + int(round(offset * 100))
+        for word in segment.get("words") or []:
+            word["start"] += offset
+            word["end"] += offset
+    return segments
+
+
+class _Cancelled(Exception):
+    """Споживач закрив генератор — декодування зупиняється на наступному вікні."""
+
+
+class _DecodeProgress:
+    """Прогрес-бар для whisper.transcribe: передає позицію та нові сегменти в колбек."""
+
+    def __init__(self, callback: Callable, segments: Optional[List[Dict[str, Any]]]):
+        self.callback = callback
+        self.segments = segments
+        self.emitted = 0
+        self.n = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def update(self, frames: int):
+        self.n += frames
+        new_segments = []
+        if self.segments is not None:
+            new_segments = self.segments[self.emitted:]
+            self.emitted = len(self.segments)
+        self.callback(self.n, new_segments)
+
+    def close(self):
+        pass
+
+
+class _TqdmModule:
+    """
+    Замінник модуля tqdm у whisper.transcribe. Для потоку з активним колбеком
+    віддає _DecodeProgress, для решти — звичайний tqdm.
+    """
+
+    def __init__(self, original):
+        self._original = original
+
+    def __getattr__(self, name):
+        return getattr(self._original, name)
+
+    def tqdm(self, *args, **kwargs):
+        callback = getattr(_hook, "callback", None)
+        if callback is None:
+            return self._original.tqdm(*args, **kwargs)
+        # all_segments — локальний список transcribe, створений до прогрес-бару і лише доповнюваний
+        segments = sys._getframe(1).f_locals.get("all_segments")
+        if not isinstance(segments, list):
+            _warn_once("all_segments", "whisper.transcribe не має списку all_segments: прогрес оновлюється, "
+                                       "але сегменти прийдуть лише після завершення транскрибації")
+            segments = None
+        return _DecodeProgress(callback, segments)
+
+
+def _install_progress_hook():
+    global _hook_installed
+    with _install_lock:
+        if _hook_installed:
+            return
+        _hook_installed = True
+        version = getattr(importlib.import_module("whisper"), "__version__", None)
+        # whisper.transcribe як атрибут пакета — функція, тому модуль беремо через import_module
+        module = importlib.import_module("whisper.transcribe")
+        if not hasattr(getattr(module, "tqdm", None), "tqdm"):
+            print(f"⚠️ whisper {version} не використовує tqdm.tqdm у transcribe: "
+                  f"прогрес і сегменти прийдуть лише після завершення транскрибації")
+            return
+        if version != WHISPER_HOOK_TESTED_VERSION:
+            print(f"⚠️ Потоковий прогрес перевірено з whisper {WHISPER_HOOK_TESTED_VERSION}, "
+                  f"встановлено {version}: якщо сегменти приходять лише в кінці, хук треба оновити")
+        if not isinstance(module.tqdm, _TqdmModule):
+            module.tqdm = _TqdmModule(module.tqdm)
+
+
+def iter_transcribe(model, audio: np.ndarray, options: Dict[str, Any]) -> Iterator[Event]:
+    """
+    Транскрибує аудіо одним викликом model.transcribe, віддаючи сегменти
+    після кожного вікна декодування Whisper.
+
+    Декодування йде у фоновому потоці. Черга подій обмежена: якщо споживач
+    не встигає (повна черга staged_pipeline), Whisper чекає. Якщо генератор
+    закрито достроково, декодування зупиняється на наступному вікні.
+
+    Args:
+        model: Модель Whisper
+        audio: Моно float32 16 кГц
+        options: Параметри model.transcribe (verbose примусово вимкнено)
+
+    Yields:
+        (нові сегменти, прогрес); остання подія містить визначену мову
+    """
+    _install_progress_hook()
+    options = {**options, "verbose": None}
+    tracker = ProgressTracker(len(audio) / SAMPLE_RATE)
+    tracker.language = options.get("language")
+    events: queue.Queue = queue.Queue(maxsize=1)
+    cancelled = threading.Event()
+
+    def put(event) -> bool:
+        while not cancelled.is_set():
+            try:
+                events.put(event, timeout=_POLL_SECONDS)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def on_window(frames: int, segments: List[Dict[str, Any]]):
+        if not put(("window", frames / _FRAMES_PER_SECOND, list(segments))):
+            raise _Cancelled()
+
+    def decode():
+        _hook.callback = on_window
+        try:
+            put(("done", model.transcribe(audio, **options), None))
+        except _Cancelled:
+            pass
+        except BaseException as error:
+            put(("error", error, None))
+        finally:
+            _hook.callback = None
+
+    worker = threading.Thread(target=decode, name="whisper-decode", daemon=True)
+    worker.start()
+    try:
+        while True:
+            kind, payload, segments = events.get()
+            if kind == "window":
+                yield segments, tracker.advance(payload - tracker.audio_done_s, len(segments))
+            elif kind == "done":
+                # Сегменти, які не вдалося віддати по вікнах (інша версія Whisper), — наприкінці
+                rest = payload["segments"][tracker.segments:]
+                if rest and tracker.segments == 0 and tracker.audio_done_s == 0:
+                    _warn_once("no_windows", "Whisper не повідомляв про вікна декодування: сегменти прийшли "
+                                             "лише після завершення, перекладу паралельно з транскрибацією не було")
+                tracker.language = tracker.language or payload.get("language")
+                yield rest, tracker.advance(tracker.audio_total_s, len(rest))
+                return
+            else:
+                raise payload
+    finally:
+        cancelled.set()
+        # Модель повертається в пул лише після того, як потік декодування її відпустив
+        worker.join()
+
+
+def replay(result: Dict[str, Any], audio_total_s: float) -> Iterator[Event]:
+    """Віддає готовий результат (наприклад, з кешу) однією подією з повним прогресом."""
+    tracker = ProgressTracker(audio_total_s)
+    tracker.language = result.get("language")
+    yield result["segments"], tracker.advance(audio_total_s, len(result["segments"]))
+
+
+def collect(events: Iterable[Event],
+            progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+            segment_callback: Optional[Callable[[List[Dict[str, Any]]], None]] = None) -> Dict[str, Any]:
+    """
+    Споживає потік подій, викликаючи колбеки, і збирає результат у форматі Whisper.
+
+    Args:
+        events: Генератор (сегменти, прогрес)
+        progress_callback: Функція (прогрес) після кожного шматка
+        segment_callback: Функція (нові сегменти) — для стадій, що працюють з частковим результатом
+
+    Returns:
+        {"text", "segments", "language"}
+    """
+    segments: List[Dict[str, Any]] = []
+    language = None
+    for new_segments, progress in events:
+        segments.extend(new_segments)
+        language = language or progress.get("language")
+        if segment_callback and new_segments:
+            segment_callback(new_segments)
+        if progress_callback:
+            progress_callback(progress)
+    return {
+        "text": "".join(segment["text"] for segment in segments),
+        "segments": segments,
+        "language": language,
+    }
+
+
+def format_progress(progress: Dict[str, Any]) -> str:
+    """Короткий рядок для UI: оброблено / всього, швидкість, ETA."""
+    message = (f"{progress['audio_done_s']:.0f}/{progress['audio_total_s']:.0f} с аудіо, "
+               f"x{progress['throughput']:.1f}")
+    if progress["eta_s"] is not None and progress["fraction"] < 1:
+        message += f", залишилось ~{progress['eta_s']:.0f} с"
+    return message
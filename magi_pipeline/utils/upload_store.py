@@ -0,0 +1,315 @@
+"""
+upload_store.py — сховище завантажених відео за вмістом (SHA-256).
+
+Кожне відео зберігається один раз у <root>/<sha[:2]>/<sha>/video.<ext>;
+сесія лише посилається на вміст. Поруч лежать артефакти, які не залежать
+від сесії:
+- analysis.json — результат аналізу (ffprobe, доріжки, субтитри);
+- subtitles.json і subs_<індекс>.<формат> — витягнуті текстові субтитри;
+- audio_<індекс>.f32 — декодоване аудіо (float32 16 кГц), відкривається як memmap;
+- jobs/<ключ>.json — оригінал і переклад для конкретної конфігурації.
+
+Той самий епізод, завантажений удруге (іншим редактором чи після
+оновлення сторінки), не зберігається, не аналізується і не демультиплексується
+повторно, а повторна обробка з тією ж конфігурацією бере готовий переклад.
+Розмір сховища обмежений: найдавніше використані об'єкти видаляються (LRU),
+крім тих, що зараз використовуються сесіями.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from magi_pipeline.utils.demux import DemuxManifest, ExtractedSubtitle, demux
+from magi_pipeline.utils.fingerprint import get_fingerprint_service
+from magi_pipeline.utils.media_probe import probe_media
+
+# Ліміт розміру сховища (відео та артефакти разом)
+DEFAULT_STORE_MAX_GB = float(os.environ.get("MAGI_UPLOAD_STORE_GB", "20"))
+
+# Блок запису/хешування для /upload_video
+_COPY_BLOCK_BYTES = 8 * 1024 * 1024
+
+# Поля конфігурації, від яких залежать оригінал і переклад (стиль, формати і MKV — ні)
+JOB_CONFIG_FIELDS = (
+    "source_type", "audio_stream_index", "subtitle_stream_index", "whisper_model", "whisper_precision",
+    "transcription_mode", "use_gpu", "source_language", "target_language", "translation_engine",
+)
+
+
+class StoredVideo(NamedTuple):
+    """Відео у сховищі."""
+    sha256: str
+    path: str
+    filename: str
+    size: int
+    reused: bool
+
+
+def job_key(config: Dict, engine_revision: str, external_fingerprint: Optional[str] = None) -> str:
+    """
+    Ключ результату обробки: поля JOB_CONFIG_FIELDS, версія движка перекладу
+    та (для зовнішніх субтитрів) відбиток файлу субтитрів.
+    """
+    relevant = {field: config.get(field) for field in JOB_CONFIG_FIELDS}
+    relevant["engine_revision"] = engine_revision
+    relevant["external"] = external_fingerprint
+    payload = json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class UploadStore:
+    """Сховище відео за вмістом з артефактами обробки."""
+
+    def __init__(self, root: Union[str, Path], max_bytes: Optional[int] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes if max_bytes is not None else int(DEFAULT_STORE_MAX_GB * 1024 ** 3)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Локи об'єктів: артефакти одного відео створює лише один потік
+        self._object_locks: Dict[str, threading.Lock] = {}
+        self._stats = {"stored": 0, "deduplicated": 0, "analysis_hits": 0, "audio_hits": 0, "subtitle_hits": 0,
+                       "job_hits": 0, "evicted": 0}
+
+    def object_dir(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def _object_lock(self, sha256: str) -> threading.Lock:
+        with self._lock:
+            return self._object_locks.setdefault(sha256, threading.Lock())
+
+    def _video_path(self, sha256: str) -> Optional[Path]:
+        directory = self.object_dir(sha256)
+        if not directory.is_dir():
+            return None
+        for path in directory.glob("video.*"):
+            return path
+        return None
+
+    def _touch(self, sha256: str):
+        # Час останнього використання — mtime meta.json (для LRU)
+        meta_path = self.object_dir(sha256) / "meta.json"
+        if meta_path.exists():
+            os.utime(meta_path)
+
+    def ingest(self, path: Union[str, Path], sha256: str, filename: str) -> StoredVideo:
+        """
+        Переносить завантажений файл у сховище (перейменуванням, без копіювання).
+        Якщо такий вміст уже є, новий файл видаляється, а повертається наявний.
+
+        Args:
+            path: Щойно завантажений файл (у тій самій файловій системі)
+            sha256: Повний SHA-256 файлу
+            filename: Оригінальне ім'я файлу
+        """
+        path = Path(path)
+        with self._lock:
+            existing = self._video_path(sha256)
+            if existing is not None:
+                path.unlink(missing_ok=True)
+                self._touch(sha256)
+                self._stats["deduplicated"] += 1
+                return StoredVideo(sha256, str(existing), filename, existing.stat().st_size, True)
+
+            directory = self.object_dir(sha256)
+            directory.mkdir(parents=True, exist_ok=True)
+            target = directory / f"video{Path(filename).suffix.lower()}"
+            os.replace(path, target)
+            with open(directory / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({"sha256": sha256, "filename": filename, "size": target.stat().st_size,
+                           "created": time.time()}, f, ensure_ascii=False)
+            self._stats["stored"] += 1
+        # Ключ індексу (inode, mtime) після перейменування той самий — оновлюємо лише шлях
+        get_fingerprint_service().record_full_hash(target, sha256)
+        return StoredVideo(sha256, str(target), filename, target.stat().st_size, False)
+
+    def save_stream(self, stream: BinaryIO, filename: str) -> StoredVideo:
+        """
+        Записує тіло завантаження у сховище, хешуючи його по мірі запису
+        (для звичайного multipart /upload_video).
+        """
+        h = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    block = stream.read(_COPY_BLOCK_BYTES)
+                    if not block:
+                        break
+                    f.write(block)
+                    h.update(block)
+            return self.ingest(tmp_name, h.hexdigest(), filename)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    def remove(self, sha256: str):
+        """Видаляє об'єкт разом з усіма артефактами."""
+        with self._object_lock(sha256), self._lock:
+            shutil.rmtree(self.object_dir(sha256), ignore_errors=True)
+
+    # --- Аналіз ---
+
+    def load_analysis(self, sha256: str) -> Optional[Dict]:
+        path = self.object_dir(sha256) / "analysis.json"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            analysis = json.load(f)
+        with self._lock:
+            self._stats["analysis_hits"] += 1
+        return analysis
+
+    def save_analysis(self, sha256: str, analysis: Dict):
+        self._write_json(self.object_dir(sha256) / "analysis.json", analysis)
+
+    # --- Аудіо та субтитри ---
+
+    def demux(self, sha256: str, video_path: Union[str, Path], audio: bool = True,
+              audio_stream_index: Optional[int] = None, mmap_dir=None) -> DemuxManifest:
+        """
+        demux() з артефактами у сховищі: ffmpeg запускається лише для того,
+        чого ще немає (аудіо цієї доріжки та/або субтитри).
+
+        Паралельні виклики для того самого відео серіалізуються: другий чекає
+        і бере вже створені першим артефакти.
+        """
+        with self._object_lock(sha256):
+            return self._demux_locked(sha256, video_path, audio, audio_stream_index, mmap_dir)
+
+    def _demux_locked(self, sha256: str, video_path: Union[str, Path], audio: bool,
+                      audio_stream_index: Optional[int], mmap_dir) -> DemuxManifest:
+        directory = self.object_dir(sha256)
+        audio_path = directory / f"audio_{'default' if audio_stream_index is None else audio_stream_index}.f32"
+        subtitles = self._load_subtitles(directory)
+
+        samples = None
+        if audio and audio_path.exists():
+            # copy-on-write: масив доступний для запису (torch.from_numpy), файл не змінюється
+            samples = np.memmap(audio_path, dtype=np.float32, mode="c")
+            with self._lock:
+                self._stats["audio_hits"] += 1
+        if subtitles is not None:
+            with self._lock:
+                self._stats["subtitle_hits"] += 1
+
+        need_audio = audio and samples is None
+        if need_audio or subtitles is None:
+            manifest = demux(video_path, directory, audio=need_audio, audio_stream_index=audio_stream_index,
+                             subtitle_streams=None if subtitles is None else [], mmap_dir=mmap_dir)
+            if subtitles is None:
+                subtitles = manifest.subtitles
+                self._write_json(directory / "subtitles.json", [subtitle._asdict() for subtitle in subtitles])
+            if need_audio:
+                samples = manifest.audio
+                self._save_audio(audio_path, samples)
+
+        extracted = {subtitle.index for subtitle in subtitles}
+        skipped = [stream for stream in probe_media(video_path).subtitle_streams if stream.index not in extracted]
+        return DemuxManifest(str(video_path), samples, audio_stream_index, subtitles, skipped)
+
+    def _load_subtitles(self, directory: Path) -> Optional[List[ExtractedSubtitle]]:
+        path = directory / "subtitles.json"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            subtitles = [ExtractedSubtitle(**record) for record in json.load(f)]
+        if not all(os.path.exists(subtitle.path) for subtitle in subtitles):
+            return None
+        return subtitles
+
+    def _save_audio(self, path: Path, samples: np.ndarray):
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                # Для memmap tofile пише з відображення, без копії в RAM
+                np.asarray(samples, dtype=np.float32).tofile(f)
+            os.replace(tmp_name, path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    # --- Результати обробки ---
+
+    def load_job(self, sha256: str, key: str) -> Optional[Dict]:
+        path = self.object_dir(sha256) / "jobs" / f"{key}.json"
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        with self._lock:
+            self._stats["job_hits"] += 1
+        return job
+
+    def save_job(self, sha256: str, key: str, job: Dict):
+        self._write_json(self.object_dir(sha256) / "jobs" / f"{key}.json", job)
+
+    def _write_json(self, path: Path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Унікальне тимчасове ім'я: паралельні записи не затирають файл один одного
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".part")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_name, path)
+        finally:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+
+    # --- Обмеження розміру ---
+
+    def _objects(self) -> List[Dict]:
+        objects = []
+        for meta_path in self.root.glob("*/*/meta.json"):
+            directory = meta_path.parent
+            size = 0
+            try:
+                for path in directory.rglob("*"):
+                    if path.is_file():
+                        size += path.stat().st_size
+                last_used = meta_path.stat().st_mtime
+            except FileNotFoundError:
+                # Тимчасовий файл зник під час обходу або об'єкт щойно видалено
+                continue
+            objects.append({"sha256": directory.name, "size": size, "last_used": last_used})
+        return objects
+
+    def prune(self, keep: Iterable[str] = ()) -> int:
+        """
+        Видаляє найдавніше використані об'єкти, поки сховище більше за max_bytes.
+
+        Args:
+            keep: SHA-256 об'єктів, які зараз використовуються (не видаляються)
+
+        Returns:
+            Кількість видалених об'єктів
+        """
+        keep = set(keep)
+        objects = sorted(self._objects(), key=lambda item: item["last_used"])
+        total = sum(item["size"] for item in objects)
+        removed = 0
+        for item in objects:
+            if total <= self.max_bytes:
+                break
+            if item["sha256"] in keep:
+                continue
+            self.remove(item["sha256"])
+            total -= item["size"]
+            removed += 1
+        with self._lock:
+            self._stats["evicted"] += removed
+        return removed
+
+    def stats(self) -> Dict:
+        objects = self._objects()
+        with self._lock:
+            return {**self._stats, "objects": len(objects), "bytes": sum(item["size"] for item in objects),
+                    "max_bytes": self.max_bytes}
@@ -0,0 +1,106 @@
+"""
+vad.py — легкий енергетичний детектор тиші для нарізки аудіо на шматки.
+
+Аудіо ріжеться в паузах між репліками, тож шматки можна транскрибувати
+незалежно (паралельно або потоково) без розрізаних слів.
+"""
+
+from typing import List, Tuple
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+# Скільки кадрів обробляти за раз, щоб не створювати копію всього аудіо
+_FRAMES_PER_BLOCK = 20000
+
+
+def frame_energy_db(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """
+    Обчислює RMS-енергію кадрів у dBFS.
+
+    Args:
+        audio: Моно float32 у діапазоні [-1, 1]
+        sample_rate: Частота дискретизації
+        frame_ms: Довжина кадру в мілісекундах
+
+    Returns:
+        Масив енергій кадрів (dB)
+    """
+    frame_len = sample_rate * frame_ms // 1000
+    n_frames = len(audio) // frame_len
+    energy = np.empty(n_frames, dtype=np.float32)
+    for start in range(0, n_frames, _FRAMES_PER_BLOCK):
+        stop = min(start + _FRAMES_PER_BLOCK, n_frames)
+        block = np.asarray(audio[start * frame_len:stop * frame_len], dtype=np.float32).reshape(-1, frame_len)
+        energy[start:stop] = np.sqrt(np.mean(block * block, axis=1))
+    return 20 * np.log10(energy + 1e-10)
+
+
+def find_silences(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, min_silence_ms: int = 300,
+                  threshold_db: float = None) -> List[Tuple[int, int]]:
+    """
+    Знаходить тихі ділянки.
+
+    Args:
+        audio: Моно float32
+        sample_rate: Частота дискретизації
+        min_silence_ms: Мінімальна тривалість тиші
+        threshold_db: Поріг тиші; None — адаптивний (рівень шуму + 10 dB, не вище -30 dBFS)
+
+    Returns:
+        Список (початок, кінець) тиші у семплах
+    """
+    energy = frame_energy_db(audio, sample_rate)
+    if len(energy) == 0:
+        return []
+    if threshold_db is None:
+        threshold_db = min(float(np.percentile(energy, 10)) + 10.0, -30.0)
+
+    frame_len = sample_rate * FRAME_MS // 1000
+    min_frames = max(1, min_silence_ms // FRAME_MS)
+
+    silent = np.concatenate(([False], energy < threshold_db, [False]))
+    edges = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    return [(int(s) * frame_len, int(e) * frame_len)
+            for s, e in zip(starts, ends) if e - s >= min_frames]
+
+
+def split_on_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, max_chunk_s: float = 90.0,
+                     min_chunk_s: float = 15.0, min_silence_ms: int = 300) -> List[Tuple[int, int]]:
+    """
+    Ділить аудіо на шматки обмеженої довжини, розрізаючи посередині пауз.
+
+    Якщо в допустимому вікні немає паузи, розріз робиться в найтихішому кадрі.
+
+    Returns:
+        Список (початок, кінець) шматків у семплах, що покривають все аудіо
+    """
+    total = len(audio)
+    max_len = int(max_chunk_s * sample_rate)
+    min_len = int(min_chunk_s * sample_rate)
+    if total <= max_len:
+        return [(0, total)] if total else []
+
+    cut_points = [(s + e) // 2 for s, e in find_silences(audio, sample_rate, min_silence_ms)]
+    energy = None
+    frame_len = sample_rate * FRAME_MS // 1000
+
+    chunks = []
+    position = 0
+    while total - position > max_len:
+        window_start, window_end = position + min_len, position + max_len
+        candidates = [c for c in cut_points if window_start <= c <= window_end]
+        if candidates:
+            # Найпізніша пауза у вікні дає найдовший шматок
+            cut = candidates[-1]
+        else:
+            if energy is None:
+                energy = frame_energy_db(audio, sample_rate)
+            first, last = window_start // frame_len, window_end // frame_len
+            cut = (first + int(np.argmin(energy[first:last]))) * frame_len
+        chunks.append((position, cut))
+        position = cut
+    chunks.append((position, total))
+    return chunks
@@ -2,6 +2,8 @@ import re
 from pathlib import Path
 from typing import Dict, List, Any
 
+from magi_pipeline.utils.subtitle_parser import iter_cues, seconds_to_ass_time
+
 
 def parse_vtt(vtt_file: Path) -> Dict[str, Any]:
     """
@@ -13,84 +15,15 @@ def parse_vtt(vtt_file: Path) -> Dict[str, Any]:
     Returns:
         Словник з структурою аналогічною до parse_ass
     """
-    
-    try:
-        with open(vtt_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except UnicodeDecodeError:
-        # Спробуємо інші кодування
-        for encoding in ['cp1251', 'latin1', 'cp1252']:
-            try:
-                with open(vtt_file, 'r', encoding=encoding) as f:
-                    content = f.read()
-                break
-            except UnicodeDecodeError:
-                continue
-        else:
-            raise Exception("Не вдалося прочитати VTT файл")
-    
-    dialogue_entries = []
-    lines = content.splitlines()
-    
-    i = 0
-    # Пропускаємо заголовок WEBVTT
-    while i < len(lines) and not lines[i].startswith('WEBVTT'):
-        i += 1
-    if i < len(lines):
-        i += 1  # Пропускаємо рядок з WEBVTT
-    
-    while i < len(lines):
-        # Пропускаємо порожні рядки
-        while i < len(lines) and not lines[i].strip():
-            i += 1
-        
-        if i >= len(lines):
-            break
-        
-        # Це може бути ідентифікатор cue або безпосередньо тайм-код
-        current_line = lines[i].strip()
-        
-        # Перевіряємо, чи це тайм-код
-        if '-->' in current_line:
-            timeline = current_line
-        else:
-            # Це ідентифікатор cue, наступний рядок повинен бути тайм-кодом
-            i += 1
-            if i >= len(lines):
-                break
-            timeline = lines[i].strip()
-        
-        # Парсимо тайм-коди
-        time_match = re.match(r'(\d{2}:\d{2}:\d{2}\.\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2}\.\d{3})', timeline)
-        if not time_match:
-            i += 1
-            continue
-        
-        start_time = time_match.group(1)
-        end_time = time_match.group(2)
-        
-        # Збираємо текст субтитру до наступного порожнього рядка
-        i += 1
-        text_lines = []
-        while i < len(lines) and lines[i].strip():
-            text_lines.append(lines[i].strip())
-            i += 1
-        
-        if text_lines:
-            text = ' '.join(text_lines)
-            # Видаляємо VTT теги (наприклад, <c.classname>text</c>)
-            text = re.sub(r'<[^>]+>', '', text)
-            
-            # Конвертуємо VTT час у ASS формат
-            start_ass = vtt_time_to_ass_time(start_time)
-            end_ass = vtt_time_to_ass_time(end_time)
-            
-            if text.strip():
-                dialogue_entries.append({
-                    "start": start_ass,
-                    "end": end_ass,
-                    "text": text.strip()
-                })
+    # Читання та розбір — спільним потоковим парсером
+    dialogue_entries = [
+        {
+            "start": seconds_to_ass_time(cue.start),
+            "end": seconds_to_ass_time(cue.end),
+            "text": cue.text
+        }
+        for cue in iter_cues(vtt_file, fmt="vtt")
+    ]
     
     return {
         "dialogue": dialogue_entries,
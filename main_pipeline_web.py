@@ -6,9 +6,7 @@
 import os
 import sys
 import json
-import hashlib
-import subprocess
-import re
+import zipfile
 from pathlib import Path
 from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, session
 from werkzeug.utils import secure_filename
@@ -22,7 +20,23 @@ sys.path.append(str(Path(__file__).resolve().parent))
 from magi_pipeline.utils.balthasar import Balthasar
 from magi_pipeline.utils.melchior import Melchior
 from magi_pipeline.utils.caspar import Caspar
+from magi_pipeline.translate.translate import model_stats as translation_model_stats
+from magi_pipeline.translate.translation_memory import get_translation_memory
+from magi_pipeline.translate.deepl_translate import quota_stats as deepl_quota_stats
+from magi_pipeline.utils.transcription_cache import get_transcription_cache, is_valid_key as is_valid_transcript_key
+from magi_pipeline.utils.transcription_stream import format_progress
+from magi_pipeline.utils.staged_pipeline import run_staged
+from magi_pipeline.translate.dedup import deduplicate, dedup_stats
 from magi_pipeline.utils.external_subs import find_external_subtitles, get_subtitle_preview
+from magi_pipeline.utils.subtitle_parser import load_segments
+from magi_pipeline.utils.segment_table import SegmentTable
+from magi_pipeline.utils.muxer import mux_soft_subtitles
+from magi_pipeline.utils.fingerprint import get_fingerprint_service
+from magi_pipeline.utils.media_probe import MediaProbeError, get_media_probe
+from magi_pipeline.utils.upload_store import UploadStore, job_key
+from magi_pipeline.utils.chunked_upload import UPLOAD_CHUNK_BYTES, ChunkedUploads, UploadError
+from magi_pipeline.ass_generator_module.style_registry import get_style_registry
+from magi_pipeline.ass_generator_module.ass_builder import SUBTITLE_OUTPUT_FORMATS
 
 app = Flask(__name__)
 app.secret_key = 'magi_pipeline_secret_key_2024'
@@ -41,6 +55,17 @@ for folder in [UPLOAD_FOLDER, OUTPUT_FOLDER, TEMP_AUDIO_FOLDER]:
 # Глобальний словник для зберігання стану сесій
 processing_sessions = {}
 
+# Відновлювані завантаження шматками (/upload/...)
+chunked_uploads = ChunkedUploads(UPLOAD_FOLDER)
+
+# Відео зберігаються за вмістом (SHA-256), сесії лише посилаються на них
+upload_store = UploadStore(UPLOAD_FOLDER / "store")
+
+# Сесії, що ще можуть звернутися до свого відео (налаштування, обробка, редагування перекладу)
+ACTIVE_SESSION_STATUSES = {'analyzed', 'processing', 'translation_ready'}
+# Після цього часу покинута сесія більше не утримує відео у сховищі
+SESSION_TTL_SECONDS = int(os.environ.get("MAGI_SESSION_TTL_HOURS", "24")) * 3600
+
 def allowed_file(filename, extensions):
     """Перевіряє чи дозволено розширення файлу"""
     if not filename or '.' not in filename:
@@ -48,28 +73,15 @@ def allowed_file(filename, extensions):
     return filename.rsplit('.', 1)[1].lower() in extensions
 
 def is_valid_video_file(file_path):
-    """Додаткова перевірка чи файл є валідним відео"""
+    """Додаткова перевірка чи файл є валідним відео (результат аналізу кешується для analyze_video)"""
     try:
-        # Швидка перевірка через ffprobe
-        probe = subprocess.run([
-            "ffprobe", "-v", "error", "-select_streams", "v:0", 
-            "-show_entries", "stream=codec_type", "-of", "csv=p=0", str(file_path)
-        ], capture_output=True, text=True, timeout=10)
-        
-        return probe.returncode == 0 and "video" in probe.stdout
+        return get_media_probe().probe(file_path, timeout=10).has_video
     except Exception:
         return False
 
 def get_file_hash(path):
-    """Генерує хеш файлу для ідентифікації"""
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+    """Швидкий відбиток файлу для ідентифікації (з індексу, якщо файл не змінювався)"""
+    return get_fingerprint_service().fingerprint(path)
 
 def analyze_video(video_path):
     """Аналізує відео файл - аудіо доріжки та субтитри"""
@@ -78,51 +90,39 @@ def analyze_video(video_path):
         if not video_path.exists():
             return {"error": "Файл не знайдено"}
             
-        # Запускаємо ffprobe для аналізу
-        probe = subprocess.run([
-            "ffprobe", "-v", "quiet", "-print_format", "json", "-show_streams", str(video_path)
-        ], capture_output=True, text=True)
-        
-        if probe.returncode != 0:
-            # Детальніша інформація про помилку
-            error_msg = probe.stderr if probe.stderr else "Невалідний відео файл"
-            return {"error": f"Помилка ffprobe: {error_msg}"}
-        
-        if not probe.stdout.strip():
-            return {"error": "ffprobe не повернув даних - можливо файл пошкоджений"}
-            
-        streams_data = json.loads(probe.stdout)
-        audio_streams = []
-        subtitle_streams = []
-        
-        for stream in streams_data.get("streams", []):
-            if stream["codec_type"] == "audio":
-                audio_streams.append({
-                    "index": stream["index"],
-                    "codec": stream.get("codec_name", "unknown"),
-                    "channels": stream.get("channels", 0),
-                    "language": stream.get("tags", {}).get("language", "unknown"),
-                    "title": stream.get("tags", {}).get("title", "")
-                })
-            elif stream["codec_type"] == "subtitle":
-                subtitle_streams.append({
-                    "index": stream["index"],
-                    "codec": stream.get("codec_name", "unknown"),
-                    "language": stream.get("tags", {}).get("language", "unknown"),
-                    "title": stream.get("tags", {}).get("title", "")
-                })
-        
-        # Шукаємо зовнішні субтитри
-        external_subs = find_external_subtitles(video_path, [video_path.parent])
+        # Один ffprobe на файл: після is_valid_video_file результат уже в кеші
+        try:
+            media = get_media_probe().probe(video_path)
+        except MediaProbeError as e:
+            return {"error": f"Помилка ffprobe: {e}"}
+
+        audio_streams = [{
+            "index": stream.index,
+            "codec": stream.codec_name,
+            "channels": stream.channels,
+            "language": stream.language,
+            "title": stream.title
+        } for stream in media.audio_streams]
+        subtitle_streams = [{
+            "index": stream.index,
+            "codec": stream.codec_name,
+            "language": stream.language,
+            "title": stream.title
+        } for stream in media.subtitle_streams]
+        
+        # Повний SHA-256 рахується у фоні, поки користувач налаштовує обробку
+        fingerprints = get_fingerprint_service()
+        fingerprints.schedule_full_hash(video_path)
         
         return {
             "audio_streams": audio_streams,
             "subtitle_streams": subtitle_streams,
-            "external_subtitles": external_subs,
             "video_info": {
                 "filename": video_path.name,
                 "size": video_path.stat().st_size,
-                "hash": get_file_hash(video_path)
+                "hash": get_file_hash(video_path),
+                "sha256": fingerprints.full_hash(video_path, wait=False),
+                **media.to_dict()
             }
         }
     except Exception as e:
@@ -157,19 +157,73 @@ def get_available_whisper_models():
     }
 
 def get_available_subtitle_styles():
-    """Повертає список доступних стилів субтитрів"""
-    styles_dir = Path("magi_pipeline/ass_generator_module/styles")
-    styles = []
+    """Повертає список доступних стилів субтитрів (з реєстру, без повторного читання файлів)"""
+    return [template.describe() for template in get_style_registry().templates()]
+
+def active_video_hashes():
+    """SHA-256 відео, які використовують незавершені й не прострочені сесії"""
+    now = datetime.now()
+    return {
+        data['video_sha256'] for data in list(processing_sessions.values())
+        if data.get('video_sha256') and data.get('status') in ACTIVE_SESSION_STATUSES
+        and (now - datetime.fromisoformat(data['created_at'])).total_seconds() < SESSION_TTL_SECONDS
+    }
+
+def find_session_subtitles(filename):
+    """
+    Зовнішні субтитри для відео за ім'ям файлу користувача. Шукаються в папці
+    завантажень (без сховища) для кожної сесії окремо: до вмісту відео вони не належать.
+    """
+    return find_external_subtitles(UPLOAD_FOLDER / filename, [UPLOAD_FOLDER], exclude_dirs=[upload_store.root])
+
+def register_uploaded_video(session_id, stored):
+    """Перевіряє й аналізує відео зі сховища та створює сесію обробки. Повертає (відповідь, HTTP-статус)"""
+    video_path = Path(stored.path)
     
-    if styles_dir.exists():
-        for style_file in styles_dir.glob("*.ass"):
-            styles.append({
-                "filename": style_file.name,
-                "name": style_file.stem,
-                "path": str(style_file)
-            })
+    # Аналіз того самого вмісту зберігається разом з ним: повторне завантаження не запускає ffprobe
+    analysis = upload_store.load_analysis(stored.sha256)
+    if analysis is not None:
+        print(f"♻️ Відео вже є у сховищі ({stored.sha256[:12]}), аналіз узято з попереднього завантаження")
+    else:
+        # Додаткова перевірка чи файл є валідним відео
+        print("Перевіряємо валідність відео файлу...")
+        if not is_valid_video_file(video_path):
+            # Видаляємо невалідний файл
+            if not stored.reused:
+                upload_store.remove(stored.sha256)
+            return {"error": "Завантажений файл не є валідним відео файлом. Перевірте формат та цілісність файлу."}, 400
+        
+        # Аналізуємо відео
+        print("Починаємо аналіз відео...")
+        analysis = analyze_video(video_path)
+        print(f"Аналіз завершено: {analysis}")
+        if "error" not in analysis:
+            upload_store.save_analysis(stored.sha256, analysis)
+    
+    if "video_info" in analysis:
+        # Ім'я файлу — як у користувача, а не у сховищі
+        analysis["video_info"] = {**analysis["video_info"], "filename": stored.filename, "reused": stored.reused}
+        analysis["external_subtitles"] = find_session_subtitles(stored.filename)
     
-    return styles
+    # Зберігаємо інформацію про сесію
+    processing_sessions[session_id] = {
+        "video_path": stored.path,
+        "video_sha256": stored.sha256,
+        "video_name": stored.filename,
+        "analysis": analysis,
+        "created_at": datetime.now().isoformat(),
+        "status": "analyzed"
+    }
+    
+    # Сховище обмежене за розміром: давно не використані відео видаляються, відео активних сесій — ні
+    upload_store.prune(keep=active_video_hashes())
+    
+    return {
+        "session_id": session_id,
+        "analysis": analysis,
+        "whisper_models": get_available_whisper_models(),
+        "subtitle_styles": get_available_subtitle_styles()
+    }, 200
 
 @app.route('/')
 def index():
@@ -206,48 +260,15 @@ def upload_video():
         session_id = str(uuid.uuid4())
         session['session_id'] = session_id
         
-        # Створюємо папку uploads якщо її немає
-        UPLOAD_FOLDER.mkdir(exist_ok=True)
-        
-        # Зберігаємо файл
+        # Зберігаємо файл у сховище за вмістом (SHA-256 рахується під час запису)
         filename = secure_filename(file.filename)
-        video_path = UPLOAD_FOLDER / f"{session_id}_{filename}"
-        
-        print(f"Зберігаємо файл: {video_path}")
-        file.save(video_path)
-        
-        # Перевіряємо що файл збережено
-        if not video_path.exists():
-            return jsonify({"error": "Помилка збереження файлу"}), 500
+        print(f"Зберігаємо файл: {filename}")
+        stored = upload_store.save_stream(file.stream, filename)
+        print(f"Файл збережено успішно: {stored.path}. Розмір: {stored.size} байт"
+              f"{' (такий вміст уже був у сховищі)' if stored.reused else ''}")
         
-        print(f"Файл збережено успішно. Розмір: {video_path.stat().st_size} байт")
-        
-        # Додаткова перевірка чи файл є валідним відео
-        print("Перевіряємо валідність відео файлу...")
-        if not is_valid_video_file(video_path):
-            # Видаляємо невалідний файл
-            video_path.unlink(missing_ok=True)
-            return jsonify({"error": "Завантажений файл не є валідним відео файлом. Перевірте формат та цілісність файлу."}), 400
-        
-        # Аналізуємо відео
-        print("Починаємо аналіз відео...")
-        analysis = analyze_video(video_path)
-        print(f"Аналіз завершено: {analysis}")
-        
-        # Зберігаємо інформацію про сесію
-        processing_sessions[session_id] = {
-            "video_path": str(video_path),
-            "analysis": analysis,
-            "created_at": datetime.now().isoformat(),
-            "status": "analyzed"
-        }
-        
-        return jsonify({
-            "session_id": session_id,
-            "analysis": analysis,
-            "whisper_models": get_available_whisper_models(),
-            "subtitle_styles": get_available_subtitle_styles()
-        })
+        payload, status = register_uploaded_video(session_id, stored)
+        return jsonify(payload), status
         
     except Exception as e:
         print(f"Помилка завантаження файлу: {e}")
@@ -255,6 +276,74 @@ def upload_video():
         traceback.print_exc()
         return jsonify({"error": f"Внутрішня помилка сервера: {str(e)}"}), 500
 
+@app.route('/upload/start', methods=['POST'])
+def upload_start():
+    """Відкриває відновлюване завантаження шматками: {filename, size} -> {upload_id, offset, chunk_size}"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename') or '')
+    if not filename or not allowed_file(filename, ALLOWED_VIDEO_EXTENSIONS):
+        return jsonify({"error": f"Непідтримуваний формат файлу. Підтримувані: {', '.join(ALLOWED_VIDEO_EXTENSIONS)}"}), 400
+    try:
+        upload = chunked_uploads.start(filename, int(data.get('size') or 0))
+    except (UploadError, ValueError) as e:
+        return jsonify({"error": str(e)}), getattr(e, 'status', 400)
+    return jsonify({**upload.status(), "chunk_size": UPLOAD_CHUNK_BYTES}), 201
+
+@app.route('/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Стан завантаження: з якого зсуву продовжувати (і результат аналізу, якщо вже завершено)"""
+    try:
+        upload = chunked_uploads.get(upload_id)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status
+    return jsonify({**upload.status(), "result": upload.result})
+
+@app.route('/upload/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """
+    Приймає шматок файлу. Зсув — у заголовку Upload-Offset, тіло — сирі байти.
+    Після останнього шматка відповідає так само, як /upload_video.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Потрібен заголовок Upload-Offset"}), 400
+    try:
+        # Тіло читається потоком: шматок не буферизується в пам'яті цілком
+        upload = chunked_uploads.write(upload_id, offset, request.stream, request.content_length)
+    except UploadError as e:
+        payload = {"error": str(e)}
+        if e.status == 409:
+            try:
+                payload.update(chunked_uploads.get(upload_id).status())
+            except UploadError:
+                pass
+        return jsonify(payload), e.status
+
+    if not upload.complete:
+        return jsonify(upload.status())
+
+    with upload.lock:
+        if upload.result is None:
+            print(f"Файл отримано шматками: {upload.path} ({upload.size} байт, {upload.container})")
+            try:
+                # Перейменування у сховище; якщо такий вміст уже є, отримана копія видаляється
+                stored = upload_store.ingest(upload.path, upload.sha256, upload.filename)
+                payload, status = register_uploaded_video(upload.upload_id, stored)
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                return jsonify({"error": f"Внутрішня помилка сервера: {str(e)}"}), 500
+            upload.result, upload.result_status = payload, status
+    session['session_id'] = upload.upload_id
+    return jsonify({**upload.result, "upload": upload.status()}), upload.result_status
+
+@app.route('/upload/<upload_id>', methods=['DELETE'])
+def upload_abort(upload_id):
+    """Скасовує незавершене завантаження"""
+    chunked_uploads.abort(upload_id)
+    return jsonify({"status": "aborted"})
+
 @app.route('/start_processing', methods=['POST'])
 def start_processing():
     """Запуск процесу обробки"""
@@ -275,106 +364,180 @@ def start_processing():
     
     return jsonify({"status": "started"})
 
-def process_video_async(session_id):
-    """Асинхронна обробка відео"""
-    try:
-        session_data = processing_sessions[session_id]
-        config = session_data['config']
-        video_path = Path(session_data['video_path'])
-        
-        # Крок 1: Витягування аудіо (якщо потрібно)
-        session_data['progress'] = {"step": "audio_extraction", "percent": 10, "message": "Витягування аудіо..."}
-        
-        audio_path = TEMP_AUDIO_FOLDER / f"{session_id}_audio.wav"
-        
-        if config['source_type'] == 'transcribe':
-            Balthasar.extract_audio(video_path, audio_path)
-            session_data['progress'] = {"step": "audio_extraction", "percent": 20, "message": "Аудіо витягнуто"}
-        
-        # Крок 2: Отримання субтитрів
-        if config['source_type'] == 'transcribe':
-            session_data['progress'] = {"step": "transcription", "percent": 30, "message": "Транскрибація..."}
-            
-            result = Balthasar.transcribe(
-                audio_path, 
+def build_translation(session_data, video_path, config):
+    """Кроки 1-3: отримання субтитрів (транскрибація, вбудовані або зовнішні) і переклад. Повертає (таблиця, dedup_info)"""
+    # Крок 1: Одне читання контейнера — аудіо (для транскрибації) і всі текстові субтитри
+    session_data['progress'] = {"step": "audio_extraction", "percent": 10, "message": "Витягування аудіо та субтитрів..."}
+    
+    manifest = None
+    if config['source_type'] in ('transcribe', 'embedded'):
+        # Аудіо й субтитри цього вмісту вже могли бути витягнуті іншою сесією — тоді ffmpeg не запускається
+        audio_stream_index = config.get('audio_stream_index')
+        manifest = upload_store.demux(
+            session_data['video_sha256'],
+            video_path,
+            audio=config['source_type'] == 'transcribe',
+            audio_stream_index=int(audio_stream_index) if audio_stream_index not in (None, '') else None,
+            mmap_dir=TEMP_AUDIO_FOLDER
+        )
+        audio = manifest.audio
+        session_data['demux'] = manifest.to_dict()
+        session_data['progress'] = {"step": "audio_extraction", "percent": 20, "message": "Аудіо та субтитри витягнуто"}
+    
+    # Крок 2: Отримання субтитрів
+    translated_texts = None
+    dedup_info = {}
+    engine = config.get('translation_engine', 'helsinki')
+    source_lang = config.get('source_language', 'ru')
+    target_lang = config.get('target_language', 'uk')
+
+    def translate_texts(texts, **options):
+        return Melchior.translate_batch(
+            texts,
+            engine=engine,
+            api_key=config.get('deepl_api_key'),
+            source_lang=source_lang,
+            target_lang=target_lang,
+            use_cache=config.get('use_translation_cache', True),
+            **options
+        )
+
+    if config['source_type'] == 'transcribe':
+        session_data['progress'] = {"step": "transcription", "percent": 30, "message": "Транскрибація..."}
+        session_data['partial_segments'] = []
+        # Перевіряємо движок до старту, щоб не транскрибувати даремно
+        Melchior.engine_revision(engine, source_lang, target_lang)
+
+        if config.get('transcription_mode') == 'parallel' and not config.get('use_gpu', True):
+            # CPU: шматки між паузами транскрибуються паралельно пулом процесів
+            events = Balthasar.transcribe_parallel_iter(
+                audio,
                 model_name=config.get('whisper_model', 'base'),
-                language=config.get('source_language', 'ru'),
-                device="cuda" if config.get('use_gpu', True) else "cpu"
+                language=source_lang,
+                precision=config.get('whisper_precision')
             )
-            
-            session_data['progress'] = {"step": "transcription", "percent": 50, "message": "Транскрибація завершена"}
-            
-        elif config['source_type'] == 'embedded':
-            session_data['progress'] = {"step": "subtitle_extraction", "percent": 30, "message": "Витягування субтитрів..."}
-            
-            # Витягуємо вбудовані субтитри
-            stream_index = config['subtitle_stream_index']
-            extracted_path = TEMP_AUDIO_FOLDER / f"{session_id}_subs.srt"
-            
-            subprocess.run([
-                "ffmpeg", "-y", "-i", str(video_path), 
-                "-map", f"0:{stream_index}", "-c", "copy", str(extracted_path)
-            ], check=True)
-            
-            # Парсимо субтитри
-            if extracted_path.suffix.lower() == '.srt':
-                result = parse_srt(extracted_path)
-            else:
-                result = parse_ass(extracted_path)
-                
-            session_data['progress'] = {"step": "subtitle_extraction", "percent": 50, "message": "Субтитри витягнуто"}
-            
-        elif config['source_type'] == 'external':
-            session_data['progress'] = {"step": "subtitle_loading", "percent": 30, "message": "Завантаження субтитрів..."}
-            
-            # Завантажуємо зовнішні субтитри
-            external_path = config['external_subtitle_path']
-            if external_path.endswith('.srt'):
-                result = parse_srt(external_path)
-            else:
-                result = parse_ass(external_path)
-                
-            session_data['progress'] = {"step": "subtitle_loading", "percent": 50, "message": "Субтитри завантажено"}
-        
-        # Крок 3: Переклад
-        session_data['progress'] = {"step": "translation", "percent": 60, "message": "Переклад..."}
+        else:
+            events = Balthasar.transcribe_iter(
+                audio,
+                model_name=config.get('whisper_model', 'base'),
+                language=source_lang,
+                device="cuda" if config.get('use_gpu', True) else "cpu",
+                precision=config.get('whisper_precision')
+            )
+
+        def report_pipeline(state):
+            # Транскрибація і переклад ідуть одночасно: 30→90% ділимо між ними порівну
+            transcription = state["transcription"]
+            fraction = transcription["fraction"] if transcription else 0.0
+            translated_fraction = fraction * state["translated"] / max(state["transcribed"], 1)
+            message = f"Переклад {state['translated']}/{state['transcribed']}"
+            if transcription and fraction < 1:
+                message = f"Транскрибація: {format_progress(transcription)} · {message}"
+            session_data['progress'] = {
+                "step": "transcription",
+                "percent": int(30 + 30 * fraction + 30 * translated_fraction),
+                "message": message,
+                "transcription": transcription,
+                "translated": state["translated"]
+            }
+
+        # Сегменти перекладаються пакетами, поки Whisper декодує далі
+        result, translated_texts = run_staged(
+            events,
+            translate_texts,
+            progress_callback=report_pipeline,
+            segment_callback=session_data['partial_segments'].extend
+        )
+        unique_texts, dedup_index = deduplicate([segment["text"] for segment in result["segments"]])
+        dedup_info = dedup_stats(dedup_index, len(unique_texts))
+
+    elif config['source_type'] == 'embedded':
+        session_data['progress'] = {"step": "subtitle_extraction", "percent": 30, "message": "Витягування субтитрів..."}
         
-        translated_segments = []
-        total_segments = len(result["segments"])
+        # Субтитри вже витягнуті на кроці 1 у власному форматі (ASS лишається ASS)
+        stream_index = int(config['subtitle_stream_index'])
+        extracted = manifest.subtitle(stream_index)
+        if extracted is None:
+            raise RuntimeError(f"❌ Потік субтитрів #{stream_index} не текстовий (PGS/DVD) — його не можна перекласти")
         
-        for i, segment in enumerate(result["segments"]):
-            translated_text = Melchior.translate(
-                segment["text"],
-                engine=config.get('translation_engine', 'helsinki'),
-                api_key=config.get('deepl_api_key'),
-                source_lang=config.get('source_language', 'ru'),
-                target_lang=config.get('target_language', 'uk')
-            )
+        # Парсимо субтитри
+        result = load_segments(extracted.path)
             
-            translated_segments.append({
-                "start": segment["start"],
-                "end": segment["end"],
-                "original": segment["text"],
-                "translated": translated_text
-            })
+        session_data['progress'] = {"step": "subtitle_extraction", "percent": 50, "message": "Субтитри витягнуто"}
+        
+    elif config['source_type'] == 'external':
+        session_data['progress'] = {"step": "subtitle_loading", "percent": 30, "message": "Завантаження субтитрів..."}
+        
+        # Завантажуємо зовнішні субтитри
+        external_path = config['external_subtitle_path']
+        result = load_segments(external_path)
             
-            # Оновлюємо прогрес
-            progress_percent = 60 + (30 * i / total_segments)
+        session_data['progress'] = {"step": "subtitle_loading", "percent": 50, "message": "Субтитри завантажено"}
+    
+    # Крок 3: Переклад (для транскрибації вже виконаний паралельно з нею)
+    table = SegmentTable.from_segments(result["segments"], {"original": "text"})
+
+    if translated_texts is None:
+        session_data['progress'] = {"step": "translation", "percent": 60, "message": "Переклад..."}
+
+        def report_translation(done, total):
+            # Прогрес оновлюється після кожного батчу
             session_data['progress'] = {
-                "step": "translation", 
-                "percent": int(progress_percent), 
-                "message": f"Переклад {i+1}/{total_segments}"
+                "step": "translation",
+                "percent": int(60 + (30 * done / total)),
+                "message": f"Переклад {done}/{total}"
             }
+
+        translated_texts = translate_texts(
+            table.column("original"),
+            progress_callback=report_translation,
+            stats=dedup_info
+        )
+
+    table.set_column("translated", translated_texts)
+    return table, dedup_info
+
+def process_video_async(session_id):
+    """Асинхронна обробка відео"""
+    try:
+        session_data = processing_sessions[session_id]
+        config = session_data['config']
+        video_path = Path(session_data['video_path'])
+        sha256 = session_data['video_sha256']
+        
+        # Той самий вміст з тією ж конфігурацією вже оброблявся — оригінал і переклад беремо зі сховища
+        engine = config.get('translation_engine', 'helsinki')
+        external_fingerprint = None
+        if config['source_type'] == 'external':
+            external_fingerprint = get_fingerprint_service().fingerprint(config['external_subtitle_path'])
+        key = job_key(
+            config,
+            Melchior.engine_revision(engine, config.get('source_language', 'ru'), config.get('target_language', 'uk')),
+            external_fingerprint
+        )
+        job = upload_store.load_job(sha256, key) if config.get('use_translation_cache', True) else None
+        
+        if job is not None:
+            session_data['progress'] = {"step": "translation", "percent": 85, "message": "♻️ Переклад узято з попередньої обробки"}
+            table = SegmentTable.from_records(job['segments'], ("original", "translated"))
+            dedup_info = job.get('dedup', {})
+        else:
+            table, dedup_info = build_translation(session_data, video_path, config)
+            upload_store.save_job(sha256, key, {"segments": table.to_records(), "dedup": dedup_info})
         
         # Зберігаємо перекладені субтитри
         translation_data = {
             "meta": {
-                "video_name": video_path.name,
+                "video_name": session_data['video_name'],
                 "video_hash": get_file_hash(video_path),
+                # Сховище адресує відео за SHA-256, тож хеш відомий з моменту завантаження
+                "video_sha256": sha256,
                 "translation_config": config,
+                "dedup": dedup_info,
                 "created_at": datetime.now().isoformat()
             },
-            "segments": translated_segments
+            # Схема сегментів {start, end, original, translated} лишається для редактора
+            "segments": table.to_records()
         }
         
         translation_path = OUTPUT_FOLDER / f"{session_id}_translation.json"
@@ -389,56 +552,6 @@ def process_video_async(session_id):
         session_data['progress'] = {"step": "error", "percent": 0, "message": f"Помилка: {str(e)}"}
         session_data['status'] = 'error'
 
-def parse_srt(path):
-    """Парсинг SRT файлу"""
-    subs = []
-    with open(path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    pattern = re.compile(r'(\d+)\s+([\d:,]+)\s+-->\s+([\d:,]+)\s+([\s\S]*?)(?=\n\d+\n|\Z)', re.MULTILINE)
-    for match in pattern.finditer(content):
-        start = match.group(2).replace(',', '.')
-        end = match.group(3).replace(',', '.')
-        text = match.group(4).replace('\n', ' ').strip()
-        
-        def to_seconds(t):
-            h, m, s = t.split(':')
-            s, ms = s.split('.') if '.' in s else (s, '0')
-            return int(h)*3600 + int(m)*60 + int(s) + int(ms.ljust(3, '0')[:3])/1000
-        
-        subs.append({
-            'start': to_seconds(start),
-            'end': to_seconds(end),
-            'text': text
-        })
-    
-    return {'segments': subs}
-
-def parse_ass(path):
-    """Парсинг ASS файлу"""
-    subs = []
-    with open(path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.startswith('Dialogue:'):
-                parts = line.strip().split(',', 9)
-                if len(parts) >= 10:
-                    start = parts[1]
-                    end = parts[2]
-                    text = parts[9].replace('\\N', ' ').replace('\n', ' ').strip()
-                    
-                    def ass_time_to_seconds(t):
-                        h, m, s = t.split(':')
-                        s, cs = s.split('.') if '.' in s else (s, '0')
-                        return int(h)*3600 + int(m)*60 + int(s) + int(cs)/100
-                    
-                    subs.append({
-                        'start': ass_time_to_seconds(start),
-                        'end': ass_time_to_seconds(end),
-                        'text': text
-                    })
-    
-    return {'segments': subs}
-
 @app.route('/get_progress')
 def get_progress():
     """Отримання прогресу обробки"""
@@ -452,6 +565,59 @@ def get_progress():
         "progress": session_data.get('progress', {})
     })
 
+@app.route('/partial_segments')
+def partial_segments():
+    """Сегменти, вже готові під час транскрибації (?since=N — лише нові, починаючи з N-го)"""
+    session_id = session.get('session_id')
+    if not session_id or session_id not in processing_sessions:
+        return jsonify({"error": "Сесія не знайдена"})
+
+    segments = processing_sessions[session_id].get('partial_segments', [])
+    since = request.args.get('since', 0, type=int)
+    ready = segments[since:]
+    return jsonify({
+        "segments": [{"start": s["start"], "end": s["end"], "text": s["text"]} for s in ready],
+        "next": since + len(ready)
+    })
+
+@app.route('/model_stats')
+def model_stats():
+    """Статистика пулів моделей та пам'яті перекладів (hit/miss, час завантаження)"""
+    return jsonify({
+        "whisper": Balthasar.model_stats(),
+        "translation": translation_model_stats(),
+        "style_registry": get_style_registry().stats(),
+        "translation_memory": get_translation_memory().stats(),
+        "deepl_quota": deepl_quota_stats(),
+        "transcription_cache": get_transcription_cache().stats(),
+        "fingerprints": get_fingerprint_service().stats(),
+        "media_probe": get_media_probe().stats(),
+        "uploads": chunked_uploads.stats(),
+        "upload_store": upload_store.stats()
+    })
+
+@app.route('/transcription_cache')
+def transcription_cache_entries():
+    """Список записів кешу транскрипцій"""
+    cache = get_transcription_cache()
+    return jsonify({"entries": cache.list_entries(), "stats": cache.stats()})
+
+@app.route('/transcription_cache', methods=['DELETE'])
+def transcription_cache_invalidate():
+    """
+    Інвалідація кешу транскрипцій: ?key=..., фільтр за метаданими (?model_name=base)
+    або повне очищення лише з явним ?all=1
+    """
+    key = request.args.get('key')
+    clear_all = request.args.get('all') == '1'
+    meta_filter = {name: value for name, value in request.args.items() if name not in ('key', 'all')}
+    if key is not None and not is_valid_transcript_key(key):
+        return jsonify({"error": "Невалідний ключ кешу"}), 400
+    if key is None and not meta_filter and not clear_all:
+        return jsonify({"error": "Вкажіть key, фільтр за метаданими або all=1 для повного очищення"}), 400
+    removed = get_transcription_cache().invalidate(key, **meta_filter)
+    return jsonify({"removed": removed})
+
 @app.route('/edit_translation')
 def edit_translation():
     """Перехід до редактора перекладу"""
@@ -489,36 +655,72 @@ def generate_final_subtitles_async(session_id):
         session_data = processing_sessions[session_id]
         config = session_data['config']
         
-        session_data['progress'] = {"step": "ass_generation", "percent": 95, "message": "Генерація ASS..."}
+        # Усі формати пишуться за один прохід, тож /download_subtitles нічого не перераховує
+        formats = [fmt for fmt in config.get('subtitle_formats', SUBTITLE_OUTPUT_FORMATS) if fmt in SUBTITLE_OUTPUT_FORMATS]
+        if 'ass' not in formats:
+            formats.insert(0, 'ass')
+        
+        session_data['progress'] = {"step": "ass_generation", "percent": 95, "message": f"Генерація {', '.join(formats).upper()}..."}
         
         # Завантажуємо перекладені субтитри
         translation_path = session_data['translation_path']
         with open(translation_path, 'r', encoding='utf-8') as f:
             translation_data = json.load(f)
         
-        # Підготовляємо дані для ASS генератора
-        subs = []
-        for segment in translation_data['segments']:
-            subs.append({
-                "start": segment["start"],
-                "end": segment["end"],
-                "text": segment["translated"]
-            })
+        # Сегменти (можливо, відредаговані) одразу в колонки — без проміжного списку словників
+        table = SegmentTable.from_records(translation_data['segments'], ("original", "translated"))
         
-        # Генеруємо ASS файл
-        video_name = Path(session_data['video_path']).stem
+        # Генеруємо файли субтитрів
+        # Відео у сховищі спільне для сесій, тож імена вихідних файлів — за сесією та оригінальним ім'ям
+        video_name = Path(f"{session_id}_{session_data['video_name']}").stem
         output_path = OUTPUT_FOLDER / f"{video_name}.ass"
         
-        style_path = config.get('subtitle_style', 'magi_pipeline/ass_generator_module/styles/Dialogue.ass')
+        # Інтерфейс передає назву шаблону ("Dialogue"); реєстр приймає і назву, і шлях
+        style_path = config.get('subtitle_style', 'Dialogue')
         
-        Caspar.generate_subtitles(
-            subs=subs,
+        final_paths = Caspar.generate_subtitles(
+            subs=table,
             output_path=str(output_path),
-            style_path=style_path
+            style_path=style_path,
+            text_column="translated",
+            formats=formats
         )
         
-        session_data['final_ass_path'] = str(output_path)
+        session_data['final_subtitle_paths'] = final_paths
+        session_data['final_ass_path'] = final_paths['ass']
+        # Результати попередньої генерації (архів, MKV зі старою доріжкою) більше не актуальні
+        session_data.pop('final_zip_path', None)
+        session_data.pop('final_video_path', None)
+        session_data.pop('mux_error', None)
+        
+        # Необов'язковий крок: MKV з українською доріжкою, потоки копіюються без перекодування
+        if config.get('mux_video'):
+            def report_mux(fraction, info):
+                session_data['progress'] = {
+                    "step": "muxing",
+                    "percent": int(96 + 3 * fraction),
+                    "message": f"Вбудовування субтитрів у MKV: {fraction:.0%}"
+                }
+            
+            report_mux(0.0, {})
+            try:
+                session_data['final_video_path'] = mux_soft_subtitles(
+                    session_data['video_path'],
+                    final_paths['ass'],
+                    OUTPUT_FOLDER / f"{video_name}.ukr.mkv",
+                    progress_callback=report_mux
+                )
+            except Exception as e:
+                # Субтитри вже записані — помилка MKV не скасовує результат
+                print(f"⚠️ Не вдалося створити MKV: {e}")
+                session_data['mux_error'] = str(e)
+        
         session_data['progress'] = {"step": "complete", "percent": 100, "message": "Готово!"}
+        if 'mux_error' in session_data:
+            session_data['progress'].update({
+                "message": f"Готово! ⚠️ Субтитри створено, але MKV — ні: {session_data['mux_error']}",
+                "mux_error": session_data['mux_error']
+            })
         session_data['status'] = 'complete'
         
     except Exception as e:
@@ -527,7 +729,7 @@ def generate_final_subtitles_async(session_id):
 
 @app.route('/download_subtitles')
 def download_subtitles():
-    """Завантаження готових субтитрів"""
+    """Завантаження готових субтитрів: ?format=ass|srt|vtt, zip з усіма форматами або mkv (відео з доріжкою)"""
     session_id = session.get('session_id')
     if not session_id or session_id not in processing_sessions:
         return "Сесія не знайдена", 404
@@ -536,7 +738,31 @@ def download_subtitles():
     if 'final_ass_path' not in session_data:
         return "Файл не готовий", 404
     
-    return send_file(session_data['final_ass_path'], as_attachment=True)
+    paths = session_data.get('final_subtitle_paths', {"ass": session_data['final_ass_path']})
+    fmt = request.args.get('format', 'ass').lower()
+    
+    if fmt == 'mkv':
+        if 'mux_error' in session_data:
+            return f"MKV не створено: {session_data['mux_error']}", 500
+        if 'final_video_path' not in session_data:
+            return "MKV не створювався (увімкніть вбудовування субтитрів у налаштуваннях)", 404
+        return send_file(session_data['final_video_path'], as_attachment=True)
+    
+    if fmt == 'zip':
+        # Архів збирається з уже записаних файлів один раз на генерацію
+        zip_path = session_data.get('final_zip_path')
+        if not zip_path or not os.path.exists(zip_path):
+            zip_path = str(Path(paths['ass']).with_suffix('.zip'))
+            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                for path in paths.values():
+                    archive.write(path, arcname=Path(path).name)
+            session_data['final_zip_path'] = zip_path
+        return send_file(zip_path, as_attachment=True)
+    
+    if fmt not in paths:
+        return f"Формат {fmt} не згенеровано. Доступні: {', '.join(list(paths) + ['zip'])}", 404
+    
+    return send_file(paths[fmt], as_attachment=True)
 
 if __name__ == '__main__':
     print("🚀 Запуск MakeMyAnimeUA - Головний пайплайн")
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Мікробенчмарк запису ASS: старий generate_ass (шість regex-проходів на репліку
+без попередньої компіляції, увесь файл у списку рядків і join) проти
+потокового ass_builder.generate_ass (нормалізація за один прохід, буферизований
+запис рядок за рядком).
+
+Міряються час на репліку, пікова пам'ять (tracemalloc, окремий прогін)
+і перевіряється, що файли збігаються байт у байт.
+
+Запуск:
+    python scripts/benchmark_ass_writer.py --cues 1000000
+"""
+
+import argparse
+import gc
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from magi_pipeline.ass_generator_module.ass_builder import format_timestamp, generate_ass
+from magi_pipeline.utils.segment_table import SegmentTable
+
+STYLE_PATH = "magi_pipeline/ass_generator_module/styles/Dialogue.ass"
+
+TEXTS = [
+    "Привіт, як справи?",
+    "Я не знаю,  що сказати...",
+    "Ми маємо йти.\nНегайно!",
+    "{\\i1} Це {\\i0} неважливо.",
+    "  Що?  ",
+]
+
+
+def legacy_generate_ass(subs, output_path, style_path):
+    """generate_ass до потокового запису (з normalize_spaces + final_cleanup_spaces)."""
+    def normalize_spaces(text):
+        if not text:
+            return text
+        text = re.sub(r'\s+', ' ', text)
+        text = text.strip()
+        text = re.sub(r'(\{.*?\})\s+', r'\1', text)
+        return text
+
+    def final_cleanup_spaces(text):
+        if not text:
+            return text
+        text = re.sub(r'\s+', ' ', text)
+        text = text.strip()
+        text = re.sub(r'(\{.*?\})\s+', r'\1', text)
+        text = re.sub(r'\s+(\{.*?\})', r'\1', text)
+        return text
+
+    with open(style_path, "r", encoding="utf-8") as f:
+        header = f.read()
+    style_map = {"op": "OP", "ed": "ED", "default": "Default"}
+    lines = [header]
+    for segment in subs:
+        start = format_timestamp(segment["start"])
+        end = format_timestamp(segment["end"])
+        text = segment["text"].replace("\n", " ").replace(",", "，")
+        text = normalize_spaces(text)
+        text = final_cleanup_spaces(text)
+        style = style_map["default"]
+        if segment["start"] < 60:
+            style = style_map["op"]
+        elif segment["end"] > subs[-1]["end"] * 0.9:
+            style = style_map["ed"]
+        lines.append(f"Dialogue: 0,{start},{end},{style},,0,0,0,,{text}")
+    with open(output_path, "w", encoding="utf-8-sig") as f:
+        f.write("\n".join(lines))
+
+
+def measure(fn, with_memory):
+    gc.collect()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    peak = None
+    if with_memory:
+        # Окремий прогін: tracemalloc сильно сповільнює виконання
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запису ASS (старий проти потокового)")
+    parser.add_argument("--cues", type=int, default=1_000_000)
+    parser.add_argument("--no-memory", action="store_true", help="Не міряти пам'ять (швидше)")
+    args = parser.parse_args()
+
+    subs = [{"start": i * 2.37, "end": i * 2.37 + 1.9, "text": TEXTS[i % len(TEXTS)]} for i in range(args.cues)]
+    table = SegmentTable.from_segments(subs)
+    print(f"📄 Реплік: {args.cues}\n")
+    print(f"{'Запис':<12}{'Час, с':>9}{'мкс/репліку':>14}{'Пік, МБ':>10}")
+    print("-" * 45)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        outputs = {}
+        runs = (
+            ("legacy", lambda path: legacy_generate_ass(subs, path, STYLE_PATH)),
+            ("streaming", lambda path: generate_ass(subs, path, STYLE_PATH)),
+            ("table", lambda path: generate_ass(table, path, STYLE_PATH)),
+        )
+        for name, fn in runs:
+            path = os.path.join(tmp, f"{name}.ass")
+            elapsed, peak = measure(lambda: fn(path), not args.no_memory)
+            outputs[name] = digest(path)
+            memory = f"{peak / 1024 / 1024:>10.1f}" if peak is not None else f"{'-':>10}"
+            print(f"{name:<12}{elapsed:>9.2f}{elapsed / args.cues * 1e6:>14.2f}{memory}")
+
+    identical = outputs["legacy"] == outputs["streaming"]
+    print(f"\n{'✅' if identical else '❌'} Вихід streaming {'збігається' if identical else 'НЕ збігається'} "
+          f"з legacy байт у байт")
+    # Таблиця зберігає час у мілісекундах: при дробових мс можлива різниця в сотих
+    print(f"ℹ️  table {'збігається' if outputs['table'] == outputs['legacy'] else 'відрізняється (округлення до мс)'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк SegmentTable проти списку словників (за замовчуванням 100k сегментів).
+
+Відтворюється шлях даних web-пайплайну від результату транскрибації до ASS:
+- dicts — translated_segments (копія з original/translated), далі subs для генератора;
+- table — SegmentTable.from_segments + set_column, колонки віддаються без копій.
+
+Міряються час побудови, пікова та утримана пам'ять (tracemalloc, окремий прогін),
+пошук сегментів за часом (лінійний прохід проти bisect) і серіалізація в JSON.
+
+Запуск:
+    python scripts/benchmark_segment_table.py --segments 100000
+"""
+
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from magi_pipeline.utils.segment_table import SegmentTable
+
+TEXTS = [
+    "Привет, как дела?",
+    "Я не знаю, что сказать...",
+    "Мы должны идти. Сейчас же!",
+    "Это не важно.",
+    "Что?",
+]
+
+
+def make_result(count: int):
+    # Схожі на Whisper: час з точністю до мс, репліки часто повторюються
+    segments = []
+    for i in range(count):
+        start = round(i * 2.5, 3)
+        text = TEXTS[i % len(TEXTS)] if i % 3 else f"{TEXTS[i % len(TEXTS)]} #{i}"
+        segments.append({"start": start, "end": round(start + 2.0, 3), "text": text})
+    return {"segments": segments}
+
+
+def build_dicts(result, translations):
+    # Як у process_video_async до SegmentTable: дві повні копії сегментів
+    translated_segments = [
+        {"start": s["start"], "end": s["end"], "original": s["text"], "translated": t}
+        for s, t in zip(result["segments"], translations)
+    ]
+    subs = [{"start": s["start"], "end": s["end"], "text": s["translated"]} for s in translated_segments]
+    return translated_segments, subs
+
+
+def build_table(result, translations):
+    table = SegmentTable.from_segments(result["segments"], {"original": "text"})
+    table.set_column("translated", translations)
+    return table
+
+
+def measure(fn):
+    # Час і пам'ять — окремими прогонами: tracemalloc сильно сповільнює виконання
+    gc.collect()
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    tracemalloc.start()
+    kept = fn()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed, peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк SegmentTable проти списку словників")
+    parser.add_argument("--segments", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000, help="Кількість пошуків за часом")
+    args = parser.parse_args()
+
+    result = make_result(args.segments)
+    # Переклади — нові рядки (як з моделі), а не ті самі об'єкти
+    translations = ["".join(reversed(s["text"])) for s in result["segments"]]
+
+    print(f"📄 Сегментів: {args.segments}\n")
+    print(f"{'Шлях':<8}{'Побудова, с':>13}{'Пік, МБ':>10}{'Утримано, МБ':>14}")
+    print("-" * 45)
+    for name, fn in (("dicts", lambda: build_dicts(result, translations)),
+                     ("table", lambda: build_table(result, translations))):
+        elapsed, peak, retained = measure(fn)
+        print(f"{name:<8}{elapsed:>13.3f}{peak / 1024 / 1024:>10.1f}{retained / 1024 / 1024:>14.1f}")
+
+    translated_segments, _ = build_dicts(result, translations)
+    table = build_table(result, translations)
+    duration = args.segments * 2.5
+    points = [random.uniform(0, duration) for _ in range(args.queries)]
+
+    started = time.perf_counter()
+    linear = [[i for i, s in enumerate(translated_segments) if s["start"] <= t <= s["end"]] for t in points]
+    linear_time = time.perf_counter() - started
+    started = time.perf_counter()
+    indexed = [table.find(t) for t in points]
+    bisect_time = time.perf_counter() - started
+    assert linear == indexed, "Пошук у таблиці розходиться з лінійним"
+
+    print(f"\n🔎 Пошук за часом ({args.queries} запитів): лінійно {linear_time:.3f} с, "
+          f"bisect {bisect_time * 1000:.2f} мс")
+
+    started = time.perf_counter()
+    records_json = json.dumps(translated_segments, ensure_ascii=False)
+    records_time = time.perf_counter() - started
+    started = time.perf_counter()
+    table_json = json.dumps(table.to_dict(), ensure_ascii=False, separators=(",", ":"))
+    table_time = time.perf_counter() - started
+    started = time.perf_counter()
+    SegmentTable.from_dict(json.loads(table_json))
+    load_time = time.perf_counter() - started
+
+    print(f"💾 JSON: записи {records_time:.3f} с / {len(records_json) / 1024 / 1024:.1f} МБ, "
+          f"колонки {table_time:.3f} с / {len(table_json) / 1024 / 1024:.1f} МБ "
+          f"(читання {load_time:.3f} с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк потокового парсера субтитрів на великих файлах (за замовчуванням 100k реплік).
+
+Для кожного формату генерується тимчасовий файл і порівнюються:
+- subtitle_parser.iter_cues — один лінійний прохід, генератор;
+- старий підхід — читання всього файлу в пам'ять і regex з відкочуванням (SRT)
+  або splitlines (VTT) / рядкова обробка (ASS) з накопиченням списку.
+
+Міряються час, репліки/с, пікова пам'ять (tracemalloc) і час до першої репліки.
+
+Запуск:
+    python scripts/benchmark_subtitle_parser.py --cues 100000
+"""
+
+import argparse
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from magi_pipeline.utils.subtitle_parser import iter_cues, seconds_to_ass_time
+
+TEXTS = [
+    "Привет, как дела?",
+    "<i>Я не знаю, что сказать...</i>",
+    "Мы должны идти.\nСейчас же!",
+    "{\\i1}Это{\\i0} не важно.",
+]
+
+
+def srt_time(seconds):
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+
+def generate(path: Path, fmt: str, cues: int):
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "vtt":
+            f.write("WEBVTT\n\n")
+        if fmt == "ass":
+            f.write("[Script Info]\nScriptType: v4.00+\n\n[Events]\n"
+                    "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+        for i in range(cues):
+            start, end = i * 2.5, i * 2.5 + 2.0
+            text = TEXTS[i % len(TEXTS)]
+            if fmt == "srt":
+                f.write(f"{i + 1}\n{srt_time(start)} --> {srt_time(end)}\n{text}\n\n")
+            elif fmt == "vtt":
+                f.write(f"{srt_time(start).replace(',', '.')} --> {srt_time(end).replace(',', '.')}\n{text}\n\n")
+            else:
+                f.write(f"Dialogue: 0,{seconds_to_ass_time(start)},{seconds_to_ass_time(end)},Default,,0,0,0,,"
+                        f"{text.replace(chr(10), chr(92) + 'N')}\n")
+
+
+def legacy_parse(path: Path, fmt: str):
+    """Старі парсери з main_pipeline_web.py / vtt_parser.py: весь файл у пам'ять, список на виході."""
+    def to_seconds(t):
+        h, m, s = t.replace(",", ".").split(":")
+        s, frac = s.split(".") if "." in s else (s, "0")
+        return int(h) * 3600 + int(m) * 60 + int(s) + int(frac) / 10 ** len(frac)
+
+    subs = []
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    if fmt == "srt":
+        pattern = re.compile(r'(\d+)\s+([\d:,]+)\s+-->\s+([\d:,]+)\s+([\s\S]*?)(?=\n\d+\n|\Z)', re.MULTILINE)
+        for match in pattern.finditer(content):
+            subs.append({"start": to_seconds(match.group(2)), "end": to_seconds(match.group(3)),
+                         "text": match.group(4).replace("\n", " ").strip()})
+    elif fmt == "vtt":
+        lines = content.splitlines()
+        i = 1
+        while i < len(lines):
+            if "-->" in lines[i]:
+                start, end = lines[i].split(" --> ")
+                i += 1
+                text_lines = []
+                while i < len(lines) and lines[i].strip():
+                    text_lines.append(lines[i].strip())
+                    i += 1
+                subs.append({"start": to_seconds(start), "end": to_seconds(end),
+                             "text": re.sub(r"<[^>]+>", "", " ".join(text_lines))})
+            i += 1
+    else:
+        for line in content.split("\n"):
+            if line.startswith("Dialogue:"):
+                parts = line.strip().split(",", 9)
+                subs.append({"start": to_seconds(parts[1]), "end": to_seconds(parts[2]),
+                             "text": parts[9].replace("\\N", " ")})
+    return subs
+
+
+def measure(fn):
+    # Час і пам'ять міряються окремими прогонами: tracemalloc сильно сповільнює виконання
+    started = time.perf_counter()
+    first, count = fn()
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, first - started if first else None, peak, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк потокового парсера субтитрів")
+    parser.add_argument("--cues", type=int, default=100_000)
+    parser.add_argument("--formats", nargs="+", default=["srt", "vtt", "ass"])
+    args = parser.parse_args()
+
+    print(f"{'Формат':<8}{'Парсер':<12}{'Час, с':>9}{'Реплік/с':>12}{'Перша, мс':>11}{'Пік, МБ':>10}{'Реплік':>9}")
+    print("-" * 71)
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in args.formats:
+            path = Path(tmp) / f"bench.{fmt}"
+            generate(path, fmt, args.cues)
+
+            def streaming():
+                first, count = None, 0
+                for _ in iter_cues(path):
+                    if first is None:
+                        first = time.perf_counter()
+                    count += 1
+                return first, count
+
+            def legacy():
+                subs = legacy_parse(path, fmt)
+                return time.perf_counter(), len(subs)
+
+            for name, fn in (("streaming", streaming), ("legacy", legacy)):
+                elapsed, first, peak, count = measure(fn)
+                print(f"{fmt:<8}{name:<12}{elapsed:>9.2f}{count / elapsed:>12.0f}{first * 1000:>11.1f}"
+                      f"{peak / 1024 / 1024:>10.1f}{count:>9}")
+
+
+if __name__ == "__main__":
+    main()
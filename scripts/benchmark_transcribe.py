@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк транскрибації на CPU: один виклик model.transcribe проти
+паралельної транскрибації шматками між паузами.
+
+Запуск:
+    python scripts/benchmark_transcribe.py input/episode.mkv --model base --workers 4 --threads 2
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from magi_pipeline.utils.balthasar import Balthasar, SAMPLE_RATE
+from magi_pipeline.utils.vad import split_on_silence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк транскрибації на CPU")
+    parser.add_argument("media", help="Відео або аудіо файл")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--language", default="ru")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=2, help="Потоки torch на процес")
+    parser.add_argument("--seconds", type=float, default=None, help="Обрізати аудіо до N секунд")
+    args = parser.parse_args()
+
+    print("🎙️  Декодування аудіо...")
+    audio = Balthasar.decode_audio(args.media)
+    if args.seconds:
+        audio = audio[:int(args.seconds * SAMPLE_RATE)]
+    duration = len(audio) / SAMPLE_RATE
+    chunks = split_on_silence(audio)
+    print(f"⏱️  Тривалість: {duration:.1f} с, шматків: {len(chunks)}")
+
+    print("🧠 Один виклик model.transcribe...")
+    started = time.perf_counter()
+    single = Balthasar.transcribe(audio, model_name=args.model, language=args.language, device="cpu",
+                                  use_cache=False)
+    single_time = time.perf_counter() - started
+
+    print("🧩 Паралельна транскрибація (перший прогін включає завантаження моделей у процеси)...")
+    Balthasar.transcribe_parallel(audio[:SAMPLE_RATE], model_name=args.model, language=args.language,
+                                  workers=args.workers, threads_per_worker=args.threads, use_cache=False)
+    started = time.perf_counter()
+    parallel = Balthasar.transcribe_parallel(audio, model_name=args.model, language=args.language,
+                                             workers=args.workers, threads_per_worker=args.threads, use_cache=False)
+    parallel_time = time.perf_counter() - started
+
+    print("\n" + "=" * 50)
+    print(f"{'Режим':<14}{'Час, с':>10}{'Аудіо-с/с':>12}{'Сегментів':>12}")
+    print(f"{'single':<14}{single_time:>10.1f}{duration / single_time:>12.2f}{len(single['segments']):>12}")
+    print(f"{'parallel':<14}{parallel_time:>10.1f}{duration / parallel_time:>12.2f}{len(parallel['segments']):>12}")
+    print(f"🚀 Прискорення: x{single_time / parallel_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк перекладу Helsinki-NLP на CPU: звичайний движок "helsinki"
+(fp32, налаштування пошуку моделі) проти "helsinki-fast" (int8, KV-кеш,
+жадібне декодування або задана кількість променів). Пам'ять перекладів
+не використовується — міряється лише модель.
+
+Вхід — .txt (рядок на репліку) або JSON у форматі subs_source.json.
+
+Запуск:
+    python scripts/benchmark_translate.py output/subs_source.json --lines 500 --beams 1 4
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from magi_pipeline.translate.translate import MARIAN_POOL, translate_batch
+
+
+def load_lines(path: Path):
+    if path.suffix == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            return [segment["text"] for segment in json.load(f)["segments"]]
+    return [line.strip() for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def measure(lines, source_lang, target_lang, quantized, num_beams):
+    # Прогрів: завантаження моделі в пул не входить у вимір
+    translate_batch(lines[:4], source_lang, target_lang, quantized=quantized, num_beams=num_beams)
+    started = time.perf_counter()
+    outputs = translate_batch(lines, source_lang, target_lang, quantized=quantized, num_beams=num_beams)
+    return time.perf_counter() - started, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк helsinki проти helsinki-fast (рядків/с)")
+    parser.add_argument("input", help="Файл з репліками (.txt або subs_source.json)")
+    parser.add_argument("--source", default="ru")
+    parser.add_argument("--target", default="uk")
+    parser.add_argument("--lines", type=int, default=None, help="Взяти перші N реплік")
+    parser.add_argument("--beams", type=int, nargs="+", default=[1], help="Варіанти num_beams для helsinki-fast")
+    parser.add_argument("--threads", type=int, default=None, help="Потоки torch")
+    args = parser.parse_args()
+
+    import torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if torch.cuda.is_available():
+        print("⚠️  Доступна CUDA: звичайний движок працюватиме на GPU, а helsinki-fast — на CPU")
+
+    lines = load_lines(Path(args.input))[:args.lines]
+    print(f"📄 Реплік: {len(lines)}")
+
+    print("🐢 helsinki (fp32)...")
+    base_time, base_outputs = measure(lines, args.source, args.target, quantized=False, num_beams=None)
+    rows = [("helsinki", "model", base_time, 1.0)]
+
+    for beams in args.beams:
+        print(f"🚀 helsinki-fast (int8, beams={beams})...")
+        fast_time, fast_outputs = measure(lines, args.source, args.target, quantized=True, num_beams=beams)
+        same = sum(a == b for a, b in zip(base_outputs, fast_outputs)) / max(len(lines), 1)
+        rows.append(("helsinki-fast", str(beams), fast_time, same))
+
+    print("\n" + f"{'Движок':<16}{'Beams':>7}{'Час, с':>9}{'Рядків/с':>10}{'Прискор.':>10}{'Збіг з fp32':>13}")
+    print("-" * 65)
+    for engine, beams, elapsed, same in rows:
+        print(f"{engine:<16}{beams:>7}{elapsed:>9.2f}{len(lines) / elapsed:>10.1f}"
+              f"{base_time / elapsed:>10.2f}{same:>12.0%}")
+    print(f"\n📦 Моделі в пулі: {[(m['key'], round(m['size_bytes'] / 1024 / 1024)) for m in MARIAN_POOL.stats()['models']]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк int8-квантизованого Whisper на CPU: швидкість і точність (WER)
+порівняно з fp32 для кожного розміру моделі.
+
+Еталон — текстовий файл з правильною транскрипцією (--reference). Без нього
+WER рахується відносно результату fp32, тобто показує лише розбіжність,
+яку вносить квантизація.
+
+Запуск:
+    python scripts/benchmark_whisper_int8.py samples/ep01_2min.wav --reference samples/ep01_2min.txt \
+        --models tiny base small --language ru --report reports/whisper_int8.md
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from whisper.normalizers import BasicTextNormalizer
+
+from magi_pipeline.utils.balthasar import Balthasar, SAMPLE_RATE, WHISPER_POOL
+
+normalize = BasicTextNormalizer()
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """WER = (заміни + вставки + видалення) / кількість слів еталону."""
+    ref = normalize(reference).split()
+    hyp = normalize(hypothesis).split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (ref_word != hyp_word))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def run(audio, model_name, language, precision):
+    """Завантаження (через пул) і транскрибація без кешу; повертає метрики та текст."""
+    started = time.perf_counter()
+    # Секунда аудіо — завантаження моделі в пул не входить у час транскрибації
+    Balthasar.transcribe(audio[:SAMPLE_RATE], model_name=model_name, language=language,
+                         device="cpu", precision=precision, use_cache=False)
+    load_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = Balthasar.transcribe(audio, model_name=model_name, language=language,
+                                  device="cpu", precision=precision, use_cache=False)
+    elapsed = time.perf_counter() - started
+
+    size = next(m["size_bytes"] for m in WHISPER_POOL.stats()["models"]
+                if m["key"] == [model_name, "cpu", precision])
+    return {
+        "model": model_name,
+        "precision": precision,
+        "load_s": round(load_time, 2),
+        "transcribe_s": round(elapsed, 2),
+        "throughput": round(len(audio) / SAMPLE_RATE / elapsed, 2),
+        "size_mb": round(size / 1024 / 1024, 1),
+    }, result["text"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк int8 Whisper на CPU (швидкість і WER)")
+    parser.add_argument("media", help="Відео або аудіо файл (фіксований локальний семпл)")
+    parser.add_argument("--reference", help="Файл з еталонною транскрипцією")
+    parser.add_argument("--models", nargs="+", default=["tiny", "base", "small"])
+    parser.add_argument("--language", default="ru")
+    parser.add_argument("--seconds", type=float, default=None, help="Обрізати аудіо до N секунд")
+    parser.add_argument("--threads", type=int, default=None, help="Потоки torch")
+    parser.add_argument("--report", help="Куди зберегти звіт (.md або .json)")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    audio = Balthasar.decode_audio(args.media)
+    if args.seconds:
+        audio = audio[:int(args.seconds * SAMPLE_RATE)]
+    duration = len(audio) / SAMPLE_RATE
+    reference = Path(args.reference).read_text(encoding="utf-8") if args.reference else None
+    print(f"⏱️  Тривалість семплу: {duration:.1f} с, еталон: {'файл' if reference else 'вихід fp32'}")
+
+    rows = []
+    for model_name in args.models:
+        print(f"🧠 {model_name}: fp32...")
+        fp32, fp32_text = run(audio, model_name, args.language, "fp32")
+        print(f"🗜️  {model_name}: int8...")
+        int8, int8_text = run(audio, model_name, args.language, "int8")
+
+        model_reference = reference if reference is not None else fp32_text
+        fp32["wer"] = round(word_error_rate(model_reference, fp32_text), 4)
+        int8["wer"] = round(word_error_rate(model_reference, int8_text), 4)
+        int8["speedup"] = round(fp32["transcribe_s"] / int8["transcribe_s"], 2)
+        fp32["speedup"] = 1.0
+        rows += [fp32, int8]
+        # Наступна модель не повинна змагатись за пам'ять з попередніми
+        WHISPER_POOL.clear()
+
+    header = f"{'Модель':<10}{'Точність':<10}{'Час, с':>9}{'Аудіо-с/с':>11}{'Прискор.':>10}{'WER':>8}{'МБ':>9}"
+    print("\n" + header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['model']:<10}{row['precision']:<10}{row['transcribe_s']:>9.1f}{row['throughput']:>11.2f}"
+              f"{row['speedup']:>10.2f}{row['wer']:>8.3f}{row['size_mb']:>9.1f}")
+
+    if args.report:
+        report_path = Path(args.report)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"media": args.media, "duration_s": round(duration, 1), "language": args.language,
+                "reference": args.reference or "fp32"}
+        if report_path.suffix == ".json":
+            report_path.write_text(json.dumps({"meta": meta, "results": rows}, ensure_ascii=False, indent=2),
+                                   encoding="utf-8")
+        else:
+            lines = [
+                "# Whisper int8 vs fp32 (CPU)",
+                "",
+                f"Семпл: `{args.media}` ({duration:.1f} с), мова: {args.language}, "
+                f"еталон: {args.reference or 'вихід fp32'}",
+                "",
+                "| Модель | Точність | Час, с | Аудіо-с/с | Прискорення | WER | Розмір, МБ |",
+                "|---|---|---|---|---|---|---|",
+            ]
+            lines += [
+                f"| {r['model']} | {r['precision']} | {r['transcribe_s']} | {r['throughput']} | "
+                f"x{r['speedup']} | {r['wer']:.3f} | {r['size_mb']} |"
+                for r in rows
+            ]
+            report_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        print(f"📝 Звіт збережено: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Локальний стаб DeepL API для перевірки пакетного перекладу без витрати квоти.
+
+Імітує /v2/translate та /v2/usage. Переклад — вихідний текст з префіксом [UK].
+
+Запуск:
+    python scripts/deepl_stub_server.py --port 8089 --fail-429 3 --quota 100000
+    DEEPL_SERVER_URL=http://127.0.0.1:8089 python main_pipeline_web.py
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+state = {"requests": 0, "characters": 0, "fail_429": 0, "quota": 500000}
+state_lock = threading.Lock()
+
+
+class DeepLStubHandler(BaseHTTPRequestHandler):
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_params(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length).decode("utf-8") if length else ""
+        if "json" in self.headers.get("Content-Type", ""):
+            params = json.loads(raw or "{}")
+            return {k: v if isinstance(v, list) else [v] for k, v in params.items()}
+        return parse_qs(raw)
+
+    def do_GET(self):
+        if self.path.startswith("/v2/usage"):
+            return self._usage()
+        self._send_json(404, {"message": "Not found"})
+
+    def do_POST(self):
+        if self.path.startswith("/v2/usage"):
+            return self._usage()
+        if not self.path.startswith("/v2/translate"):
+            return self._send_json(404, {"message": "Not found"})
+
+        params = self._read_params()
+        texts = params.get("text", [])
+        chars = sum(len(t) for t in texts)
+        with state_lock:
+            state["requests"] += 1
+            if state["fail_429"] > 0:
+                state["fail_429"] -= 1
+                return self._send_json(429, {"message": "Too many requests"})
+            if state["characters"] + chars > state["quota"]:
+                return self._send_json(456, {"message": "Quota exceeded"})
+            state["characters"] += chars
+
+        source = (params.get("source_lang") or ["RU"])[0]
+        self._send_json(200, {"translations": [
+            {"detected_source_language": source, "text": f"[UK] {t}", "billed_characters": len(t)}
+            for t in texts
+        ]})
+
+    def _usage(self):
+        with state_lock:
+            self._send_json(200, {"character_count": state["characters"], "character_limit": state["quota"]})
+
+    def log_message(self, format, *args):
+        print(f"🧪 {self.command} {self.path} ({state['requests']} запитів, {state['characters']} символів)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Стаб DeepL API")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--fail-429", type=int, default=0, help="Скільки перших запитів відхилити з 429")
+    parser.add_argument("--quota", type=int, default=500000, help="Ліміт символів (далі — 456)")
+    args = parser.parse_args()
+
+    state["fail_429"] = args.fail_429
+    state["quota"] = args.quota
+
+    print(f"🚀 Стаб DeepL: http://127.0.0.1:{args.port}")
+    ThreadingHTTPServer(("127.0.0.1", args.port), DeepLStubHandler).serve_forever()
@@ -1,10 +1,13 @@
 import sys
-import subprocess
-import re
 from pathlib import Path
 import json
 from langdetect import detect
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from magi_pipeline.utils.subtitle_parser import preview_lines
+from magi_pipeline.utils.media_probe import probe_media
+from magi_pipeline.utils.demux import demux
+
 # === Налаштування ===
 input_dir = Path("input")
 video_file = None
@@ -17,27 +20,15 @@ if video_file is None:
     print("Не знайдено відеофайл у папці input/")
     sys.exit(1)
 
-# === Витягуємо список потоків через ffmpeg ===
-probe = subprocess.run([
-    "ffmpeg", "-i", str(video_file)
-], stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-
-subtitle_streams = []
-for line in probe.stderr.splitlines():
-    if "Subtitle:" in line:
-        m = re.search(r'Stream #0:(\d+)(\((\w+)\))?: Subtitle: (\w+)( \((.*?)\))?', line)
-        if m:
-            stream_id = m.group(1)
-            lang = m.group(3) or "unknown"
-            fmt = m.group(4)
-            title = m.group(6) or ""
-            subtitle_streams.append({
-                "id": stream_id,
-                "lang": lang,
-                "fmt": fmt,
-                "title": title,
-                "raw": line.strip()
-            })
+# === Список потоків субтитрів (один ffprobe) ===
+subtitle_streams = [{
+    "id": str(stream.index),
+    "lang": stream.language,
+    "fmt": stream.codec_name,
+    "ext": stream.extension,
+    "title": stream.title,
+    "raw": stream.describe()
+} for stream in probe_media(video_file).subtitle_streams]
 
 if not subtitle_streams:
     print("Не знайдено потоків сабів у відео!")
@@ -55,7 +46,7 @@ for s in subtitle_streams:
         chosen = s
         break
 for s in subtitle_streams:
-    if not chosen and s['fmt'].lower() in ('ass','ssa','srt'):
+    if not chosen and s['ext'] in ('ass','ssa','srt'):
         chosen = s
         break
 if not chosen:
@@ -64,40 +55,19 @@ if not chosen:
 print(f"\nВибрано потік #{chosen['id']} (lang={chosen['lang']} fmt={chosen['fmt']} title={chosen['title']})")
 
 # === Витягуємо саби ===
-output_path = input_dir / f"extracted_subs_{chosen['id']}.{chosen['fmt'].lower()}"
-subprocess.run([
-    "ffmpeg", "-y", "-i", str(video_file), "-map", f"0:{chosen['id']}", "-c", "copy", str(output_path)
-], check=True)
+manifest = demux(video_file, input_dir, prefix="extracted_", audio=False, subtitle_streams=[chosen['id']])
+if not manifest.subtitles:
+    print(f"Потік #{chosen['id']} ({chosen['fmt']}) не текстовий — витягти як текст неможливо")
+    sys.exit(1)
+output_path = Path(manifest.subtitles[0].path)
 print(f"Саби збережено у {output_path}")
 
 # === Preview та визначення мови ===
 def preview_and_lang(path, fmt):
-    lines = []
-    if fmt in ("ass", "ssa"):
-        with open(path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.startswith('Dialogue:'):
-                    parts = line.strip().split(',', 9)
-                    if len(parts) >= 10:
-                        text = parts[9].replace('\\N', ' ').replace('\n', ' ').strip()
-                        lines.append(text)
-                        if len(lines) >= 5:
-                            break
-    elif fmt == "srt":
-        with open(path, 'r', encoding='utf-8') as f:
-            block = []
-            for l in f:
-                if l.strip() == '':
-                    if block:
-                        lines.append(' '.join(block))
-                        block = []
-                        if len(lines) >= 5:
-                            break
-                elif not l.strip().isdigit() and '-->' not in l:
-                    block.append(l.strip())
-    else:
+    if fmt not in ("ass", "ssa", "srt", "subrip"):
         print("Preview не підтримується для цього формату.")
         return
+    lines = preview_lines(path, max_lines=5)
     print("\nПерші 5 реплік:")
     for i, t in enumerate(lines):
         print(f"  {i+1}. {t}")
@@ -115,4 +85,4 @@ def preview_and_lang(path, fmt):
         main_lang = "ru"
     print(f"🌍 Визначена мова сабів: {main_lang}")
 
-preview_and_lang(output_path, chosen['fmt'].lower()) 
\ No newline at end of file
+preview_and_lang(output_path, manifest.subtitles[0].format) 
\ No newline at end of file
@@ -1,81 +1,43 @@
 import os
 import sys
-import subprocess
 import json
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from magi_pipeline.translate.deepl_translate import deepl_translate
 from magi_pipeline.ass_generator_module.ass_builder import generate_ass
-import re
 from collections import Counter
-from magi_pipeline.utils.balthasar import Balthasar
+from magi_pipeline.utils.balthasar import Balthasar, SAMPLE_RATE
+from magi_pipeline.utils.transcription_stream import format_progress
 from magi_pipeline.utils.melchior import Melchior
 from magi_pipeline.utils.caspar import Caspar
+from magi_pipeline.utils.muxer import mux_soft_subtitles
 from magi_pipeline.utils.external_subs import find_external_subtitles, get_subtitle_preview
+from magi_pipeline.utils.subtitle_parser import SUBTITLE_FORMATS, load_segments, preview_lines
 try:
     from tqdm import tqdm
 except ImportError:
     tqdm = None
     print("⚠️  tqdm не встановлено. Прогрес-бар не буде показано.")
-import hashlib
+from magi_pipeline.utils.fingerprint import get_fingerprint_service
+from magi_pipeline.utils.media_probe import probe_media
+from magi_pipeline.utils.demux import demux
 
 def get_file_hash(path):
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        while True:
-            chunk = f.read(8192)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+    # Швидкий відбиток з постійного індексу: той самий файл не перечитується між запусками
+    return get_fingerprint_service().fingerprint(path)
 
 main_lang = 'ru'
 
-def parse_srt(path):
-    subs = []
-    with open(path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    pattern = re.compile(r'(\d+)\s+([\d:,]+)\s+-->\s+([\d:,]+)\s+([\s\S]*?)(?=\n\d+\n|\Z)', re.MULTILINE)
-    for match in pattern.finditer(content):
-        start = match.group(2).replace(',', '.')
-        end = match.group(3).replace(',', '.')
-        text = match.group(4).replace('\n', ' ')
-        def to_seconds(t):
-            h, m, s = t.split(':')
-            s, ms = s.split('.') if '.' in s else (s, '0')
-            return int(h)*3600 + int(m)*60 + int(s) + int(ms)/1000
-        subs.append({
-            'start': to_seconds(start),
-            'end': to_seconds(end),
-            'text': text
-        })
-    return {'segments': subs}
+# Пам'ять перекладів можна обійти: MAGI_TRANSLATION_CACHE=0
+use_translation_cache = os.environ.get("MAGI_TRANSLATION_CACHE", "1") != "0"
 
-def parse_ass(path):
-    subs = []
-    with open(path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.startswith('Dialogue:'):
-                parts = line.strip().split(',', 9)
-                if len(parts) >= 10:
-                    start = parts[1]
-                    end = parts[2]
-                    text = parts[9].replace('\\N', ' ').replace('\n', ' ')
-                    def ass_time_to_seconds(t):
-                        h, m, s = t.split(':')
-                        s, cs = s.split('.') if '.' in s else (s, '0')
-                        return int(h)*3600 + int(m)*60 + int(s) + int(cs)/100
-                    subs.append({
-                        'start': ass_time_to_seconds(start),
-                        'end': ass_time_to_seconds(end),
-                        'text': text
-                    })
-    return {'segments': subs}
+# Додаткові формати за той самий прохід: MAGI_SUBTITLE_FORMATS=ass,srt,vtt
+subtitle_formats = [fmt.strip().lower() for fmt in os.environ.get("MAGI_SUBTITLE_FORMATS", "ass").split(",") if fmt.strip()]
+if "ass" not in subtitle_formats:
+    subtitle_formats.insert(0, "ass")
 
-def clean_text(text):
-    text = re.sub(r'\{.*?\}', '', text)
-    text = re.sub(r'\s+', ' ', text)
-    return text.strip()
+# Вбудувати субтитри у MKV без перекодування: MAGI_MUX_MKV=1
+mux_mkv = os.environ.get("MAGI_MUX_MKV", "0") == "1"
 
 input_dir = Path("input")
 output_dir = Path("output")
@@ -142,99 +104,33 @@ if external_subs:
         print(f"✅ Вибрано зовнішні субтитри: {chosen_external['name']}")
         subs_file = chosen_external['path']
         
-        # Для зовнішніх субтитрів створюємо JSON з метаданими
-        if chosen_external['format'].lower() in ('srt', 'vtt', 'sub'):
-            # Для SRT та інших текстових форматів створюємо простий JSON
-            video_hash = get_file_hash(video_file)
-            sub_data = {
-                "meta": {
-                    "video_name": str(video_file),
-                    "video_hash": video_hash,
-                    "subtitle_file": str(subs_file),
-                    "subtitle_format": chosen_external['format'],
-                    "subtitle_language": chosen_external['language']
-                },
-                "dialogue": []
+        # Для зовнішніх субтитрів створюємо JSON з метаданими у форматі сегментів
+        if chosen_external['format'].lower() in SUBTITLE_FORMATS:
+            result = load_segments(subs_file)
+            result["meta"] = {
+                "video_name": str(video_file),
+                "video_hash": get_file_hash(video_file),
+                "subtitle_file": str(subs_file),
+                "subtitle_format": chosen_external['format'],
+                "subtitle_language": chosen_external['language']
             }
-            
-            # Читаємо весь текст субтитрів для подальшої обробки
-            try:
-                with open(subs_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            except UnicodeDecodeError:
-                # Спробуємо інші кодування
-                for encoding in ['cp1251', 'latin1', 'cp1252']:
-                    try:
-                        with open(subs_file, 'r', encoding=encoding) as f:
-                            content = f.read()
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                else:
-                    raise Exception("Не вдалося прочитати файл субтитрів")
-            
-                         # Парсимо різні формати субтитрів
-             if chosen_external['format'].lower() == 'srt':
-                 from magi_pipeline.utils.srt_parser import parse_srt
-                 sub_data = parse_srt(subs_file)
-                 sub_data["meta"] = {
-                     "video_name": str(video_file),
-                     "video_hash": video_hash,
-                     "subtitle_file": str(subs_file),
-                     "subtitle_format": "srt",
-                     "subtitle_language": chosen_external['language']
-                 }
-             elif chosen_external['format'].lower() == 'vtt':
-                 from magi_pipeline.utils.vtt_parser import parse_vtt
-                 sub_data = parse_vtt(subs_file)
-                 sub_data["meta"] = {
-                     "video_name": str(video_file),
-                     "video_hash": video_hash,
-                     "subtitle_file": str(subs_file),
-                     "subtitle_format": "vtt",
-                     "subtitle_language": chosen_external['language']
-                 }
-            
-            with open(output_dir / "subs_source.json", "w", encoding="utf-8") as f:
-                json.dump(sub_data, f, ensure_ascii=False, indent=2)
-                
-        elif chosen_external['format'].lower() in ('ass', 'ssa'):
-            # Для ASS файлів використовуємо існуючий парсер
-            result = parse_ass(subs_file)
-            video_hash = get_file_hash(video_file)
-            if isinstance(result, dict):
-                result["meta"] = {
-                    "video_name": str(video_file), 
-                    "video_hash": video_hash,
-                    "subtitle_file": str(subs_file),
-                    "subtitle_format": chosen_external['format'],
-                    "subtitle_language": chosen_external['language']
-                }
             with open(output_dir / "subs_source.json", "w", encoding="utf-8") as f:
                 json.dump(result, f, ensure_ascii=False, indent=2)
+        else:
+            print(f"⚠️  Формат {chosen_external['format']} не підтримується, шукаємо субтитри у відео")
+            subs_file = None
 
 if subs_file is None:
     # Якщо зовнішні субтитри не використовуються, шукаємо всередині відео
     print("🔍 Пошук субтитрів всередині відеофайлу...")
-    probe = subprocess.run([
-        "ffmpeg", "-i", str(video_file)
-    ], stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-    subtitle_streams = []
-    for line in probe.stderr.splitlines():
-        if "Subtitle:" in line:
-            m = re.search(r'Stream #0:(\d+)(\((\w+)\))?: Subtitle: (\w+)( \((.*?)\))?', line)
-            if m:
-                stream_id = m.group(1)
-                lang = m.group(3) or "unknown"
-                fmt = m.group(4)
-                title = m.group(6) or ""
-                subtitle_streams.append({
-                    "id": stream_id,
-                    "lang": lang,
-                    "fmt": fmt,
-                    "title": title,
-                    "raw": line.strip()
-                })
+    subtitle_streams = [{
+        "id": str(stream.index),
+        "lang": stream.language,
+        "fmt": stream.codec_name,
+        "ext": stream.extension,
+        "title": stream.title,
+        "raw": stream.describe()
+    } for stream in probe_media(video_file).subtitle_streams]
     if not subtitle_streams:
         print("⚠️  Не знайдено потік сабів у відео!")
         print("🔄 Переходимо до транскрибації аудіо...")
@@ -251,63 +147,24 @@ else:
             chosen_idx = None
     chosen = subtitle_streams[chosen_idx]
     print(f"\nВибрано потік #{chosen['id']} (lang={chosen['lang']} fmt={chosen['fmt']} title={chosen['title']})")
-    extracted_path = input_dir / f"extracted_subs_{chosen['id']}.{chosen['fmt'].lower()}"
-    subprocess.run([
-        "ffmpeg", "-y", "-i", str(video_file), "-map", f"0:{chosen['id']}", "-c", "copy", str(extracted_path)
-    ], check=True)
+    manifest = demux(video_file, input_dir, prefix="extracted_", audio=False, subtitle_streams=[chosen['id']])
+    if not manifest.subtitles:
+        print(f"❌ Потік #{chosen['id']} ({chosen['fmt']}) не текстовий — його не можна перекласти")
+        sys.exit(1)
+    extracted_path = Path(manifest.subtitles[0].path)
     print(f"Саби збережено у {extracted_path}")
     subs_file = extracted_path
-    def clean_text(text):
-        return re.sub(r'\{.*?\}', '', text).strip()
-    lines = []
-    if chosen['fmt'].lower() in ("ass", "ssa"):
-        with open(extracted_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.startswith('Dialogue:'):
-                    parts = line.strip().split(',', 9)
-                    if len(parts) >= 10:
-                        text = parts[9].replace('\\N', ' ').replace('\n', ' ')
-                        text = clean_text(text)
-                        if len(text) > 10:
-                            lines.append(text)
-                        if len(lines) >= 20:
-                            break
-        result = parse_ass(extracted_path)
-        video_hash = get_file_hash(video_file)
-        if isinstance(result, dict):
-            result["meta"] = {"video_name": str(video_file), "video_hash": video_hash}
-        with open(output_dir / "subs_source.json", "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-    elif chosen['fmt'].lower() == "srt":
-        with open(extracted_path, 'r', encoding='utf-8') as f:
-            block = []
-            for l in f:
-                if l.strip() == '':
-                    if block:
-                        text = ' '.join(block)
-                        text = clean_text(text)
-                        if len(text) > 10:
-                            lines.append(text)
-                        block = []
-                        if len(lines) >= 20:
-                            break
-                elif not l.strip().isdigit() and '-->' not in l:
-                    block.append(l.strip())
-        result = parse_srt(extracted_path)
-        video_hash = get_file_hash(video_file)
-        if isinstance(result, dict):
-            result["meta"] = {"video_name": str(video_file), "video_hash": video_hash}
-        with open(output_dir / "subs_source.json", "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+    # Превʼю для визначення мови: перші 20 змістовних реплік, файл читається лише до них
+    lines = preview_lines(extracted_path, max_lines=20, min_length=11)
+    result = load_segments(extracted_path)
+    result["meta"] = {"video_name": str(video_file), "video_hash": get_file_hash(video_file)}
+    with open(output_dir / "subs_source.json", "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
     print("\nПерші 5 реплік:")
     for i, t in enumerate(lines[:5]):
         print(f"  {i+1}. {t}")
     main_lang = 'ru'
 
-print("🎙️  Extracting audio...")
-audio_path = audio_dir / "extracted.wav"
-Balthasar.extract_audio(video_file, audio_path)
-
 source_path = output_dir / "subs_source.json"
 transcript_path = output_dir / "subs_original.json"
 need_extract_subs = True
@@ -326,10 +183,26 @@ if source_path.exists():
         print(f"⚠️ Не вдалося прочитати subs_source.json: {e}")
         need_extract_subs = True
 if need_extract_subs:
+    print("🎙️  Extracting audio...")
+    # Аудіо декодується в пам'ять лише коли справді потрібна транскрибація
+    audio = Balthasar.decode_audio(video_file, mmap_dir=audio_dir)
     print("🧠  Transcribing...")
     model_name = "base"
     transcribe_lang = "ru"
-    result = Balthasar.transcribe(audio_path, model_name=model_name, language=transcribe_lang)
+    if tqdm:
+        transcribe_bar = tqdm(total=round(len(audio) / SAMPLE_RATE), desc="Transcribing", unit="s")
+
+        def report_transcription(progress):
+            transcribe_bar.n = round(progress["audio_done_s"])
+            transcribe_bar.set_postfix(speed=f"x{progress['throughput']:.1f}", segments=progress["segments"])
+    else:
+        def report_transcription(progress):
+            print(f"   {format_progress(progress)}")
+
+    result = Balthasar.transcribe(audio, model_name=model_name, language=transcribe_lang,
+                                  progress_callback=report_transcription)
+    if tqdm:
+        transcribe_bar.close()
     with open(source_path, "w", encoding="utf-8") as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
 
@@ -346,11 +219,20 @@ else:
         main_lang = 'ru'
     all_texts = [segment["text"] for segment in source_data["segments"]]
     if tqdm:
-        translated_texts = []
-        for t in tqdm(all_texts, desc="Translating", unit="line"):
-            translated_texts.append(Melchior.translate(t, source_lang=main_lang, target_lang="uk"))
+        progress_bar = tqdm(total=len(all_texts), desc="Translating", unit="line")
+
+        def report_translation(done, total):
+            progress_bar.total = total
+            progress_bar.n = done
+            progress_bar.refresh()
+
+        translated_texts = Melchior.translate_batch(all_texts, source_lang=main_lang, target_lang="uk",
+                                                    progress_callback=report_translation,
+                                                    use_cache=use_translation_cache)
+        progress_bar.close()
     else:
-        translated_texts = [Melchior.translate(t, source_lang=main_lang, target_lang="uk") for t in all_texts]
+        translated_texts = Melchior.translate_batch(all_texts, source_lang=main_lang, target_lang="uk",
+                                                    use_cache=use_translation_cache)
     for segment, translated in zip(source_data["segments"], translated_texts):
         subs.append({
             "start": segment["start"],
@@ -360,13 +242,14 @@ else:
     with open(subs_path, "w", encoding="utf-8") as f:
         json.dump(subs, f, ensure_ascii=False, indent=2)
 
-print("🧾  Generating styled ASS subtitles...")
+print(f"🧾  Generating styled subtitles ({', '.join(subtitle_formats).upper()})...")
 style_path = "magi_pipeline/ass_generator_module/styles/Dialogue.ass"
 print("✅ Використовується дефолтний стиль: Retro Yellow (Dialogue.ass)")
 Caspar.generate_subtitles(
     subs=subs,
     output_path=str(output_dir / f"{video_file.stem}.ass"),
-    style_path=style_path
+    style_path=style_path,
+    formats=subtitle_formats
 )
 print("✅ Готово! Файл субтитрів збережено в output/")
 
@@ -377,3 +260,15 @@ if ass_file.exists():
     dest = input_dir / ass_file.name
     shutil.copy(ass_file, dest)
     print(f"✅ Субтитри також скопійовано в input/: {dest}")
+
+if mux_mkv and ass_file.exists():
+    mkv_path = output_dir / f"{video_file.stem}.ukr.mkv"
+    print("🎞️  Вбудовуємо субтитри у MKV (без перекодування)...")
+    if tqdm:
+        with tqdm(total=100, unit="%", desc="Mux") as bar:
+            def report_mux(fraction, info):
+                bar.update(int(fraction * 100) - bar.n)
+            mux_soft_subtitles(video_file, ass_file, mkv_path, progress_callback=report_mux)
+    else:
+        mux_soft_subtitles(video_file, ass_file, mkv_path)
+    print(f"✅ MKV з українською доріжкою: {mkv_path}")